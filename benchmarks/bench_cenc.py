@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 21:10
+# @Version     : Python 3.14.0
+"""
+对比进程内cenc/cbcs解密与DRM.decrypter的吞吐量
+
+生成加密的fMP4元数据和切片(独立的逐块加密实现), 分别解密后校验样本内容
+pip install -e . && python benchmarks/bench_cenc.py --segments 20 --samples 120 --sample-size 20000
+"""
+import argparse
+import os
+import struct
+import tempfile
+import time
+from pathlib import Path
+
+from Crypto.Cipher import AES
+
+from vodd.utils.cenc import decrypt_cenc_file
+
+KID = bytes.fromhex('0123456789abcdef0123456789abcdef')
+KEY = bytes.fromhex('00112233445566778899aabbccddeeff')
+# 每个样本开头的明文部分(NAL头)
+CLEAR_BYTES = 5
+
+
+def box(box_type: bytes, *payload: bytes) -> bytes:
+    content = b''.join(payload)
+    return struct.pack('>I4s', len(content) + 8, box_type) + content
+
+
+def full_box(box_type: bytes, version: int, flags: int, *payload: bytes) -> bytes:
+    return box(box_type, struct.pack('>I', (version << 24) | flags), *payload)
+
+
+def build_init(scheme: str, crypt: int, skip: int, constant_iv: bytes) -> bytes:
+    if constant_iv:
+        tenc = full_box(b'tenc', 1, 0, bytes([0, (crypt << 4) | skip, 1, 0]), KID, bytes([len(constant_iv)]), constant_iv)
+    else:
+        tenc = full_box(b'tenc', 0, 0, bytes([0, 0, 1, 8]), KID)
+    sinf = box(
+        b'sinf',
+        box(b'frma', b'avc1'),
+        full_box(b'schm', 0, 0, scheme.encode(), struct.pack('>I', 0x10000)),
+        box(b'schi', tenc),
+    )
+    visual = bytes(6) + struct.pack('>H', 1) + bytes(16) + struct.pack('>HH', 1920, 1080) \
+        + struct.pack('>II', 0x480000, 0x480000) + bytes(4) + struct.pack('>H', 1) + bytes(32) \
+        + struct.pack('>Hh', 0x18, -1)
+    encv = box(b'encv', visual, box(b'avcC', bytes([1, 0x64, 0, 0x28, 0xff, 0xe0, 0, 0])), sinf)
+    stbl = box(
+        b'stbl',
+        full_box(b'stsd', 0, 0, struct.pack('>I', 1), encv),
+        full_box(b'stts', 0, 0, bytes(4)),
+        full_box(b'stsc', 0, 0, bytes(4)),
+        full_box(b'stsz', 0, 0, bytes(8)),
+        full_box(b'stco', 0, 0, bytes(4)),
+    )
+    minf = box(
+        b'minf',
+        full_box(b'vmhd', 0, 1, bytes(8)),
+        box(b'dinf', full_box(b'dref', 0, 0, struct.pack('>I', 1), full_box(b'url ', 0, 1))),
+        stbl,
+    )
+    mdia = box(
+        b'mdia',
+        full_box(b'mdhd', 0, 0, struct.pack('>IIIIHH', 0, 0, 90000, 0, 0x55c4, 0)),
+        full_box(b'hdlr', 0, 0, bytes(4), b'vide', bytes(12), b'video\0'),
+        minf,
+    )
+    tkhd = full_box(b'tkhd', 0, 3, struct.pack('>III', 0, 0, 1), bytes(4 + 4 + 8 + 8 + 36), struct.pack('>II', 1920 << 16, 1080 << 16))
+    mvhd = full_box(b'mvhd', 0, 0, struct.pack('>IIII', 0, 0, 90000, 0), struct.pack('>IH', 0x10000, 0x100), bytes(10 + 36 + 24), struct.pack('>I', 2))
+    mvex = box(b'mvex', full_box(b'trex', 0, 0, struct.pack('>5I', 1, 1, 0, 0, 0)))
+    return box(b'ftyp', b'iso6', struct.pack('>I', 0), b'iso6dash') + box(b'moov', mvhd, box(b'trak', tkhd, mdia), mvex)
+
+
+def encrypt_sample(sample: bytes, scheme: str, iv: bytes, crypt: int, skip: int) -> bytes:
+    """逐块加密, 与解密实现相互独立"""
+    clear, protected = sample[:CLEAR_BYTES], sample[CLEAR_BYTES:]
+    if scheme == 'cenc':
+        return clear + AES.new(KEY, AES.MODE_CTR, nonce=b'', initial_value=iv.ljust(16, b'\0')).encrypt(protected)
+    ecb = AES.new(KEY, AES.MODE_ECB)
+    out = bytearray(protected)
+    previous = iv
+    block = 0
+    for p in range(0, len(protected) // 16 * 16, 16):
+        # 0:0表示所有完整块都加密
+        if not crypt + skip or block % (crypt + skip) < crypt:
+            value = int.from_bytes(protected[p:p + 16]) ^ int.from_bytes(previous)
+            previous = ecb.encrypt(value.to_bytes(16))
+            out[p:p + 16] = previous
+        block += 1
+    return clear + bytes(out)
+
+
+def build_segment(samples: list, scheme: str, crypt: int, skip: int, constant_iv: bytes, sequence: int) -> bytes:
+    ivs = [b'' if constant_iv else struct.pack('>Q', sequence * 100000 + i) for i in range(len(samples))]
+    encrypted = [encrypt_sample(s, scheme, iv or constant_iv, crypt, skip) for s, iv in zip(samples, ivs)]
+    senc = full_box(
+        b'senc', 0, 0x02, struct.pack('>I', len(samples)),
+        *[iv + struct.pack('>HHI', 1, CLEAR_BYTES, len(s) - CLEAR_BYTES) for s, iv in zip(samples, ivs)],
+    )
+
+    def moof(data_offset: int) -> bytes:
+        trun = full_box(b'trun', 0, 0x201, struct.pack('>Ii', len(samples), data_offset), *[struct.pack('>I', len(s)) for s in samples])
+        traf = box(
+            b'traf',
+            full_box(b'tfhd', 0, 0x020000, struct.pack('>I', 1)),
+            full_box(b'tfdt', 1, 0, struct.pack('>Q', sequence * 90000)),
+            trun,
+            senc,
+        )
+        return box(b'moof', full_box(b'mfhd', 0, 0, struct.pack('>I', sequence)), traf)
+
+    size = len(moof(0))
+    return moof(size + 8) + box(b'mdat', *encrypted)
+
+
+def bench(name: str, decrypt, files: list, plains: list) -> float:
+    st = time.perf_counter()
+    for encrypt_file, decrypt_file in files:
+        decrypt(encrypt_file, decrypt_file)
+    cost = time.perf_counter() - st
+    for (_, decrypt_file), plain in zip(files, plains):
+        if not Path(decrypt_file).read_bytes().endswith(plain):
+            raise AssertionError(f'{name}: 解密结果错误 {decrypt_file}')
+    return cost
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--segments', type=int, default=20, help='切片数量')
+    parser.add_argument('--samples', type=int, default=120, help='每个切片的样本数量')
+    parser.add_argument('--sample-size', type=int, default=20000, help='样本大小')
+    args = parser.parse_args()
+    try:
+        from DRM import decrypter
+    except ImportError:
+        decrypter = None
+    for scheme, crypt, skip, constant_iv in (('cenc', 0, 0, b''), ('cbcs', 1, 9, os.urandom(16))):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp = Path(temp_dir)
+            init_file = temp / 'init.mp4'
+            init_file.write_bytes(build_init(scheme, crypt, skip, constant_iv))
+            key = f'{KID.hex()}:{KEY.hex()}'
+            plains = []
+            files = []
+            for i in range(args.segments):
+                samples = [os.urandom(args.sample_size) for _ in range(args.samples)]
+                (encrypt_file := temp / f'{i}.m4s').write_bytes(build_segment(samples, scheme, crypt, skip, constant_iv, i))
+                plains.append(b''.join(samples))
+                files.append((encrypt_file.as_posix(), (temp / f'{i}_native.m4s').as_posix()))
+            total = sum(Path(f).stat().st_size for f, _ in files) / 1024 / 1024
+            cost = bench('native', lambda e, d: decrypt_cenc_file(e, d, key, init_file.as_posix()), files, plains)
+            print(f'{scheme}: {total:.1f}MB, native {cost:.3f}s {total / cost:8.1f}MB/s')
+            if decrypter is None:
+                print(f'{scheme}: 未安装DRM, 跳过DRM.decrypter')
+                continue
+
+            def external(e: str, d: str):
+                decrypter.decrypting_file(e, d, key, init_file.as_posix())
+                decrypter.has_decrypted(e, d)
+
+            files = [(e, d.replace('_native', '_external')) for e, d in files]
+            cost = bench('external', external, files, plains)
+            print(f'{scheme}: {total:.1f}MB, DRM.decrypter {cost:.3f}s {total / cost:8.1f}MB/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 15:05
+# @Version     : Python 3.14.0
+"""
+对比切片拼接方式的耗时
+
+pip install -e . && python benchmarks/bench_concat.py --dir /home/www/tmp/bench --size-mb 4096 --segment-mb 4
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from vodd.utils import file_copy
+from vodd.utils.file_copy import COPIERS, append_file, open_for_append
+
+
+def make_segments(directory: Path, size: int, segment_size: int) -> list[Path]:
+    segments = []
+    block = os.urandom(1024 * 1024)
+    for index in range((size + segment_size - 1) // segment_size):
+        path = directory / f'video_00000_{index:010}.ts'
+        with open(path, 'wb') as f:
+            remain = min(segment_size, size - index * segment_size)
+            while remain > 0:
+                remain -= f.write(block[:remain])
+        segments.append(path)
+    return segments
+
+
+def bench(segments: list[Path], target: Path, method: str, chunk_size: int) -> float | None:
+    target.unlink(missing_ok=True)
+    file_copy._disabled.clear()
+    st = time.perf_counter()
+    try:
+        with open_for_append(target) as f:
+            for segment in segments:
+                if method == 'loop':
+                    # DownloadCore.concat原来的实现
+                    with open(segment, 'rb') as fr:
+                        while chunk := fr.read(chunk_size):
+                            f.write(chunk)
+                elif append_file(segment, f, chunk_size, methods=(method,)) != method:
+                    return None
+            f.flush()
+            os.fsync(f.fileno())
+    except OSError:
+        return None
+    return time.perf_counter() - st
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dir', type=str, default=None, help='测试目录, 需要和临时文件夹在同一个文件系统')
+    parser.add_argument('--size-mb', type=int, default=2048, help='轨道大小')
+    parser.add_argument('--segment-mb', type=float, default=4, help='切片大小')
+    parser.add_argument('--chunk-size', type=int, default=1024 * 1024, help='分块读写的大小')
+    args = parser.parse_args()
+
+    directory = Path(tempfile.mkdtemp(prefix='vodd_bench_', dir=args.dir))
+    try:
+        size = args.size_mb * 1024 * 1024
+        segments = make_segments(directory, size, int(args.segment_mb * 1024 * 1024))
+        print(f'{len(segments)}个切片, 共{args.size_mb}MB, 目录: {directory}')
+        for method in ['loop', *COPIERS]:
+            if (cost := bench(segments, directory / 'group_video_0.ts', method, args.chunk_size)) is None:
+                print(f'{method:>16}: 不支持')
+                continue
+            print(f'{method:>16}: {cost:8.3f}s, {args.size_mb / cost:10.1f}MB/s')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
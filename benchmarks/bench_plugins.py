@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 22:50
+# @Version     : Python 3.14.0
+"""
+对比扫描导入所有插件与插件注册表按需导入的启动耗时
+
+每次在新的解释器中执行, 统计从导入vodd.plugins到得到指定插件类的耗时和新导入的模块
+pip install -e . && python benchmarks/bench_plugins.py --plugin stream --repeat 10
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+CODE = '''
+import json, sys, time
+st = time.perf_counter()
+from vodd.plugins import BasePlugin, get_all_plugins
+from vodd.utils.probe import get_plugin_map
+before = set(sys.modules)
+if {mode!r} == 'scan':
+    cls = get_plugin_map(BasePlugin)[{plugin!r}]
+else:
+    cls = get_all_plugins()[{plugin!r}]
+cost = time.perf_counter() - st
+heavy = sorted(m for m in set(sys.modules) - before if m.split('.')[0] in ('DRM', 'Crypto', 'lxml', 'm3u8'))
+print(json.dumps({{'cost': cost, 'modules': len(set(sys.modules) - before), 'heavy': sorted({{m.split('.')[0] for m in heavy}})}}))
+'''
+
+
+def run(mode: str, plugin: str) -> dict:
+    output = subprocess.check_output([sys.executable, '-c', CODE.format(mode=mode, plugin=plugin)], text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--plugin', type=str, default='stream', help='插件名字')
+    parser.add_argument('--repeat', type=int, default=10, help='每种方式执行的次数')
+    args = parser.parse_args()
+    for mode in ('scan', 'registry'):
+        results = [run(mode, args.plugin) for _ in range(args.repeat)]
+        cost = statistics.median(r['cost'] for r in results) * 1000
+        print(f"{mode:8} {args.plugin}: {cost:8.1f}ms, 新导入模块 {results[-1]['modules']:4}, 依赖 {results[-1]['heavy']}")
+
+
+if __name__ == '__main__':
+    main()
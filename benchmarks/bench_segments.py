@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 17:40
+# @Version     : Python 3.14.0
+"""
+对比Segment模型与切片表的内存占用和构建耗时
+
+pip install -e . && python benchmarks/bench_segments.py --count 300000 --tracks 4
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from pathlib import Path
+from urllib.parse import urlparse
+
+from vodd.core.constants import MediaName
+from vodd.core.models import Cipher, Segment
+from vodd.core.segment_table import SegmentTable
+
+
+def make_models(count: int, tracks: int, temp_dir: Path) -> list:
+    segments = []
+    cipher = Cipher(name='AES-128', params={'url': 'https://cdn.example.com/key', 'iv': None})
+    for group_no in range(tracks):
+        media_type = MediaName.video if group_no == 0 else MediaName.audio
+        for index in range(count // tracks):
+            segment = Segment(
+                type=media_type,
+                group_no=group_no,
+                index=index,
+                url=f'https://cdn.example.com/vod/track{group_no}/seg-{index}.ts',
+                headers={},
+                duration=2.0,
+                cipher=cipher,
+                init_url='',
+            )
+            # 与DownloadCore.add_segments_path相同
+            suffix = Path(urlparse(segment.url).path).suffix
+            segment.filepath = temp_dir / f'{segment.type}_{segment.group_no:05}_{segment.index:010}{suffix}'
+            segments.append(segment)
+    return segments
+
+
+def make_table(count: int, tracks: int, temp_dir: Path) -> list:
+    table = SegmentTable()
+    cipher = Cipher(name='AES-128', params={'url': 'https://cdn.example.com/key', 'iv': None})
+    segments = []
+    for group_no in range(tracks):
+        media_type = MediaName.video if group_no == 0 else MediaName.audio
+        for index in range(count // tracks):
+            segments.append(table.append(
+                type=media_type,
+                group_no=group_no,
+                index=index,
+                url=f'https://cdn.example.com/vod/track{group_no}/seg-{index}.ts',
+                duration=2.0,
+                cipher=cipher,
+                init_url='',
+            ))
+    table.temp_dir = temp_dir
+    return segments
+
+
+def bench(name: str, build, count: int, tracks: int):
+    temp_dir = Path('/home/www/tmp/vodd/bench')
+    gc.collect()
+    st = time.perf_counter()
+    segments = build(count, tracks, temp_dir)
+    cost = time.perf_counter() - st
+    # 与DownloadCore.classify相同的排序
+    st = time.perf_counter()
+    segments.sort(key=lambda x: (MediaName.index(x.type), x.group_no, x.index))
+    sort_cost = time.perf_counter() - st
+    st = time.perf_counter()
+    for segment in segments:
+        segment.filepath.name
+    path_cost = time.perf_counter() - st
+    del segments
+    # 内存单独统计, tracemalloc会明显拖慢构建速度
+    gc.collect()
+    tracemalloc.start()
+    segments = build(count, tracks, temp_dir)
+    for segment in segments:
+        segment.filepath
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(
+        f'{name:>8}: 构建 {cost:7.3f}s, 排序 {sort_cost:6.3f}s, 访问路径 {path_cost:6.3f}s, '
+        f'内存 {memory / 1024 / 1024:8.1f}MB, 每个切片 {memory / len(segments):6.0f}B'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=300000, help='切片总数')
+    parser.add_argument('--tracks', type=int, default=4, help='轨道数量')
+    args = parser.parse_args()
+    bench('Segment', make_models, args.count, args.tracks)
+    bench('Table', make_table, args.count, args.tracks)
+
+
+if __name__ == '__main__':
+    main()
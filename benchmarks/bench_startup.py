@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 23:10
+# @Version     : Python 3.14.0
+"""
+冷启动到第一个请求的耗时回归测试
+
+在新的解释器中以-X importtime执行vodd, 本地服务收到第一个请求(判断插件)时结束进程,
+统计从启动到第一个请求的耗时和此前导入的模块; 超过耗时目标或者提前导入了重依赖时返回1
+pip install -e . && python benchmarks/bench_startup.py --repeat 5 --budget-ms 400
+"""
+import argparse
+import http.server
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# 第一个请求之前不应该导入的模块
+HEAVY_MODULES = ('DRM', 'Crypto', 'lxml', 'm3u8', 'pydantic', 'prettytable', 'multiprocessing', 'aiohttp')
+
+
+def serve() -> tuple[http.server.ThreadingHTTPServer, threading.Event, list]:
+    received = threading.Event()
+    times = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            times.append(time.perf_counter())
+            received.set()
+            # 不返回响应, 子进程停在第一个请求上, 不会继续导入其他模块
+            time.sleep(5)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, received, times
+
+
+def parse_importtime(stderr: str) -> dict:
+    """-X importtime的输出, 返回模块 -> 累计耗时(微秒)"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def run_once(url: str, temp_dir: str, received: threading.Event, times: list) -> tuple[float, dict]:
+    received.clear()
+    times.clear()
+    command = [sys.executable, '-X', 'importtime', '-m', 'vodd.main', '-o', f'{temp_dir}/out.ts', '--url', url]
+    st = time.perf_counter()
+    p = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        if not received.wait(30):
+            raise RuntimeError('子进程没有发出请求')
+        cost = times[0] - st
+    finally:
+        p.kill()
+        _, stderr = p.communicate()
+    return cost, parse_importtime(stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5, help='执行次数, 取中位数')
+    parser.add_argument('--budget-ms', type=float, default=400, help='冷启动到第一个请求的耗时目标')
+    parser.add_argument('--top', type=int, default=10, help='显示累计耗时最多的模块数量')
+    args = parser.parse_args()
+    server, received, times = serve()
+    url = f'http://127.0.0.1:{server.server_address[1]}/index.m3u8'
+    # 解释器本身的启动耗时
+    st = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    baseline = time.perf_counter() - st
+    costs = []
+    modules = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for _ in range(args.repeat):
+            cost, modules = run_once(url, temp_dir, received, times)
+            costs.append(cost)
+    server.shutdown()
+    median = statistics.median(costs) * 1000
+    print(f'解释器启动: {baseline * 1000:.1f}ms, 启动到第一个请求: {median:.1f}ms (目标 {args.budget_ms:.0f}ms)')
+    top_level = {name: cost for name, cost in modules.items() if '.' not in name}
+    for name, cost in sorted(top_level.items(), key=lambda x: -x[1])[:args.top]:
+        print(f'  {name:30} {cost / 1000:8.1f}ms')
+    failures = []
+    if median > args.budget_ms:
+        failures.append(f'耗时超过目标: {median:.1f}ms > {args.budget_ms:.0f}ms')
+    if heavy := sorted({name.split('.')[0] for name in modules} & set(HEAVY_MODULES)):
+        failures.append(f'第一个请求之前导入了: {heavy}')
+    for failure in failures:
+        print(failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 10:12
+# @Version     : Python 3.14.0
+import asyncio
+import contextlib
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
+
+from vodd.core.exceptions import *
+
+if TYPE_CHECKING:
+    from vodd.core.models import Segment
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncEngine(object):
+    """
+    asyncio下载引擎
+
+    由单个事件循环驱动所有切片的下载、解密与进度统计,
+    同时下载的切片数量由 async_concurrency 决定, 不再为每个切片占用一个线程;
+    与线程引擎一样受自适应并发、批量任务的全局额度和域名并发上限的限制
+    """
+
+    def __init__(self, downloader):
+        from vodd.downloader import Downloader
+        self.downloader: Downloader = downloader
+        self.concurrency = downloader.async_concurrency
+        # 等待并发额度时会阻塞, 每个协程最多占用一个线程, 不与默认线程池中的解密、取密钥争抢
+        self.executor: ThreadPoolExecutor | None = None
+        self.ssl_context = None
+
+    def run(self):
+        try:
+            import aiohttp
+        except ImportError:
+            raise SoftwareError('未安装aiohttp, 无法使用asyncio下载引擎')
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='acquire')
+        try:
+            asyncio.run(self.main(aiohttp))
+        finally:
+            self.executor.shutdown(wait=False)
+
+    async def main(self, aiohttp):
+        rk = self.downloader.request_kwargs
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency)
+        timeout = aiohttp.ClientTimeout(sock_connect=rk['timeout'], sock_read=rk['timeout'])
+        async with aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                cookies=rk.get('cookies'),
+        ) as session:
+            await asyncio.gather(*[self.worker(aiohttp, session) for _ in range(self.concurrency)])
+
+    async def worker(self, aiohttp, session):
+        # 边规划边下载时取任务可能需要等待规划线程, 放到线程中执行, 不阻塞事件循环
+        while not self.downloader.is_stop_all:
+            if (task := await asyncio.to_thread(self.downloader.next_task)) is None:
+                break
+            await self.download(aiohttp, session, task)
+        # 任务分配完后拆分正在下载的切片
+        while not self.downloader.is_stop_all and (task := await asyncio.to_thread(self.downloader.plugin.steal)) is not None:
+            await self.download(aiohttp, session, task)
+
+    async def acquire(self, stack: contextlib.ExitStack, *managers):
+        """在线程中依次进入会阻塞的上下文管理器, 由stack负责退出"""
+        loop = asyncio.get_running_loop()
+        for manager in managers:
+            await loop.run_in_executor(self.executor, stack.enter_context, manager)
+
+    def ssl_option(self):
+        """与requests的verify参数一致: False不校验证书, 字符串为CA证书路径"""
+        if isinstance(verify := self.downloader.request_kwargs.get('verify', True), str):
+            if self.ssl_context is None:
+                import ssl
+                self.ssl_context = ssl.create_default_context(cafile=verify)
+            return self.ssl_context
+        return bool(verify)
+
+    async def requester(self, aiohttp, session, url: str, headers: dict):
+        d = self.downloader
+        code = None
+        for i in range(d.max_download_times):
+            proxy = (d.request_kwargs.get('proxies') or {}).get(urlparse(url).scheme)
+            st_time = time.time()
+            try:
+                resp = await session.get(
+                    url,
+                    headers={**d.request_kwargs['headers'], **(headers or {})},
+                    ssl=self.ssl_option(),
+                    proxy=proxy,
+                )
+                d.controller.record(resp.status, time.time() - st_time)
+                if resp.ok:
+                    return resp
+                code = resp.status
+                resp.release()
+            except aiohttp.ClientSSLError:
+                d.controller.record(None, time.time() - st_time)
+                d.request_kwargs['verify'] = False
+                logger.warning('检测到存在SSL认证，已自动忽略')
+                await asyncio.sleep(0.1)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                d.controller.record(None, time.time() - st_time)
+                logger.error(f'第{i + 1}次请求异常: {e}')
+                await asyncio.sleep(0.1)
+        raise HTTPStatusCodeError(f'{code}')
+
+    async def download(self, aiohttp, session, task: Segment):
+        d = self.downloader
+        try:
+            if d.is_stop_all:
+                return
+            if (duration := time.time() - d.start_time) > d.overall_timeout:
+                logger.warning(f'下载已超时：{int(duration)}, 终止程序运行')
+                raise ReachMaxDownloadLimitError(f'timeout: {int(duration)}')
+            # 获取密钥需要请求网络, 放到线程中执行
+            transform = await asyncio.to_thread(d.plugin.stream_transform, task) if d.stream_decrypt else None
+            with contextlib.ExitStack() as stack:
+                await self.acquire(stack, d.controller, d.budget)
+                with d.download_meter.measure():
+                    await self.smart_save(aiohttp, session, task.url, task.headers, task.filepath, transform)
+            task.confirmed = True
+            if transform is not None:
+                d.confirm(task)
+            else:
+                # 解密队列已满时会阻塞, 放到线程中执行
+                await asyncio.to_thread(d.decrypt, task)
+        except DownloadException as e:
+            d.is_stop_all = True
+            d.error = e.__dict__
+        except Exception as e:
+            d.is_stop_all = True
+            logger.error(f'下载任务异常: {e}')
+
+    async def smart_save(self, aiohttp, session, url: str, headers: dict, path: Path, transform=None):
+        d = self.downloader
+        d.downloaded_size.pop(path.name, None)
+        st_time = time.time()
+        with contextlib.ExitStack() as stack:
+            await self.acquire(stack, d.connections.limit(url))
+            resp = await self.requester(aiohttp, session, url, headers)
+            try:
+                length = resp.content_length or 0
+                if transform is None and d.chunked_mode and d.is_rangeable(resp.status, resp.headers, length):
+                    # 当前连接下载第一个分段, 其余分段使用新的连接
+                    if await self.ranged_save(aiohttp, session, url, headers, path, length, st_time, resp):
+                        return
+                else:
+                    await self.single_save(resp, path, length, st_time, transform)
+                    return
+            finally:
+                resp.release()
+            # 服务器不支持分段下载, 重新使用单个连接下载
+            resp = await self.requester(aiohttp, session, url, headers)
+            try:
+                await self.single_save(resp, path, resp.content_length or 0, st_time)
+            finally:
+                resp.release()
+
+    async def single_save(self, resp, path: Path, length: int, st_time: float, transform=None):
+        d = self.downloader
+        d.downloaded_size[path.name] = [0, length]
+        with open(path, 'wb') as f:
+            async for chunk in resp.content.iter_chunked(d.chunk_size):
+                # 解密在线程中执行, 不阻塞事件循环
+                f.write(await asyncio.to_thread(transform.update, chunk) if transform is not None else chunk)
+                d.downloaded_size[path.name][0] += len(chunk)
+                d.stats.add_bytes(len(chunk))
+                if delay := d.limiter.reserve(len(chunk)):
+                    await asyncio.sleep(delay)
+                if d.chunked_mode:
+                    d.check_timeout(st_time, path)
+                if d.downloaded_size[path.name][0] >= d.range_ends.get(path.name, math.inf):
+                    break
+            if transform is not None:
+                f.write(transform.final())
+            if d.chunked_mode:
+                d.close_range(path, f)
+        if not d.downloaded_size[path.name][1]:
+            d.downloaded_size[path.name][1] = d.downloaded_size[path.name][0]
+
+    async def ranged_save(
+            self, aiohttp, session, url: str, headers: dict, path: Path, length: int, st_time: float, first
+    ) -> bool:
+        """
+        多个连接分段下载大切片, 与Downloader.ranged_save相同
+        :return: 服务器忽略Range(没有返回206)时返回False, 需要改为单个连接下载
+        """
+        d = self.downloader
+        base = {k: v for k, v in (headers or {}).items() if k.lower() != 'range'}
+        offset = 0
+        for k, v in (headers or {}).items():
+            if k.lower() == 'range':
+                offset = int(v.split('=', 1)[1].split('-', 1)[0])
+        parts = min(d.range_connections, math.ceil(length / d.chunk_size))
+        part_size = math.ceil(length / parts)
+        ranges = [(start, min(start + part_size, length)) for start in range(0, length, part_size)]
+        d.downloaded_size[path.name] = [0, length]
+        with open(path, 'wb') as f:
+            f.truncate(length)
+        unsupported = asyncio.Event()
+
+        async def fetch(start: int, end: int, resp=None):
+            position = start
+            for i in range(d.max_download_times):
+                try:
+                    if resp is None:
+                        resp = await self.requester(
+                            aiohttp, session, url, {**base, 'Range': f'bytes={offset + position}-{offset + end - 1}'}
+                        )
+                        if resp.status != 206:
+                            logger.warning(f'服务器不支持分段下载: {path.name}, {resp.status}')
+                            unsupported.set()
+                            return
+                    with open(path, 'r+b') as f:
+                        f.seek(position)
+                        async for chunk in resp.content.iter_chunked(d.chunk_size):
+                            if unsupported.is_set():
+                                return
+                            chunk = chunk[:end - position]
+                            f.write(chunk)
+                            position += len(chunk)
+                            d.downloaded_size[path.name][0] += len(chunk)
+                            d.stats.add_bytes(len(chunk))
+                            if delay := d.limiter.reserve(len(chunk)):
+                                await asyncio.sleep(delay)
+                            d.check_timeout(st_time, path)
+                            if position >= end:
+                                break
+                    if position >= end:
+                        return
+                except DownloadException:
+                    raise
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                    logger.error(f'第{i + 1}次分段下载异常: {path.name}, {position}-{end}, {e}')
+                    await asyncio.sleep(0.1)
+                finally:
+                    if resp is not None:
+                        resp.release()
+                    resp = None
+            raise DownloadTaskError(f'分段下载失败: {path.name}, {position}-{end}')
+
+        tasks = [asyncio.ensure_future(fetch(start, end, first if start == 0 else None)) for start, end in ranges]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+        return not unsupported.is_set()
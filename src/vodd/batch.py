@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 18:30
+# @Version     : Python 3.14.0
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from vodd.core.files import find_executable
+from vodd.downloader import Downloader
+from vodd.main import parse_args
+from vodd.plugins import get_all_plugins
+from vodd.utils.concurrency import PriorityBudget
+from vodd.utils.connection import ConnectionManager
+from vodd.utils.limiter import TokenBucket
+from vodd.utils.pipeline import SharedProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+class SharedContext(object):
+    """
+    批量下载时所有任务共享的资源
+
+    同一个Session和连接池, 插件和FFmpeg只查找一次, 已获取的密钥在任务之间复用,
+    budget限制所有任务同时下载的切片总数, limiter限制所有任务的总带宽,
+    所有任务的解密共用一个进程池, 进程数量不随任务数量增加
+    """
+
+    def __init__(self, max_workers: int = 0, pool_size: int = 100, limit_rate: float = 0, decrypt_processes: int = 0):
+        """
+        :param max_workers: 所有任务同时下载的切片总数, 0表示不限制
+        :param pool_size: 共享连接池中每个域名的连接数
+        :param limit_rate: 所有任务的总限速(MB/s)
+        :param decrypt_processes: 共享的解密进程数量, 默认为CPU核心数
+        """
+        self.session = requests.Session()
+        self.connections = ConnectionManager(self.session, pool_size=pool_size)
+        self.budget = PriorityBudget(max_workers)
+        self.limiter = TokenBucket(limit_rate * 1024 * 1024)
+        self.plugins = get_all_plugins()
+        self.ffmpeg_path = find_executable('ffmpeg')
+        # 插件名字 -> 密钥, hls以密钥链接为键, dash以KID为键
+        self.keys = {}
+        self.decrypt_pool = SharedProcessPool(decrypt_processes or os.cpu_count() or 1)
+
+    def close(self):
+        self.decrypt_pool.shutdown()
+
+
+def run_job(context: SharedContext, argv: list, **extra) -> dict:
+    """
+    执行单个任务
+    :param context:
+    :param argv: 与-c配置文件相同的参数列表
+    :param extra: 附加的下载参数
+    :return: {'error': 错误信息, 'save_path': 保存路径}
+    """
+    save_path = ''
+    try:
+        kwargs = parse_args(argv)
+        save_path = kwargs['save_path']
+        return Downloader(**kwargs, context=context, show_progress=False, **extra).start()
+    except (Exception, SystemExit) as e:
+        # 参数错误时argparse会退出程序, 只记录为当前任务失败
+        logger.error(f'任务异常: {argv}, {e}')
+        traceback.print_exc()
+        return {'error': {'message': 'Exception', 'reason': str(e)}, 'save_path': save_path}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(usage='VOD Downloader Batch', description='--help')
+    parser.add_argument('-i', type=str, dest='jobs_path', required=True,
+                        help='任务文件,每行一个JSON数组,格式与-c配置文件相同')
+    parser.add_argument('-o', type=str, dest='results_path', default='',
+                        help='结果文件,每个任务完成后追加一行,默认输出到标准错误')
+    parser.add_argument('--jobs', type=int, default=4, dest='jobs', help='同时执行的任务数量')
+    parser.add_argument('--max-workers', type=int, default=64, dest='max_workers',
+                        help='所有任务同时下载的切片总数,0表示不限制')
+    parser.add_argument('--pool-size', type=int, default=100, dest='pool_size', help='共享连接池中每个域名的连接数')
+    parser.add_argument('--limit-rate', type=float, default=0, dest='limit_rate', help='所有任务的总限速,单位MB/s,0表示不限速')
+    parser.add_argument('--decrypt-processes', type=int, default=0, dest='decrypt_processes',
+                        help='所有任务共享的解密进程数量,默认为CPU核心数')
+    return parser
+
+
+def main(argv: list = None):
+    args = build_parser().parse_args(argv)
+    context = SharedContext(args.max_workers, args.pool_size, args.limit_rate, args.decrypt_processes)
+    jobs = []
+    for line in Path(args.jobs_path).read_text('utf-8').splitlines():
+        if line := line.strip():
+            jobs.append(json.loads(line))
+    logger.info(f'批量任务数: {len(jobs)}, 同时执行: {args.jobs}, 切片并发上限: {args.max_workers}')
+    output = open(args.results_path, 'a', encoding='utf-8') if args.results_path else sys.stderr
+    lock = threading.Lock()
+    failures = 0
+
+    def execute(job: list):
+        nonlocal failures
+        result = run_job(context, job)
+        with lock:
+            if result['error']:
+                failures += 1
+            output.write(f'{json.dumps(result, ensure_ascii=False)}\n')
+            output.flush()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+            list(executor.map(execute, jobs))
+    except KeyboardInterrupt:
+        sys.exit(130)
+    finally:
+        context.close()
+        if output is not sys.stderr:
+            output.close()
+    logger.info(f'批量任务完成: {len(jobs) - failures}/{len(jobs)}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,22 +4,69 @@
 # @Version     : Python 3.6.8
 import subprocess
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, List
 from urllib.parse import urlparse
 
-import m3u8
-
 from vodd.core.exceptions import *
-from vodd.core.models import VideoMedia
+from vodd.core.files import find_executable
+
+if TYPE_CHECKING:
+    import m3u8
+
+    from vodd.core.models import VideoMedia
 
 
 def parse_m3u8(content: str, url: str = None) -> m3u8.M3U8:
+    # 只有HLS需要m3u8, 使用时才导入
+    import m3u8
     media = m3u8.loads(content)
     if url is not None:
         media.base_uri = url.replace(urlparse(url).query, '').strip('?').rsplit('/', 1)[0] + '/'
     return media
 
 
+# ISO-BMFF文件开头可能出现的box
+MP4_BOXES = (b'ftyp', b'styp', b'moov', b'moof', b'sidx', b'free', b'skip', b'mdat')
+
+
+def sniff_plugin(content_type: str, suffix: str = '', head: bytes = None) -> str:
+    """
+    根据Content-Type、链接后缀和内容开头判断使用的插件
+    :param content_type: 小写的Content-Type
+    :param suffix: 小写的链接后缀
+    :param head: 内容开头的数据, 为None时表示还没有读取内容, 需要检查内容时返回空字符串
+    :return: 插件名字, 无法判断时返回空字符串
+    """
+    if 'mpegurl' in content_type or 'm3u8' in content_type:
+        return 'hls'
+    if 'dash+xml' in content_type or 'mpd' in content_type:
+        return 'dash'
+    if content_type.startswith(('video/', 'audio/')) and suffix not in ('.m3u8', '.mpd'):
+        return 'stream'
+    # Content-Type缺失或者是通用类型时检查内容
+    if head is None:
+        return ''
+    if head:
+        text = head.lstrip(b'\xef\xbb\xbf \t\r\n')
+        if text.startswith(b'#EXTM3U'):
+            return 'hls'
+        if b'<MPD' in text[:4096]:
+            return 'dash'
+        if head[4:8] in MP4_BOXES:
+            return 'stream'
+        # TS包长度188字节, 每个包以0x47开头
+        if head[0] == 0x47 and (len(head) <= 188 or head[188] == 0x47):
+            return 'stream'
+    if suffix == '.m3u8':
+        return 'hls'
+    if suffix == '.mpd':
+        return 'dash'
+    if 'octet-stream' in content_type:
+        # 对于二进制流，默认认为可直接下载
+        return 'stream'
+    return ''
+
+
 def format_duration(seconds: float) -> str:
     minutes, sec = divmod(seconds, 60)
     return f"{int(minutes)}m{int(sec)}s"
@@ -93,7 +140,8 @@ def check_video(v_height: int, v_bandwidth: float = 0, v_framerate: float = 0, *
 
 
 def check_dts(filepath: Path):
-    command = f'ffprobe -v error -select_streams v:0 -show_entries packet=pts,pts_time,dts,dts_time,duration_time -of csv=p=0 "{filepath.as_posix()}"'
+    ffprobe = find_executable('ffprobe') or 'ffprobe'
+    command = f'{ffprobe} -v error -select_streams v:0 -show_entries packet=pts,pts_time,dts,dts_time,duration_time -of csv=p=0 "{filepath.as_posix()}"'
     if (p := subprocess.run(
             command,
             shell=True,  # 允许使用字符串形式的命令
@@ -5,6 +5,8 @@
 from collections import namedtuple
 
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36'
+# asyncio引擎默认同时下载的切片数量
+ASYNC_CONCURRENCY = 200
 SUPPORTED_DRM_CIPHERS = {
     # 'cenc',
     'widevine',
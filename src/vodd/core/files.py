@@ -2,8 +2,24 @@
 # @Author      : LJQ
 # @Time        : 2025/10/11 11:47
 # @Version     : Python 3.14.0
+import functools
+import shutil
 from pathlib import Path
 
 TEMP_DIR = Path('/home/www/tmp/vodd/')
 ERROR_DIR = Path('/home/www/tmp/vodd/error')
 ERROR_DIR.mkdir(parents=True, exist_ok=True)
+# 本机所有下载进程共享的DRM密钥缓存
+KEY_STORE_PATH = TEMP_DIR / 'drm_keys.json'
+# 本机所有下载进程共享的清单缓存
+MANIFEST_CACHE_DIR = TEMP_DIR / 'manifests'
+# 下载服务的访问令牌, 只有当前用户可以读取
+DAEMON_TOKEN_PATH = TEMP_DIR / 'daemon.token'
+# 下载服务的输出文件夹, 接口提交的任务只能保存到这个文件夹中
+DAEMON_OUTPUT_DIR = Path('/home/www/vodd/')
+
+
+@functools.cache
+def find_executable(name: str) -> str | None:
+    """查找FFmpeg/FFprobe等外部程序, 同一个进程只查找一次"""
+    return shutil.which(name)
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 17:05
+# @Version     : Python 3.14.0
+import functools
+import math
+from array import array
+from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
+
+if TYPE_CHECKING:
+    from vodd.core.models import Cipher
+
+# 标志位
+DISCONTINUITY = 1
+CONFIRMED = 2
+
+
+@functools.cache
+def _empty_cipher() -> Cipher:
+    """没有加密的切片共享同一个Cipher, 创建切片表时才导入模型"""
+    from vodd.core.models import Cipher
+    return Cipher(name='')
+
+
+def segment_name(media_type: str, group_no: int, index: int, url: str) -> str:
+    """切片文件名"""
+    return f'{media_type}_{group_no:05}_{index:010}{Path(urlparse(url).path).suffix}'
+
+
+def url_suffix(name: str, url: str) -> str:
+    """
+    链接最后一段的后缀, 与Path(urlparse(url).path).suffix相同
+    :param name: 链接最后一个/之后的部分
+    :param url: 完整链接, 包含查询参数等情况时使用
+    :return:
+    """
+    if '?' in url or '#' in url or ';' in url or url.endswith(f'//{name}'):
+        return Path(urlparse(url).path).suffix
+    return name[i:] if 0 < (i := name.rfind('.')) < len(name) - 1 else ''
+
+
+def init_name(media_type: str, group_no: int, init_url: str) -> str:
+    """元数据文件名"""
+    return f'{media_type}_{group_no:05}_{Path(urlparse(init_url).path).name}'
+
+
+class _Interned(object):
+    """相同的值只保存一份, 列中只保存编号"""
+    __slots__ = ('values', 'ids')
+
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+
+    def add(self, value, key=None) -> int:
+        key = value if key is None else key
+        try:
+            i = self.ids.get(key)
+        except TypeError:
+            # 无法哈希时按对象去重
+            i = self.ids.get(key := id(value))
+        if i is None:
+            i = self.ids[key] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+class SegmentTable(object):
+    """
+    列式存储的切片表
+
+    类型、分组、序号、时长和标志位保存在数组中, 链接按照目录前缀去重,
+    请求头、加密参数和元数据链接在所有切片之间共享, 文件路径在第一次访问时生成,
+    每个切片只需要一个很小的视图对象(SegmentView), 接口与Segment相同
+    """
+    __slots__ = (
+        'types', 'type_ids', 'groups', 'indexes', 'durations', 'flags',
+        'url_prefixes', 'url_prefix_ids', 'url_suffixes',
+        'headers', 'header_ids', 'ciphers', 'cipher_ids', 'init_urls', 'init_url_ids',
+        'temp_dir', 'paths', 'overrides',
+    )
+
+    def __init__(self):
+        self.types = _Interned()
+        self.type_ids = array('B')
+        self.groups = array('I')
+        self.indexes = array('q')
+        self.durations = array('d')
+        self.flags = bytearray()
+        self.url_prefixes = _Interned()
+        self.url_prefix_ids = array('I')
+        self.url_suffixes = []
+        self.headers = _Interned()
+        self.header_ids = array('I')
+        self.ciphers = _Interned()
+        self.cipher_ids = array('I')
+        self.init_urls = _Interned()
+        self.init_url_ids = array('i')
+        # 设置临时文件夹后才能生成文件路径
+        self.temp_dir: Path | None = None
+        self.paths = []
+        # 单独修改过的字段: {(行号, 字段): 值}
+        self.overrides = {}
+
+    def append(
+            self,
+            type: str,
+            group_no: int,
+            index: int,
+            url: str,
+            headers: dict = None,
+            duration: float = None,
+            discontinuity: bool = False,
+            cipher: Cipher = None,
+            init_url: str = None,
+    ) -> 'SegmentView':
+        headers = headers or {}
+        cipher = cipher or _empty_cipher()
+        self.type_ids.append(self.types.add(type))
+        self.groups.append(group_no)
+        self.indexes.append(index)
+        self.durations.append(math.nan if duration is None else duration)
+        self.flags.append(DISCONTINUITY if discontinuity else 0)
+        # 同一个播放列表的切片通常在同一个目录下, 只保存一份目录
+        position = url.rfind('/') + 1
+        self.url_prefix_ids.append(self.url_prefixes.add(url[:position]))
+        self.url_suffixes.append(url[position:])
+        self.header_ids.append(self.headers.add(headers, tuple(sorted(headers.items()))))
+        self.cipher_ids.append(self.ciphers.add(cipher, (cipher.name, tuple(sorted(cipher.params.items())))))
+        self.init_url_ids.append(-1 if init_url is None else self.init_urls.add(init_url))
+        self.paths.append(None)
+        return SegmentView(self, len(self.groups) - 1)
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def __getitem__(self, row: int) -> 'SegmentView':
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return SegmentView(self, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield SegmentView(self, row)
+
+    def rows(self) -> list['SegmentView']:
+        return list(self)
+
+
+class SegmentView(object):
+    """切片表中一行的视图, 读写都作用在切片表上"""
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table: SegmentTable, row: int):
+        self.table = table
+        self.row = row
+
+    def __repr__(self):
+        return f'SegmentView({self.type}, {self.group_no}, {self.index}, {self.url})'
+
+    @property
+    def type(self) -> str:
+        return self.table.types.values[self.table.type_ids[self.row]]
+
+    @property
+    def group_no(self) -> int:
+        return self.table.groups[self.row]
+
+    @property
+    def index(self) -> int:
+        return self.table.indexes[self.row]
+
+    @property
+    def url(self) -> str:
+        t = self.table
+        return f'{t.url_prefixes.values[t.url_prefix_ids[self.row]]}{t.url_suffixes[self.row]}'
+
+    @property
+    def headers(self) -> dict:
+        return self.table.headers.values[self.table.header_ids[self.row]]
+
+    @headers.setter
+    def headers(self, value: dict):
+        value = value or {}
+        self.table.header_ids[self.row] = self.table.headers.add(value, tuple(sorted(value.items())))
+
+    @property
+    def duration(self) -> float | None:
+        return None if math.isnan(duration := self.table.durations[self.row]) else duration
+
+    @property
+    def discontinuity(self) -> bool:
+        return bool(self.table.flags[self.row] & DISCONTINUITY)
+
+    @property
+    def cipher(self) -> Cipher:
+        return self.table.ciphers.values[self.table.cipher_ids[self.row]]
+
+    @property
+    def init_url(self) -> str | None:
+        return None if (i := self.table.init_url_ids[self.row]) < 0 else self.table.init_urls.values[i]
+
+    @property
+    def confirmed(self) -> bool:
+        return bool(self.table.flags[self.row] & CONFIRMED)
+
+    @confirmed.setter
+    def confirmed(self, value: bool):
+        if value:
+            self.table.flags[self.row] |= CONFIRMED
+        else:
+            self.table.flags[self.row] &= ~CONFIRMED
+
+    @property
+    def filepath(self) -> Path | None:
+        t = self.table
+        if (path := t.paths[self.row]) is None and t.temp_dir is not None:
+            if (path := t.overrides.get((self.row, 'filepath'))) is None:
+                suffix = url_suffix(t.url_suffixes[self.row], self.url)
+                path = t.temp_dir / f'{self.type}_{self.group_no:05}_{self.index:010}{suffix}'
+            t.paths[self.row] = path
+        return path
+
+    @filepath.setter
+    def filepath(self, value: Path):
+        self.table.overrides[self.row, 'filepath'] = self.table.paths[self.row] = value
+
+    @property
+    def init_path(self) -> Path | None:
+        t = self.table
+        if (path := t.overrides.get((self.row, 'init_path'))) is None and self.init_url and t.temp_dir is not None:
+            path = t.temp_dir / init_name(self.type, self.group_no, self.init_url)
+        return path
+
+    @init_path.setter
+    def init_path(self, value: Path):
+        self.table.overrides[self.row, 'init_path'] = value
+
+    def model_dump(self, exclude_none: bool = False) -> dict:
+        """与Segment.model_dump相同的结构, 用于写入断点续传日志"""
+        data = {
+            'type': self.type,
+            'group_no': self.group_no,
+            'index': self.index,
+            'url': self.url,
+            'headers': self.headers,
+            'filepath': self.filepath,
+            'duration': self.duration,
+            'discontinuity': self.discontinuity,
+            'cipher': self.cipher.model_dump(),
+            'init_url': self.init_url,
+            'init_path': self.init_path,
+            'confirmed': self.confirmed,
+        }
+        if exclude_none:
+            data = {k: v for k, v in data.items() if v is not None}
+        return data
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 19:10
+# @Version     : Python 3.14.0
+import argparse
+import heapq
+import hmac
+import http.server
+import itertools
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from vodd.batch import SharedContext
+from vodd.core.files import DAEMON_OUTPUT_DIR, DAEMON_TOKEN_PATH
+from vodd.downloader import Downloader
+from vodd.main import parse_args
+
+logger = logging.getLogger(__name__)
+
+# 接口提交的任务可以使用的参数, 读取本机文件、执行表达式(--drm-request的function)、监听端口的参数不允许使用
+REMOTE_OPTIONS = {
+    '-o', '-r', '-p', '--url', '--headers', '--threads', '--limit-rate', '--limit-burst',
+    '--per-timeout', '--overall-timeout', '--max-download-times', '--chunk-size', '--max-segment-size',
+    '--chunk-file-size', '--range-connections', '--work-stealing', '--segment-size', '--resume',
+    '--adaptive', '--min-threads', '--max-threads', '--adaptive-interval', '--prewarm', '--ordered-write',
+    '--stream-merge', '--engine', '--async-concurrency', '--stream-decrypt', '--decrypt-queue',
+    '--manifest-max-age', '--drm-decrypter',
+}
+# 由commalist执行表达式的参数, 只允许数字列表
+REMOTE_NUMBER_LISTS = {'--height', '--bandwidth', '--framerate'}
+NUMBER_LIST = re.compile(r'^[\d.,\s]*$')
+
+
+def check_remote_argv(argv: list):
+    """
+    校验接口提交的参数, 只允许REMOTE_OPTIONS中的参数, 不允许缩写
+    :param argv:
+    :return:
+    """
+    for i, arg in enumerate(argv):
+        if not arg.startswith('-'):
+            continue
+        name, eq, value = arg.partition('=')
+        if name in REMOTE_NUMBER_LISTS:
+            if not eq:
+                value = argv[i + 1] if i + 1 < len(argv) else ''
+            if not NUMBER_LIST.match(value):
+                raise ValueError(f'{name}只能是数字列表: {value}')
+        elif name not in REMOTE_OPTIONS:
+            raise ValueError(f'不允许通过接口使用的参数: {name}')
+
+
+def resolve_save_path(argv: list, root: Path) -> list:
+    """
+    将接口提交的保存路径(-o)限制在输出文件夹中, 相对路径以输出文件夹为起点
+    :param argv: 已经通过check_remote_argv校验的参数
+    :param root: 输出文件夹
+    :return: 保存路径替换为绝对路径后的参数
+    """
+    root = root.resolve()
+    argv = list(argv)
+    for i, arg in enumerate(argv):
+        name, eq, value = arg.partition('=')
+        if name != '-o':
+            continue
+        if not eq:
+            if i + 1 >= len(argv):
+                raise ValueError('缺少保存路径')
+            value = argv[i + 1]
+        # 解析符号链接和.., 绝对路径会替换掉输出文件夹
+        path = (root / value).resolve()
+        if path == root or not path.is_relative_to(root):
+            raise ValueError(f'保存路径必须在输出文件夹中: {value}')
+        if eq:
+            argv[i] = f'-o={path.as_posix()}'
+        else:
+            argv[i + 1] = path.as_posix()
+    return argv
+
+
+def load_token(token: str = '', path: Path = DAEMON_TOKEN_PATH) -> str:
+    """
+    访问令牌, 未指定时生成随机令牌并写入只有当前用户可以读取的文件
+    :param token: 指定的令牌
+    :param path: 令牌文件
+    :return:
+    """
+    if token:
+        return token
+    token = secrets.token_urlsafe(32)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'w', encoding='utf-8') as f:
+        f.write(token)
+    logger.info(f'访问令牌已写入: {path}')
+    return token
+
+
+class Job(object):
+    """下载服务中的一个任务"""
+
+    def __init__(self, argv: list, priority: int = 0):
+        self.id = uuid.uuid4().hex
+        self.argv = argv
+        self.priority = priority
+        # queued -> running -> finished/failed/cancelled
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.downloader: Downloader | None = None
+        self.result = None
+        self.cancelled = False
+
+    def stop(self):
+        """停止正在执行的下载"""
+        if self.downloader is not None:
+            self.downloader.error = {'message': 'Cancelled', 'reason': '任务已取消'}
+            self.downloader.is_stop_all = True
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('finished', 'failed', 'cancelled')
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'argv': self.argv,
+            'priority': self.priority,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+    def progress(self) -> dict:
+        if self.downloader is None:
+            return {}
+        return {'planning': self.downloader.planning, **self.downloader.stats.snapshot}
+
+
+class JobManager(object):
+    """
+    任务调度
+
+    任务按照优先级(数值越大越优先)和提交顺序执行, 同时执行的任务数由jobs限制,
+    所有任务共享SharedContext中的连接池、插件、密钥缓存、切片并发额度和总带宽,
+    并发额度不足时优先级高的任务先获得
+    """
+
+    def __init__(self, context: SharedContext, jobs: int = 4, keep: int = 1000):
+        self.context = context
+        self.keep = keep
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._workers = [threading.Thread(target=self.worker, daemon=True) for _ in range(max(jobs, 1))]
+        for t in self._workers:
+            t.start()
+
+    def submit(self, argv: list, priority: int = 0) -> Job:
+        # 提前校验参数, 错误的任务不进入队列
+        parse_args(argv)
+        job = Job(argv, priority)
+        with self._cond:
+            self.jobs[job.id] = job
+            heapq.heappush(self._queue, (-priority, next(self._seq), job))
+            self._prune()
+            self._cond.notify()
+        logger.info(f'提交任务: {job.id}, 优先级: {priority}, {argv}')
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Job | None:
+        with self._cond:
+            if (job := self.jobs.get(job_id)) is None or job.done:
+                return job
+            job.cancelled = True
+            if job.status == 'queued':
+                # 已经在队列中的任务由工作线程取出时跳过
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+                job.result = {'error': {'message': 'Cancelled', 'reason': '任务已取消'}, 'save_path': ''}
+            else:
+                # 下载器还未创建时, 创建后立即停止
+                job.stop()
+        logger.info(f'取消任务: {job_id}')
+        return job
+
+    def _prune(self):
+        """只保留最近keep个已结束的任务"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(len(finished) - self.keep, 0)]:
+            del self.jobs[job_id]
+
+    def worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                job = heapq.heappop(self._queue)[2]
+                if job.status != 'queued':
+                    continue
+                job.status = 'running'
+                job.started_at = time.time()
+            self.execute(job)
+
+    def execute(self, job: Job):
+        try:
+            downloader = Downloader(
+                **parse_args(job.argv), context=self.context, show_progress=False, priority=job.priority
+            )
+            with self._cond:
+                job.downloader = downloader
+                if job.cancelled:
+                    job.stop()
+            job.result = downloader.start()
+        except Exception as e:
+            logger.error(f'任务异常: {job.id}, {e}')
+            traceback.print_exc()
+            job.result = {'error': {'message': 'Exception', 'reason': str(e)}, 'save_path': ''}
+        with self._cond:
+            if not job.result['error']:
+                job.status = 'finished'
+            elif job.result['error'].get('message') == 'Cancelled':
+                job.status = 'cancelled'
+            else:
+                job.status = 'failed'
+            job.finished_at = time.time()
+            self._prune()
+        logger.info(f'任务结束: {job.id}, 状态: {job.status}')
+
+    def close(self):
+        """停止调度并取消正在执行的任务"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            running = [job.id for job in self.jobs.values() if job.status == 'running']
+        for job_id in running:
+            self.cancel(job_id)
+
+    def summary(self) -> dict:
+        counts = {}
+        for job in list(self.jobs.values()):
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            'jobs': counts,
+            'active_workers': self.context.budget.active,
+            'max_workers': self.context.budget.limit,
+            'limit_rate': self.context.limiter.rate,
+            'connections': self.context.connections.stats(),
+        }
+
+
+class DaemonServer(object):
+    """
+    本地HTTP任务接口
+
+    所有请求都需要携带请求头 Authorization: Bearer <令牌>, 提交任务的请求体必须是application/json,
+    防止本机网页通过跨站请求提交任务; 保存路径只能在输出文件夹中
+
+    POST   /jobs                 提交任务, {"argv": [...], "priority": 0}
+    GET    /jobs                 所有任务
+    GET    /jobs/<id>            任务状态
+    GET    /jobs/<id>/progress   下载进度
+    GET    /jobs/<id>/result     任务结果, 未结束时返回409
+    DELETE /jobs/<id>            取消任务
+    GET    /status               服务状态
+    """
+
+    def __init__(
+            self,
+            manager: JobManager,
+            token: str,
+            host: str = '127.0.0.1',
+            port: int = 8765,
+            output_root: Path = DAEMON_OUTPUT_DIR,
+    ):
+        self.manager = manager
+        self.token = token
+        self.output_root = Path(output_root)
+        self.address = (host, port)
+        self._server = None
+
+    def build_handler(self):
+        manager = self.manager
+        token = self.token.encode('utf-8')
+        output_root = self.output_root
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def reply(self, code: int, data):
+                body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def authorized(self) -> bool:
+                scheme, _, credential = (self.headers.get('Authorization') or '').partition(' ')
+                if scheme.lower() == 'bearer' and hmac.compare_digest(credential.strip().encode('utf-8'), token):
+                    return True
+                self.reply(401, {'error': '令牌错误'})
+                return False
+
+            def route(self) -> tuple[Job | None, str]:
+                parts = self.path.split('?', 1)[0].strip('/').split('/')
+                if len(parts) < 2 or parts[0] != 'jobs':
+                    return None, ''
+                return manager.get(parts[1]), parts[2] if len(parts) > 2 else ''
+
+            def do_GET(self):
+                if not self.authorized():
+                    return
+                path = self.path.split('?', 1)[0].rstrip('/')
+                if path == '/status':
+                    return self.reply(200, manager.summary())
+                if path == '/jobs':
+                    return self.reply(200, [job.to_dict() for job in list(manager.jobs.values())])
+                job, action = self.route()
+                if job is None:
+                    return self.reply(404, {'error': '任务不存在'})
+                if action == '':
+                    return self.reply(200, job.to_dict())
+                if action == 'progress':
+                    return self.reply(200, job.progress())
+                if action == 'result':
+                    if not job.done:
+                        return self.reply(409, {'error': '任务未结束', 'status': job.status})
+                    return self.reply(200, job.result)
+                return self.reply(404, {'error': '未知接口'})
+
+            def do_POST(self):
+                if not self.authorized():
+                    return
+                if self.path.split('?', 1)[0].rstrip('/') != '/jobs':
+                    return self.reply(404, {'error': '未知接口'})
+                if (self.headers.get('Content-Type') or '').split(';', 1)[0].strip().lower() != 'application/json':
+                    return self.reply(415, {'error': '请求体必须是application/json'})
+                try:
+                    data = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                    if not isinstance(argv := data.get('argv'), list):
+                        raise ValueError('argv必须是参数列表')
+                    check_remote_argv(argv := [str(x) for x in argv])
+                    argv = resolve_save_path(argv, output_root)
+                    job = manager.submit(argv, int(data.get('priority') or 0))
+                except Exception as e:
+                    return self.reply(400, {'error': str(e)})
+                return self.reply(201, job.to_dict())
+
+            def do_DELETE(self):
+                if not self.authorized():
+                    return
+                job, action = self.route()
+                if job is None or action:
+                    return self.reply(404, {'error': '任务不存在'})
+                return self.reply(200, manager.cancel(job.id).to_dict())
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def serve_forever(self):
+        self._server = http.server.ThreadingHTTPServer(self.address, self.build_handler())
+        self._server.daemon_threads = True
+        logger.info(f'下载服务: http://{self.address[0]}:{self._server.server_address[1]}')
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(usage='VOD Downloader Daemon', description='--help')
+    parser.add_argument('--host', type=str, default='127.0.0.1', dest='host', help='监听地址')
+    parser.add_argument('--port', type=int, default=8765, dest='port', help='监听端口')
+    parser.add_argument('--jobs', type=int, default=4, dest='jobs', help='同时执行的任务数量')
+    parser.add_argument('--max-workers', type=int, default=64, dest='max_workers',
+                        help='所有任务同时下载的切片总数,0表示不限制')
+    parser.add_argument('--pool-size', type=int, default=100, dest='pool_size', help='共享连接池中每个域名的连接数')
+    parser.add_argument('--limit-rate', type=float, default=0, dest='limit_rate', help='所有任务的总限速,单位MB/s,0表示不限速')
+    parser.add_argument('--decrypt-processes', type=int, default=0, dest='decrypt_processes',
+                        help='所有任务共享的解密进程数量,默认为CPU核心数')
+    parser.add_argument('--keep', type=int, default=1000, dest='keep', help='保留的已结束任务数量')
+    parser.add_argument('--token', type=str, default='', dest='token',
+                        help='访问令牌,默认生成随机令牌并写入临时文件夹中的daemon.token')
+    parser.add_argument('--output-root', type=str, default=DAEMON_OUTPUT_DIR.as_posix(), dest='output_root',
+                        help='输出文件夹,接口提交的保存路径(-o)相对于这个文件夹,不允许保存到文件夹之外')
+    return parser
+
+
+def main(argv: list = None):
+    args = build_parser().parse_args(argv)
+    context = SharedContext(args.max_workers, args.pool_size, args.limit_rate, args.decrypt_processes)
+    manager = JobManager(context, args.jobs, args.keep)
+    logger.info(f'同时执行: {args.jobs}, 切片并发上限: {args.max_workers}, 总限速: {args.limit_rate}MB/s')
+    (output_root := Path(args.output_root)).mkdir(parents=True, exist_ok=True)
+    try:
+        DaemonServer(manager, load_token(args.token), args.host, args.port, output_root).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.close()
+        context.close()
+
+
+if __name__ == '__main__':
+    main()
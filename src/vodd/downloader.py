@@ -2,11 +2,14 @@
 # @Author      : LJQ
 # @Time        : 2025/9/16 11:01
 # @Version     : Python 3.13.7
+import contextlib
 import copy
+import itertools
 import json
 import logging
 import math
 import os
+import queue
 import shutil
 import subprocess
 import sys
@@ -16,20 +19,33 @@ from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor
 from hashlib import md5
 from pathlib import Path
+from typing import TYPE_CHECKING
 from urllib.parse import urlparse
 
 import requests
 import urllib3
-from prettytable import PrettyTable
 
-from vodd.core.algorithms import check_dts, check_video, convert_to_num, format_duration
-from vodd.core.constants import MediaName
+from vodd.core.algorithms import check_dts, check_video, convert_to_num, format_duration, sniff_plugin
+from vodd.core.constants import ASYNC_CONCURRENCY, MediaName
 from vodd.core.exceptions import *
-from vodd.core.files import ERROR_DIR, TEMP_DIR
-from vodd.core.models import Segment
+from vodd.core.files import ERROR_DIR, MANIFEST_CACHE_DIR, TEMP_DIR, find_executable
+from vodd.core.segment_table import SegmentView, init_name, segment_name
 from vodd.plugins import get_all_plugins
 from vodd.plugins.__base_plugin__ import BasePlugin
+from vodd.utils.concurrency import AdaptiveController
+from vodd.utils.connection import ConnectionManager
+from vodd.utils.file_copy import append_file, open_for_append
+from vodd.utils.journal import Journal
+from vodd.utils.limiter import TokenBucket
+from vodd.utils.manifest_cache import Manifest, ManifestCache
+from vodd.utils.muxer import StreamingMuxer
+from vodd.utils.pipeline import DecryptStage, StageMeter
+from vodd.utils.progress import MetricsServer, ProgressStats
 from vodd.utils.request_adapter import get_request_kwargs
+from vodd.utils.track_writer import OrderedTrackWriter, PipeTrackWriter
+
+if TYPE_CHECKING:
+    from vodd.core.models import Segment
 
 logger = logging.getLogger(__name__)
 
@@ -37,13 +53,15 @@ logger = logging.getLogger(__name__)
 class Downloader(object):
 
     def __init__(self, save_path: str, rate: int = 5, **kwargs):
-        if ffmpeg_path := shutil.which('ffmpeg'):
+        # 批量下载时由所有任务共享Session、连接池、密钥缓存和全局并发额度
+        self.context = kwargs.get('context')
+        if ffmpeg_path := (self.context.ffmpeg_path if self.context is not None else find_executable('ffmpeg')):
             self.ffmpeg_path = ffmpeg_path
         else:
             raise FFmpegNotFoundError('找不到FFmpeg程序,当前程序即刻停止')
         # 必须参数
         self.save_path = Path(save_path)
-        self.threads_num = math.ceil(rate)
+        self.threads_num = kwargs.get('threads') or math.ceil(rate)
         self.kwargs = kwargs
         # 可选参数
         self.temp_dir = TEMP_DIR / md5(self.save_path.as_posix().encode('utf-8')).hexdigest()
@@ -54,12 +72,47 @@ class Downloader(object):
         self.chunk_size = kwargs['chunk_size']
         self.max_segment_size = kwargs['max_segment_size']
         self.chunk_file_size = kwargs['chunk_file_size']
+        self.range_connections = kwargs.get('range_connections') or 1
+        self.work_stealing = kwargs.get('work_stealing', True)
         self.segment_size = kwargs['segment_size']
+        self.engine = kwargs.get('engine') or 'thread'
+        self.async_concurrency = max(kwargs.get('async_concurrency') or ASYNC_CONCURRENCY, 1)
+        self.resume = kwargs.get('resume', False)
+        self.limiter = TokenBucket(
+            (kwargs.get('limit_rate') or 0) * 1024 * 1024,
+            (kwargs.get('limit_burst') or 0) * 1024 * 1024,
+            parent=self.context.limiter if self.context is not None else None,
+        )
+        self.controller = AdaptiveController(
+            self.threads_num,
+            min_workers=kwargs.get('min_threads') or 1,
+            max_workers=kwargs.get('max_threads') or 32,
+            interval=kwargs.get('adaptive_interval') or 5,
+            enabled=kwargs.get('adaptive', False),
+        )
         # 控制参数
         self.chunked_mode = False
         self.is_stop_all = False
         self.start_time = time.time()
-        self.session = requests.Session()
+        if self.context is not None:
+            self.session = self.context.session
+            self.connections = self.context.connections
+        else:
+            self.session = requests.Session()
+            self.connections = ConnectionManager(
+                self.session,
+                pool_size=kwargs.get('pool_size') or max(
+                    self.threads_num, self.controller.max_workers if self.controller.enabled else 0, 10
+                ),
+                host_pool_sizes=kwargs.get('host_pool_sizes'),
+                host_limits=kwargs.get('host_limits'),
+            )
+        self.priority = kwargs.get('priority') or 0
+        self.budget = self.context.budget.slot(self.priority) if self.context is not None else contextlib.nullcontext()
+        self.show_progress = kwargs.get('show_progress', True)
+        self.prewarm = kwargs.get('prewarm', False)
+        self.ordered_write = kwargs.get('ordered_write', True)
+        self.stream_merge = kwargs.get('stream_merge', False)
         self.request_kwargs = get_request_kwargs(**kwargs)
         self.core = DownloadCore(self)
         self.tasks = []
@@ -67,18 +120,57 @@ class Downloader(object):
         self.inits = defaultdict(lambda: {})
         self.error = {}
         self.plugin: BasePlugin | None = None
+        self.plugin_name = ''
+        self.journal = Journal(self.temp_dir, enabled=self.resume)
         self.concat_paths = defaultdict(lambda: [])
+        self.writers: dict[tuple, OrderedTrackWriter] = {}
+        self.muxer: StreamingMuxer | None = None
         self.downloaded_size = defaultdict(lambda: [0, 0])
+        # 被拆分的切片只下载到拆分点, 剩余部分由其他线程接管
+        self.range_ends = {}
+        self.closed_ranges = set()
+        self.range_lock = threading.Lock()
+        self.stats = ProgressStats()
+        # 边规划边下载: 规划线程产出的切片通过队列交给下载线程
+        self.planning = False
+        self.plan_queue = queue.Queue()
+        self.task_iter = iter(())
+        self.task_lock = threading.Lock()
+        self.stats_file = Path(kwargs['stats_file']) if kwargs.get('stats_file') else None
+        self.metrics_port = kwargs.get('metrics_port')
+        self.metrics_host = kwargs.get('metrics_host') or '127.0.0.1'
+        self.metrics: MetricsServer | None = None
+        # 解密阶段: 下载线程只负责下载和获取密钥, 解密在进程池中执行;
+        # 作为库使用时默认在下载线程中解密, 批量下载时所有任务共享SharedContext中的进程池
+        processes = kwargs.get('decrypt_processes')
+        self.decrypt_stage = DecryptStage(
+            (1 if self.context is not None else 0) if processes is None else processes,
+            kwargs.get('decrypt_queue') or 0,
+            on_error=self.fail,
+            shared=self.context.decrypt_pool if self.context is not None else None,
+        )
+        self.download_meter = StageMeter()
+        self.stream_decrypt = kwargs.get('stream_decrypt', True)
+        self.manifest_cache = ManifestCache(
+            kwargs.get('manifest_cache') or MANIFEST_CACHE_DIR,
+            kwargs.get('manifest_max_age') or 0,
+            int(kwargs.get('manifest_cache_size', 64) * 1024 * 1024),
+        )
+        # 判断插件时获取的播放链接响应, 插件直接使用, 不再重复请求
+        self.probe: Manifest | None = None
 
     def requester(self, method: str, url: str, **kwargs):
         code = None
         for i in range(self.max_download_times):
+            st_time = time.time()
             try:
                 r_headers = (crk := copy.deepcopy(self.request_kwargs)).get('headers', {})
                 k_headers = (ck := copy.deepcopy(kwargs)).pop('headers', {})
                 r_headers.update(k_headers)
                 crk.update(ck)
-                if (resp := self.session.request(method, url, **crk)).ok:
+                resp = self.session.request(method, url, **crk)
+                self.controller.record(resp.status_code, time.time() - st_time)
+                if resp.ok:
                     break
                 code = resp.status_code
             except requests.exceptions.SSLError:
@@ -87,22 +179,41 @@ class Downloader(object):
                 logger.warning('检测到存在SSL认证，已自动忽略')
                 time.sleep(0.1)
             except (requests.exceptions.RequestException, Exception) as e:
+                self.controller.record(None, time.time() - st_time)
                 logger.error(f'第{i + 1}次请求异常: {e}')
                 time.sleep(0.1)
         else:
             raise HTTPStatusCodeError(f'{code}')
         return resp
 
+    def fetch_manifest(self, url: str, planner=None) -> Manifest:
+        """
+        获取MPD/m3u8清单, 经过本机的清单缓存
+        :param url:
+        :param planner: 解析函数, 解析结果与清单一起缓存
+        :return:
+        """
+        if (probe := self.probe) is not None and url in (self.kwargs['url'], probe.url):
+            if self.manifest_cache.enabled:
+                return self.manifest_cache.fetch(self.requester, self.kwargs['url'], planner, fresh=True)
+            return Manifest(probe.url, probe.text, planner(probe.text, probe.url) if planner else None)
+        return self.manifest_cache.fetch(self.requester, url, planner)
+
     @property
     def is_all_confirmed(self) -> bool:
         """
-        是否所有的下载任务都已经确认
+        是否所有的下载任务都已经确认, 由确认计数判断, 不需要遍历所有切片
         :return:
         """
-        for task in self.tasks:
-            if task.confirmed is False:
-                return False
-        return True
+        return not self.planning and self.stats.is_complete
+
+    @property
+    def pending_tasks(self) -> list:
+        """尚未确认的下载任务, 流式合并时按照播放进度交错排列各个轨道"""
+        tasks = [task for task in self.tasks if not task.confirmed]
+        if self.muxer is not None:
+            tasks.sort(key=self.core.get_progress)
+        return tasks
 
     @staticmethod
     def remove(file: Path):
@@ -117,8 +228,62 @@ class Downloader(object):
         并发下载任务
         :return:
         """
-        with ThreadPoolExecutor(max_workers=self.threads_num) as executor:
-            list(executor.map(self.download, self.tasks))
+        if self.engine == 'asyncio':
+            from vodd.async_downloader import AsyncEngine
+            AsyncEngine(self).run()
+            return
+        # 自适应并发时线程数量取上限, 实际同时下载的数量由控制器决定
+        max_workers = self.controller.max_workers if self.controller.enabled else self.threads_num
+
+        def worker():
+            # 任务分配完后向插件申请拆分正在下载的切片, 没有可拆分的切片时退出
+            while not self.is_stop_all:
+                if (task := self.next_task()) is None and (task := self.plugin.steal()) is None:
+                    return
+                self.download(task)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in [executor.submit(worker) for _ in range(max_workers)]:
+                future.result()
+
+    def next_task(self) -> Segment | None:
+        """取出下一个下载任务, 边规划边下载时等待规划线程产出新的切片"""
+        with self.task_lock:
+            return next(self.task_iter, None)
+
+    def add_task(self, segment: Segment, after: Segment):
+        """
+        下载过程中新增的任务, 例如拆分出来的切片
+        :param segment: 新的切片, 序号在after与下一个切片之间
+        :param after: 在轨道中排在新切片之前的切片
+        :return:
+        """
+        self.core.add_segment_path(segment)
+        group = self.segments[segment.type][segment.group_no]
+        group.insert(next(i for i, s in enumerate(group) if s is after) + 1, segment)
+        if writer := self.writers.get((segment.type, segment.group_no)):
+            writer.insert(segment, after)
+        self.tasks.append(segment)
+        self.stats.add_task()
+        self.journal.write('segment', data=segment.model_dump(exclude_none=True))
+
+    def confirm(self, task: Segment):
+        """
+        切片下载并解密完成, 记录到断点续传日志中, 并交给轨道写入器按顺序写入
+
+        实际下载的大小与Content-Length不一致时不记录, 下次续传时重新下载
+        :param task:
+        :return:
+        """
+        downloaded, total = self.downloaded_size.get(task.filepath.name, (0, 0))
+        size = task.filepath.stat().st_size
+        if total and downloaded != total:
+            logger.warning(f'切片大小不一致: {task.filepath.name}, {downloaded}/{total}')
+        else:
+            self.journal.write('confirmed', name=task.filepath.name, size=size, length=total)
+        self.stats.complete(task.filepath.name, size)
+        if writer := self.writers.get((task.type, task.group_no)):
+            writer.push(task)
 
     def download_inits(self):
         for mt, keys in self.inits.items():
@@ -126,7 +291,8 @@ class Downloader(object):
                 try:
                     if self.is_stop_all:
                         return
-                    self.smart_save(segment.init_url, segment.headers, segment.init_path)
+                    self.download_init(segment)
+                    self.plugin.prefetch_keys(segment)
                 except DownloadException as e:
                     self.is_stop_all = True
                     self.error = e.__dict__
@@ -134,6 +300,20 @@ class Downloader(object):
                     self.is_stop_all = True
                     logger.error(f'下载元数据异常: {mt}.{key[0]}, {e}')
 
+    def is_init_confirmed(self, segment: Segment) -> bool:
+        """元数据文件已经完整下载, 本次运行中或者断点续传日志中有记录"""
+        return self.journal.is_complete(segment.init_path, self.journal.inits.get(segment.init_path.name))
+
+    def download_init(self, segment: Segment):
+        if self.is_init_confirmed(segment):
+            return
+        self.smart_save(segment.init_url, segment.headers, segment.init_path)
+        # 未开启断点续传时也在内存中记录, 同一个元数据文件只下载一次
+        record = self.journal.inits[segment.init_path.name] = {
+            'name': segment.init_path.name, 'size': segment.init_path.stat().st_size,
+        }
+        self.journal.write('init', **record)
+
     def download(self, task: Segment):
         try:
             if self.is_stop_all:
@@ -141,9 +321,15 @@ class Downloader(object):
             if (duration := time.time() - self.start_time) > self.overall_timeout:
                 logger.warning(f'下载已超时：{int(duration)}, 终止程序运行')
                 raise ReachMaxDownloadLimitError(f'timeout: {int(duration)}')
-            self.smart_save(task.url, task.headers, task.filepath)
+            # 可以流式解密时在下载过程中解密, 否则下载完成后交给解密阶段
+            transform = self.plugin.stream_transform(task) if self.stream_decrypt else None
+            with self.controller, self.budget, self.download_meter.measure():
+                self.smart_save(task.url, task.headers, task.filepath, transform)
             task.confirmed = True
-            self.plugin.decrypt(task).rename(task.filepath)
+            if transform is not None:
+                self.confirm(task)
+            else:
+                self.decrypt(task)
         except DownloadException as e:
             self.is_stop_all = True
             self.error = e.__dict__
@@ -151,89 +337,349 @@ class Downloader(object):
             self.is_stop_all = True
             logger.error(f'下载任务异常: {e}')
 
-    def smart_save(self, url: str, headers: dict, path: Path, ):
+    def decrypt(self, task: Segment):
+        """
+        解密并确认切片, 交给解密进程时不等待解密完成
+        :param task:
+        :return:
+        """
+        if self.decrypt_stage.enabled and (job := self.plugin.decrypt_task(task)) is not None:
+            self.decrypt_stage.submit(job, lambda path: self.finish(task, Path(path)))
+            return
+        with self.decrypt_stage.decrypt_meter.measure():
+            path = self.plugin.decrypt(task)
+        self.finish(task, path)
+
+    def finish(self, task: Segment, path: Path):
+        path.rename(task.filepath)
+        self.confirm(task)
+
+    def fail(self, e: Exception):
+        """解密阶段的异常与下载异常相同, 终止所有任务"""
+        self.is_stop_all = True
+        if isinstance(e, DownloadException):
+            self.error = e.__dict__
+        else:
+            logger.error(f'解密任务异常: {e}')
+
+    def stage_report(self) -> dict:
+        """下载、解密和收尾各阶段的利用率"""
+        if self.engine == 'asyncio':
+            workers = self.async_concurrency
+        else:
+            workers = self.controller.limit if self.controller.enabled else self.threads_num
+        return {'download': self.download_meter.report(workers), **self.decrypt_stage.report(workers)}
+
+    def smart_save(self, url: str, headers: dict, path: Path, transform=None):
         rk = {}
         if headers:
             rk['headers'] = headers
         self.downloaded_size.pop(path.name, None)
+        with self.connections.limit(url):
+            if transform is not None:
+                self.stream_save(url, rk, path, transform)
+            else:
+                self._smart_save(url, rk, path)
+
+    def stream_save(self, url: str, rk: dict, path: Path, transform):
+        """
+        边下载边转换, 转换后的数据直接写入文件, 不再读回内存
+
+        转换器依赖数据的先后顺序, 因此不使用多个连接分段下载
+        :param url:
+        :param rk:
+        :param path:
+        :param transform: Plugin.stream_transform返回的转换器
+        :return:
+        """
+        st_time = time.time()
+        with self.requester('get', url, stream=True, **rk) as resp, open(path, 'wb') as f:
+            self.downloaded_size[path.name][1] = int(resp.headers.get('Content-Length', 0))
+            for chunk in resp.iter_content(self.chunk_size):
+                f.write(transform.update(chunk))
+                self.downloaded_size[path.name][0] += len(chunk)
+                self.stats.add_bytes(len(chunk))
+                self.limiter.consume(len(chunk))
+                if self.chunked_mode:
+                    self.check_timeout(st_time, path)
+            f.write(transform.final())
+        if not self.downloaded_size[path.name][1]:
+            self.downloaded_size[path.name][1] = self.downloaded_size[path.name][0]
+
+    def _smart_save(self, url: str, rk: dict, path: Path):
         if self.chunked_mode:
             st_time = time.time()
-            with self.requester('get', url, stream=True, **rk) as resp, open(path, 'wb') as f:
-                self.downloaded_size[path.name][1] = int(resp.headers.get('Content-Length', 0))
+            with self.requester('get', url, stream=True, **rk) as resp:
+                length = int(resp.headers.get('Content-Length', 0))
+                if self.is_rangeable(resp.status_code, resp.headers, length):
+                    # 当前连接下载第一个分段, 其余分段使用新的连接
+                    if self.ranged_save(url, rk, path, length, st_time, resp):
+                        return
+                else:
+                    self.single_save(resp, path, length, st_time)
+                    return
+            # 服务器不支持分段下载, 重新使用单个连接下载
+            with self.requester('get', url, stream=True, **rk) as resp:
+                self.single_save(resp, path, int(resp.headers.get('Content-Length', 0)), st_time)
+        elif self.limiter.enabled:
+            # 限速时也需要分块读取, 否则无法控制单个切片的下载速度
+            content = bytearray()
+            with self.requester('get', url, stream=True, **rk) as resp:
                 for chunk in resp.iter_content(self.chunk_size):
-                    f.write(chunk)
-                    self.downloaded_size[path.name][0] += len(chunk)
-                    if (
-                            (duration := time.time() - self.start_time) > self.overall_timeout
-                            or (duration := time.time() - st_time) > self.per_timeout
-                    ):
-                        self.downloaded_size.pop(path.name, None)
-                        logger.warning(f'下载已超时：{int(duration)}, 终止程序运行')
-                        raise ReachMaxDownloadLimitError(f'timeout: {int(duration)}')
+                    content += chunk
+                    self.stats.add_bytes(len(chunk))
+                    self.limiter.consume(len(chunk))
+            path.write_bytes(content)
+            self.downloaded_size[path.name] = [len(content), len(content)]
         else:
             resp = self.requester('get', url, **rk)
             path.write_bytes(resp.content)
+            self.stats.add_bytes(len(resp.content))
             self.downloaded_size[path.name] = [len(resp.content), len(resp.content)]
 
+    def single_save(self, resp: requests.Response, path: Path, length: int, st_time: float):
+        """分块模式下使用单个连接下载切片"""
+        self.downloaded_size[path.name] = [0, length]
+        with open(path, 'wb') as f:
+            for chunk in resp.iter_content(self.chunk_size):
+                f.write(chunk)
+                self.downloaded_size[path.name][0] += len(chunk)
+                self.stats.add_bytes(len(chunk))
+                self.limiter.consume(len(chunk))
+                self.check_timeout(st_time, path)
+                if self.downloaded_size[path.name][0] >= self.range_ends.get(path.name, math.inf):
+                    break
+            self.close_range(path, f)
+
+    def close_range(self, path: Path, f):
+        """切片下载结束, 剩余部分已经被其他线程接管时截断到拆分点"""
+        with self.range_lock:
+            self.closed_ranges.add(path.name)
+            if (end := self.range_ends.get(path.name)) is not None:
+                f.truncate(end)
+                self.downloaded_size[path.name] = [end, end]
+
+    def check_timeout(self, st_time: float, path: Path):
+        if (
+                (duration := time.time() - self.start_time) > self.overall_timeout
+                or (duration := time.time() - st_time) > self.per_timeout
+        ):
+            self.downloaded_size.pop(path.name, None)
+            logger.warning(f'下载已超时：{int(duration)}, 终止程序运行')
+            raise ReachMaxDownloadLimitError(f'timeout: {int(duration)}')
+
+    def is_rangeable(self, status_code: int, headers, length: int) -> bool:
+        """
+        是否可以拆分为多个连接分段下载
+        :param status_code: 第一个响应的状态码
+        :param headers: 第一个响应的响应头, 不区分大小写
+        :param length: 切片大小
+        :return:
+        """
+        return (
+                self.range_connections > 1
+                and length >= 2 * self.chunk_size
+                and (status_code == 206 or headers.get('Accept-Ranges', '').lower() == 'bytes')
+                and headers.get('Content-Encoding', 'identity').lower() == 'identity'
+        )
+
+    def ranged_save(
+            self, url: str, rk: dict, path: Path, length: int, st_time: float, first: requests.Response = None
+    ) -> bool:
+        """
+        多个连接分段下载大切片
+
+        每个分段写入预分配文件的对应位置, 失败的分段从中断的位置单独重试, 不需要重新下载整个切片
+        :param url:
+        :param rk: 切片的请求参数, 已有Range时在该范围内拆分
+        :param path:
+        :param length: 切片大小
+        :param st_time: 切片开始下载的时间
+        :param first: 已经发出的完整请求, 用于下载第一个分段
+        :return: 服务器忽略Range(没有返回206)时返回False, 需要改为单个连接下载
+        """
+        headers = {k: v for k, v in (rk.get('headers') or {}).items() if k.lower() != 'range'}
+        offset = 0
+        for k, v in (rk.get('headers') or {}).items():
+            if k.lower() == 'range':
+                offset = int(v.split('=', 1)[1].split('-', 1)[0])
+        parts = min(self.range_connections, math.ceil(length / self.chunk_size))
+        part_size = math.ceil(length / parts)
+        ranges = [(start, min(start + part_size, length)) for start in range(0, length, part_size)]
+        self.downloaded_size[path.name] = [0, length]
+        with open(path, 'wb') as f:
+            f.truncate(length)
+        lock = threading.Lock()
+        unsupported = threading.Event()
+
+        def fetch(start: int, end: int, resp: requests.Response = None):
+            position = start
+            for i in range(self.max_download_times):
+                try:
+                    if resp is None:
+                        resp = self.requester(
+                            'get', url, stream=True,
+                            headers={**headers, 'range': f'bytes={offset + position}-{offset + end - 1}'},
+                        )
+                        if resp.status_code != 206:
+                            logger.warning(f'服务器不支持分段下载: {path.name}, {resp.status_code}')
+                            resp.close()
+                            unsupported.set()
+                            return
+                    with resp, open(path, 'r+b') as f:
+                        f.seek(position)
+                        for chunk in resp.iter_content(self.chunk_size):
+                            if unsupported.is_set():
+                                return
+                            chunk = chunk[:end - position]
+                            f.write(chunk)
+                            position += len(chunk)
+                            with lock:
+                                self.downloaded_size[path.name][0] += len(chunk)
+                            self.stats.add_bytes(len(chunk))
+                            self.limiter.consume(len(chunk))
+                            self.check_timeout(st_time, path)
+                            if position >= end:
+                                break
+                    if position >= end:
+                        return
+                except DownloadException:
+                    raise
+                except Exception as e:
+                    logger.error(f'第{i + 1}次分段下载异常: {path.name}, {position}-{end}, {e}')
+                    time.sleep(0.1)
+                finally:
+                    resp = None
+            raise DownloadTaskError(f'分段下载失败: {path.name}, {position}-{end}')
+
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [executor.submit(fetch, start, end, first if start == 0 else None) for start, end in ranges]
+            for future in futures:
+                future.result()
+        return not unsupported.is_set()
+
+    def set_rate_limit(self, rate: float, burst: float = 0):
+        """
+        运行时调整限速
+        :param rate: MB/s, 0表示不限速
+        :param burst: MB, 0表示1秒的带宽
+        :return:
+        """
+        self.limiter.set_rate(rate * 1024 * 1024, burst * 1024 * 1024)
+        logger.info(f'调整限速: {rate}MB/s')
+
     def wipe(self):
         logger.info(f'删除缓存文件夹: {self.temp_dir}')
         shutil.rmtree(self.temp_dir, ignore_errors=True)
 
     def watchdog(self):
         while True:
-            if self.is_stop_all or self.is_all_confirmed:
-                sys.stdout.write("\n")
-                break
+            finished = self.is_stop_all or self.is_all_confirmed
             try:
-                downloadeds = 0
-                totals = 0
-                for d, t in self.downloaded_size.values():
-                    downloadeds += d
-                    totals += t
-                cost = max(time.time() - self.start_time, 0.05)
-                download_num = max(len(self.downloaded_size), 1)
-                max_num = max(len(self.tasks), len(self.downloaded_size))
-                predicted_cost = int(totals / (downloadeds or 1) * cost * max_num / download_num)
+                stats = self.stats.update(
+                    concurrency=self.controller.limit if self.controller.enabled else self.threads_num,
+                    stages=self.stage_report(),
+                )
+                if self.stats_file is not None:
+                    self.stats.write(self.stats_file)
+                if finished:
+                    if self.show_progress:
+                        sys.stdout.write("\n")
+                    break
+                downloaded = stats['downloaded_bytes']
+                totals = downloaded + stats['remaining_bytes']
+                cost = max(stats['elapsed'], 0.05)
+                predicted_cost = int(cost + stats['eta']) if stats['eta'] is not None else 0
+                if decision := self.controller.adjust(downloaded):
+                    if self.show_progress:
+                        sys.stdout.write("\n")
+                    logger.info(f'调整并发数: {decision}')
+                if not self.show_progress:
+                    time.sleep(1)
+                    continue
                 # 耗时使用00:00, 文件大小使用MB, 速度使用MB/s
                 sys.stdout.write(
                     f"\r{time.strftime('%Y-%m-%d %H:%M:%S')} "
-                    f"耗时: {format_duration(cost)}, 预估总耗时: {format_duration(predicted_cost)}, 速度: {downloadeds / 1024 / 1024 / cost:.2f}MB/s, "
-                    f"{downloadeds / (totals or 1) * 100:6.2f}%({round(downloadeds / 1024 / 1024, 1)}MB/{round(totals / 1024 / 1024, 1)}MB), "
-                    f"{download_num / max_num * 100:6.2f}%({download_num}/{max_num})"
+                    f"耗时: {format_duration(cost)}, 预估总耗时: {format_duration(predicted_cost)}, 速度: {stats['speed'] / 1024 / 1024:.2f}MB/s, "
+                    f"{downloaded / (totals or 1) * 100:6.2f}%({round(downloaded / 1024 / 1024, 1)}MB/{round(totals / 1024 / 1024, 1)}MB), "
+                    f"{stats['completed'] / max(stats['total'], 1) * 100:6.2f}%({stats['completed']}/{stats['total']})"
+                    f"{f', 并发: {self.controller.limit}' if self.controller.enabled else ''}"
                 )
                 sys.stdout.flush()
             except Exception as e:
                 logger.exception(e)
+                if finished:
+                    break
             time.sleep(1)
 
     def start(self):
         """
         开启下载程序
 
-        下载前删除已存在的临时文件夹
+        下载前删除已存在的临时文件夹, 断点续传模式下存在有效日志时保留
         所有任务下载成功后则合并临时文件夹到指定路径
         删除临时文件夹
         :return:
         """
-        self.wipe()
+        if not (resumed := self.resume and self.journal.load(self.kwargs['url'])):
+            self.wipe()
         try:
             self.temp_dir.mkdir(parents=True, exist_ok=True)
-            self.plugin = self.core.get_suitable_plugin()
-            logger.info(f'使用插件：{self.plugin.__class__.__name__}')
-            formats = self.core.select()
-            segments = self.plugin.get_segments(formats)
-            if self.segment_size:
-                segments = segments[:self.segment_size]
-            self.tasks = segments
-            self.core.add_segments_path()
-            logger.info(f'总任务数：{len(self.tasks)}')
-            self.core.classify()
-            self.core.check_video(self.core.pre_download(self.tasks[0]))
-            self.download_inits()
+            if resumed:
+                self.core.restore()
+                logger.info(f'总任务数：{len(self.tasks)}')
+                self.core.classify()
+                streaming = False
+            else:
+                self.plugin = self.core.get_suitable_plugin()
+                logger.info(f'使用插件：{self.plugin.__class__.__name__}')
+                formats = self.core.select()
+                segments = self.plugin.iter_segments(formats)
+                if self.segment_size:
+                    segments = itertools.islice(segments, self.segment_size)
+                if (first := next(segments, None)) is None:
+                    raise NotFoundError('没有找到切片')
+                self.core.add_segment_path(first)
+                self.core.check_video(self.core.pre_download(first))
+                self.journal.write(
+                    'header',
+                    url=self.kwargs['url'],
+                    plugin=self.plugin_name,
+                    formats={mt: [f.index for f in fs] for mt, fs in formats.items()},
+                )
+                # 规划线程继续展开剩余的切片, 下载同时开始; 流式合并需要在开始时确定所有轨道, 等待规划完成
+                streaming = not self.stream_merge
+                self.stats.start(0)
+                self.planning = True
+                planner = threading.Thread(
+                    target=self.core.plan, args=(itertools.chain([first], segments), streaming), daemon=True
+                )
+                planner.start()
+                if not streaming:
+                    planner.join()
+            if self.prewarm:
+                self.connections.prewarm(
+                    [task.url for task in list(self.tasks) if not task.confirmed], self.request_kwargs, self.threads_num
+                )
+            if streaming:
+                self.task_iter = iter(self.plan_queue.get, None)
+            else:
+                self.download_inits()
+                if self.ordered_write and not self.is_stop_all:
+                    self.core.open_writers()
+                self.task_iter = iter(self.pending_tasks)
+                if resumed:
+                    self.stats.start(len(self.tasks), [task.filepath.name for task in self.tasks if task.confirmed])
+            if self.metrics_port:
+                self.metrics = MetricsServer(self.stats, self.metrics_port, self.metrics_host)
+                self.metrics.start()
             threading.Thread(target=self.watchdog).start()
             self.concurrent()
+            self.decrypt_stage.join()
+            logger.info(f'连接复用统计: {json.dumps(self.connections.stats(), ensure_ascii=False)}')
+            logger.info(f'流水线统计: {json.dumps(self.stage_report(), ensure_ascii=False)}')
             time.sleep(1)
-            if self.is_all_confirmed:
+            if not self.is_stop_all and self.is_all_confirmed:
                 self.core.concat()
                 self.core.merge()
             else:
@@ -249,7 +695,17 @@ class Downloader(object):
             logger.exception(f'下载异常, 终止程序运行: {e}')
             if not self.error:
                 self.error = {'message': 'Exception', 'reason': str(e)}
-        self.wipe()
+        self.decrypt_stage.close()
+        if self.plugin is not None:
+            self.plugin.close()
+        self.core.close_writers()
+        if self.metrics is not None:
+            self.metrics.stop()
+        self.journal.close()
+        if self.resume and self.error:
+            logger.warning(f'保留缓存文件夹用于断点续传: {self.temp_dir}')
+        else:
+            self.wipe()
         if self.error and self.save_path.exists():
             error_file = ERROR_DIR / self.save_path.name
             logger.error(f'将文件移动到错误文件夹: {error_file.as_posix()}')
@@ -265,36 +721,73 @@ class DownloadCore(object):
     def __init__(self, downloader: Downloader):
         self.downloader = downloader
 
+    def get_plugins(self) -> dict:
+        if (context := self.downloader.context) is not None:
+            return context.plugins
+        return get_all_plugins()
+
     def get_suitable_plugin(self) -> BasePlugin:
         if not (name := self.downloader.kwargs.get('plugin', '').lower()):
-            try:
-                resp = self.downloader.requester('head', self.downloader.kwargs['url'])
-            except HTTPStatusCodeError:
-                resp = self.downloader.requester('get', self.downloader.kwargs['url'])
+            name = self.sniff()
+        if name not in (plugins := self.get_plugins()):
+            raise UnsupportedError(f'没有找到插件: {name}')
+        self.downloader.plugin_name = name
+        return plugins[name](downloader=self.downloader)
+
+    def sniff(self) -> str:
+        """
+        只请求一次播放链接判断插件
+
+        缓存中已有的清单直接经过缓存确认; 否则GET读取开头的数据, Content-Type缺失或者是通用类型时根据内容判断,
+        清单继续读取完整内容交给插件, 视频流只保留响应头
+        """
+        d = self.downloader
+        url = d.kwargs['url']
+        if d.manifest_cache.contains(url):
+            manifest = d.manifest_cache.fetch(d.requester, url)
+            if name := sniff_plugin('', '', manifest.text[:4096].encode('utf-8')):
+                d.probe = manifest
+                return name
+        with d.requester('get', url, stream=True) as resp:
+            ctype = resp.headers.get('Content-Type', '').lower()
             suffix = Path(urlparse(resp.url).path).suffix.lower()
-            if (
-                    "mpegurl" in (ctype := resp.headers.get("Content-Type", "").lower())
-                    or "m3u8" in ctype
-                    or ".m3u8" == suffix
-            ):
-                name = "hls"
-            elif (
-                    "dash+xml" in ctype
-                    or "mpd" in ctype
-                    or ".mpd" == suffix
-            ):
-                name = "dash"
-            elif ctype.startswith("video/") or "octet-stream" in ctype:
-                # 对于视频类型、二进制流，默认认为可直接下载
-                name = "stream"
+            chunks = resp.iter_content(64 * 1024)
+            head = b''
+            if not (name := sniff_plugin(ctype, suffix)):
+                name = sniff_plugin(ctype, suffix, head := next(chunks, b''))
+            if name in ('hls', 'dash'):
+                content = head + b''.join(chunks)
+                manifest = Manifest(resp.url, content.decode(resp.encoding or 'utf-8', errors='replace'), headers=resp.headers)
+                d.manifest_cache.put(url, manifest)
+                d.probe = manifest
+            elif name:
+                d.probe = Manifest(resp.url, '', headers=resp.headers)
             else:
                 raise NotFoundError(f'没有找到合适的插件: {ctype}')
-        if name not in (plugins := get_all_plugins()):
+        return name
+
+    def restore(self):
+        """从断点续传日志中恢复插件、下载计划和已确认的切片"""
+        journal = self.downloader.journal
+        if (name := journal.header['plugin']) not in (plugins := self.get_plugins()):
             raise UnsupportedError(f'没有找到插件: {name}')
-        return plugins[name](downloader=self.downloader)
+        self.downloader.plugin_name = name
+        self.downloader.plugin = plugins[name](downloader=self.downloader)
+        self.downloader.plugin.load_keys(journal.keys)
+        logger.info(f'使用插件：{self.downloader.plugin.__class__.__name__}')
+        self.downloader.chunked_mode = journal.planned['chunked_mode']
+        self.downloader.tasks = journal.segments
+        for segment in self.downloader.tasks:
+            if journal.is_complete(segment.filepath, record := journal.confirmed.get(segment.filepath.name)):
+                segment.confirmed = True
+                self.downloader.downloaded_size[segment.filepath.name] = [record['length'], record['length']]
+            else:
+                self.downloader.remove(segment.filepath)
+        logger.info(f'已确认的切片: {len(self.downloader.tasks) - len(self.downloader.pending_tasks)}')
 
     def check_video(self, filepath: Path, full: bool = False):
-        command = f'ffprobe -v error -select_streams v:0 -show_entries "stream=index,codec_type,width,height,codec_name,r_frame_rate,bit_rate,duration:format=bit_rate" -of json "{filepath.as_posix()}"'
+        ffprobe = find_executable('ffprobe') or 'ffprobe'
+        command = f'{ffprobe} -v error -select_streams v:0 -show_entries "stream=index,codec_type,width,height,codec_name,r_frame_rate,bit_rate,duration:format=bit_rate" -of json "{filepath.as_posix()}"'
         try:
             meta = json.loads(os.popen(command).read().strip())
             if not (streams := meta['streams']):
@@ -314,13 +807,12 @@ class DownloadCore(object):
 
     def pre_download(self, segment: Segment) -> Path:
         if segment.init_url:
-            url = segment.init_url
+            # 与其他元数据文件一样记录到日志中, 之后和断点续传时不再重复下载
+            self.downloader.download_init(segment)
             filepath = segment.init_path
         else:
-            url = segment.url
             filepath = segment.filepath
-        self.downloader.smart_save(url, segment.headers, filepath)
-        if not segment.init_url:
+            self.downloader.smart_save(segment.url, segment.headers, filepath)
             self.downloader.plugin.decrypt(segment).rename(segment.filepath)
         try:
             resp = self.downloader.requester('head', segment.url)
@@ -337,60 +829,185 @@ class DownloadCore(object):
     def classify(self):
         self.downloader.tasks.sort(key=lambda x: (MediaName.index(x.type), x.group_no, x.index))
         for segment in self.downloader.tasks:
-            self.downloader.segments[segment.type][segment.group_no].append(segment)
-            if not segment.init_url:
-                continue
+            self.classify_segment(segment)
+
+    def classify_segment(self, segment: Segment) -> bool:
+        """
+        将切片归类到所属轨道
+        :param segment:
+        :return: 是否为新的轨道
+        """
+        groups = self.downloader.segments[segment.type]
+        is_new = segment.group_no not in groups
+        groups[segment.group_no].append(segment)
+        if segment.init_url:
             key = segment.group_no, Path(urlparse(segment.init_url).path).name
-            self.downloader.inits[segment.type][key] = segment
+            if key not in (inits := self.downloader.inits[segment.type]):
+                if any(group_no == segment.group_no for group_no, _ in inits):
+                    raise UnsupportedError(f'轨道不支持多个初始化文件, {(segment.type, segment.group_no)}')
+                inits[key] = segment
+        return is_new
 
-        nums = defaultdict(lambda: 0)
-        for mt, keys in self.downloader.inits.items():
-            for (group_no, *_), segment in keys.items():
-                nums[mt, group_no] += 1
-        for key, v in nums.items():
-            if v > 1:
-                raise UnsupportedError(f'轨道不支持多个初始化文件, {key}: {v}')
+    def plan(self, segments, streaming: bool):
+        """
+        规划线程: 逐个接收插件产出的切片, 归类后交给下载线程
 
-    def add_segments_path(self):
-        for segment in self.downloader.tasks:
-            suffix = Path(urlparse(segment.url).path).suffix
-            segment.filepath = self.downloader.temp_dir / f'{segment.type}_{segment.group_no:05}_{segment.index:010}{suffix}'
-            if segment.init_url:
-                name = Path(urlparse(segment.init_url).path).name
-                segment.init_path = self.downloader.temp_dir / f'{segment.type}_{segment.group_no:05}_{name}'
+        streaming为True时, 新的轨道出现后立即下载元数据文件并打开顺序写入器, 切片放入队列后即可开始下载
+        :param segments: 插件产出的切片, 每个轨道内按照序号顺序
+        :param streaming: 是否边规划边下载
+        :return:
+        """
+        d = self.downloader
+        completed = False
+        try:
+            for segment in segments:
+                if d.is_stop_all:
+                    break
+                self.add_segment_path(segment)
+                is_new = self.classify_segment(segment)
+                d.tasks.append(segment)
+                d.stats.add_task()
+                d.journal.write('segment', data=segment.model_dump(exclude_none=True))
+                if streaming:
+                    if is_new:
+                        self.open_track(segment)
+                    # 密钥在后台获取, 与切片下载同时进行
+                    d.plugin.prefetch_keys(segment)
+                    if writer := d.writers.get((segment.type, segment.group_no)):
+                        writer.add(segment)
+                    d.plan_queue.put(segment)
+                else:
+                    d.plugin.prefetch_keys(segment)
+            else:
+                completed = True
+                d.journal.write('planned', count=len(d.tasks), chunked_mode=d.chunked_mode)
+                logger.info(f'总任务数：{len(d.tasks)}')
+        except DownloadException as e:
+            d.is_stop_all = True
+            d.error = e.__dict__
+        except Exception as e:
+            d.is_stop_all = True
+            logger.error(f'规划切片异常: {e}')
+        finally:
+            if completed:
+                for writer in d.writers.values():
+                    writer.seal()
+            d.planning = False
+            d.plan_queue.put(None)
+
+    def open_track(self, segment: Segment):
+        """边规划边下载时, 轨道的第一个切片出现后下载元数据文件并打开顺序写入器"""
+        d = self.downloader
+        if segment.init_url:
+            d.download_init(segment)
+        if d.ordered_write:
+            writer = OrderedTrackWriter(
+                self.get_group_path(segment.type, [segment]), [], d.chunk_size, d.journal, sealed=False
+            )
+            writer.open(segment.init_path)
+            d.writers[segment.type, segment.group_no] = writer
+
+    def add_segment_path(self, segment: Segment | SegmentView):
+        if isinstance(segment, SegmentView):
+            # 切片表在访问时才生成路径
+            segment.table.temp_dir = self.downloader.temp_dir
+            return
+        segment.filepath = self.downloader.temp_dir / segment_name(segment.type, segment.group_no, segment.index, segment.url)
+        if segment.init_url:
+            segment.init_path = self.downloader.temp_dir / init_name(segment.type, segment.group_no, segment.init_url)
+
+    def get_group_path(self, mt: str, segments: list) -> Path:
+        return self.downloader.temp_dir / f'group_{mt}_{(fs := segments[0]).group_no}{Path(fs.filepath).suffix}'
+
+    def get_progress(self, segment: Segment) -> float:
+        """切片在所属轨道中的位置比例"""
+        writer = self.downloader.writers[segment.type, segment.group_no]
+        return writer.positions[segment.filepath.name] / len(writer.segments)
+
+    def open_writers(self):
+        """
+        为每个轨道创建顺序写入器, 切片确认后立即追加到轨道文件
+
+        开启流式合并且存在音频时, 写入的是FFmpeg正在读取的命名管道
+        :return:
+        """
+        streaming = self.downloader.stream_merge and MediaName.audio in self.downloader.segments
+        for mt, groups in self.downloader.segments.items():
+            for group_no, segments in groups.items():
+                gpath = self.get_group_path(mt, segments)
+                if streaming:
+                    writer = PipeTrackWriter(
+                        gpath.with_name(f'fifo_{gpath.name}'),
+                        segments,
+                        self.downloader.chunk_size,
+                        is_alive=lambda: self.downloader.muxer.is_alive(),
+                    )
+                else:
+                    writer = OrderedTrackWriter(gpath, segments, self.downloader.chunk_size, self.downloader.journal)
+                self.downloader.writers[mt, group_no] = writer
+        if streaming:
+            paths = defaultdict(list)
+            for (mt, _), writer in self.downloader.writers.items():
+                paths[mt].append(writer.path)
+            video_path = paths[MediaName.video][0]
+            merged_path = self.downloader.temp_dir / f'merged_{video_path.name.removeprefix('fifo_')}'
+            self.downloader.muxer = StreamingMuxer(
+                self.get_merge_command(video_path, paths[MediaName.audio], merged_path),
+                merged_path,
+                self.downloader.temp_dir / 'ffmpeg.log',
+            )
+            self.downloader.muxer.start()
+        for writer in self.downloader.writers.values():
+            writer.open(writer.segments[0].init_path, self.downloader.journal.tracks.get(writer.path.name))
+            # 断点续传时已确认但尚未写入的切片
+            for segment in writer.segments:
+                if segment.confirmed:
+                    writer.push(segment)
+
+    def close_writers(self):
+        if self.downloader.muxer is not None:
+            self.downloader.muxer.kill()
+        for writer in self.downloader.writers.values():
+            writer.close()
 
     def concat(self):
         """拼接同一轨道的切片"""
+        if self.downloader.writers:
+            # 切片在下载过程中已经按顺序写入轨道文件
+            for (mt, _), writer in self.downloader.writers.items():
+                writer.close()
+                if not writer.finished:
+                    if (muxer := self.downloader.muxer) is not None and not muxer.is_alive():
+                        muxer.wait()
+                    raise DownloadTaskError(f'轨道未写入完成: {writer.path.name}, {writer.next}/{len(writer.segments)}')
+                self.downloader.concat_paths[mt].append(writer.path)
+            return
         for mt, groups in self.downloader.segments.items():
             for group_no, segments in groups.items():
-                gpath = self.downloader.temp_dir / f'group_{mt}_{(fs := segments[0]).group_no}{Path(fs.filepath).suffix}'
+                gpath = self.get_group_path(mt, segments)
+                fs = segments[0]
                 self.downloader.remove(gpath)
                 self.downloader.concat_paths[mt].append(gpath)
                 if fs.init_path:
                     fs.init_path.rename(gpath)
-                with open(gpath, 'ab') as fa:
+                with open_for_append(gpath) as fa:
                     for segment in segments:
-                        with open(segment.filepath, 'rb') as fr:
-                            while chunk := fr.read(self.downloader.chunk_size):
-                                fa.write(chunk)
+                        append_file(segment.filepath, fa, self.downloader.chunk_size)
                         self.downloader.remove(segment.filepath)
 
     def merge(self):
         """合并切片"""
         self.downloader.remove(self.downloader.save_path)
         video_path = self.downloader.concat_paths[MediaName.video][0]
-        if MediaName.audio in self.downloader.concat_paths:
+        if (muxer := self.downloader.muxer) is not None:
+            # 流式合并: 所有轨道已经写入管道, 等待FFmpeg结束即可
+            muxer.wait(max(self.downloader.overall_timeout - (time.time() - self.downloader.start_time), 60))
+            merged_path = muxer.output
+        elif MediaName.audio in self.downloader.concat_paths:
             merged_path = self.downloader.temp_dir / f'merged_{video_path.name}'
-            command = f'{self.downloader.ffmpeg_path} -nostats -y'
-            _is = f' -i "{video_path.as_posix()}"'
-            _maps = ' -c copy -map 0:v? -map 0:a?'
-            for i, audio in enumerate(self.downloader.concat_paths.get(MediaName.audio, []), start=1):
-                _is += f' -i "{audio.as_posix()}"'
-                _maps += f' -map {i}:a'
-            command += _is
-            command += _maps
-            # 需要添加字幕的话，要合并成MKV
-            command += f' -f mpegts "{merged_path.as_posix()}"'
+            command = self.get_merge_command(
+                video_path, self.downloader.concat_paths.get(MediaName.audio, []), merged_path
+            )
             result = subprocess.run(
                 command,
                 shell=True,  # 允许使用字符串形式的命令
@@ -403,7 +1020,21 @@ class DownloadCore(object):
             merged_path = video_path
         shutil.move(merged_path.as_posix(), self.downloader.save_path.as_posix())
 
+    def get_merge_command(self, video_path: Path, audio_paths: list, merged_path: Path) -> str:
+        command = f'{self.downloader.ffmpeg_path} -nostats -y'
+        _is = f' -i "{video_path.as_posix()}"'
+        _maps = ' -c copy -map 0:v? -map 0:a?'
+        for i, audio in enumerate(audio_paths, start=1):
+            _is += f' -i "{audio.as_posix()}"'
+            _maps += f' -map {i}:a'
+        command += _is
+        command += _maps
+        # 需要添加字幕的话，要合并成MKV
+        command += f' -f mpegts "{merged_path.as_posix()}"'
+        return command
+
     def select(self):
+        from prettytable import PrettyTable
         available_formats = self.downloader.plugin.get_formats()
         table = PrettyTable()
         table.field_names = ["序号", "分辨率/语言", "码率/描述", "帧率/采样率", "编码", "MIME类型"]
@@ -5,6 +5,7 @@ The tags module holds all the type of different nodes
 you may come across when parsing MPD manifest file.
 """
 import math
+import re
 from collections import namedtuple
 from functools import cached_property
 from typing import Any, List, Optional
@@ -52,16 +53,62 @@ def get_segment_url(segment_url: str, base_uri: str) -> str:
     return segment_url
 
 
-def replace_segment_name(template: str, **kwargs):
-    if 'representation_id' in kwargs:
-        template = template.replace('$RepresentationID$', str(kwargs['representation_id']))
-    if 'time' in kwargs:
-        template = template.replace('$Time$', str(kwargs['time']))
-    if 'bandwidth' in kwargs:
-        template = template.replace('$Bandwidth$', str(kwargs['bandwidth']))
-    if 'number' in kwargs:
-        template = template.replace('$Number$', str(kwargs['number']))
-    return template
+# $标识符$或$标识符%0[宽度]d$, $$表示$
+TEMPLATE_IDENTIFIER = re.compile(r'\$(RepresentationID|Number|Bandwidth|Time|SubNumber|)(?:%0?(\d*)d)?\$')
+# 编译过程中代替格式化字段的标记, 不会出现在链接中
+TEMPLATE_FIELD = re.compile(r'\x00(\w+):(\d*)\x00')
+
+
+class CompiledTemplate:
+    """
+    编译后的SegmentTemplate链接模板
+
+    固定的标识符(RepresentationID/Bandwidth)和链接拼接在编译时完成, 只剩下Number/Time等字段,
+    每个切片只需要一次str.format
+    """
+    __slots__ = ('pattern', 'fields')
+
+    def __init__(self, pattern: str, fields: frozenset):
+        self.pattern = pattern
+        self.fields = fields
+
+    def format(self, **values) -> str:
+        return self.pattern.format(**values)
+
+
+def compile_template(
+        template: str, base_url: str, base_uri: str, fields: tuple = ('Number', 'Time'), **values
+) -> CompiledTemplate:
+    """
+    编译SegmentTemplate的media/initialization
+    :param template: 模板
+    :param base_url: BaseURL, 拼接在模板之前
+    :param base_uri: MPD所在目录, 用于拼接相对链接
+    :param fields: 每个切片格式化的标识符, 其他没有提供值的标识符保持原样
+    :param values: 固定的标识符, 例如RepresentationID=..., Bandwidth=...
+    :return:
+    """
+    used = set()
+
+    def substitute(match: re.Match) -> str:
+        name, width = match.groups()
+        if not name:
+            return '$'
+        if name in values:
+            value = values[name]
+            return format(value, f'0{width}d') if width and isinstance(value, int) else str(value)
+        if name not in fields:
+            return match[0]
+        used.add(name)
+        return f'\x00{name}:{width or ""}\x00'
+
+    # 字段的值只有数字, 不影响拼接链接时对开头的判断
+    url = get_segment_url(f'{base_url}{TEMPLATE_IDENTIFIER.sub(substitute, template)}', base_uri)
+    pattern = TEMPLATE_FIELD.sub(
+        lambda m: f'{{{m[1]}:0{m[2]}d}}' if m[2] else f'{{{m[1]}}}',
+        url.replace('{', '{{').replace('}', '}}'),
+    )
+    return CompiledTemplate(pattern, frozenset(used))
 
 
 def get_mpd_attr(parent, value, tag):
@@ -524,81 +571,114 @@ class Representation(RepresentationBase):
 
     @cached_property
     def segments(self):
-        segment_template = self.segment_templates[0]
-        if '$Number$' in segment_template.media:
+        media = self.compile_template(self.segment_templates[0].media)
+        if 'Number' in media.fields:
             yield from self.get_number_segments()
-        elif '$Time$' in segment_template.media:
+        elif 'Time' in media.fields:
             yield from self.get_time_segments()
 
+    def compile_template(self, template: str, fields: tuple = ('Number', 'Time')) -> CompiledTemplate:
+        return compile_template(
+            template,
+            self.base_urls[0].text,
+            self.parent.parent.parent.base_uri,
+            fields,
+            RepresentationID=self.id,
+            Bandwidth=self.bandwidth,
+        )
+
+    def get_initialization(self, field: str):
+        """
+        初始化链接, 不包含切片字段时每个表示只拼接一次
+        :param field: Number或者Time
+        :return: 固定的链接, 或者按切片格式化的模板
+        """
+        if not (initialization := self.segment_templates[0].initialization):
+            return None
+        if (compiled := self.compile_template(initialization, (field,))).fields:
+            return compiled
+        return compiled.format()
+
     def get_number_segments(self):
         mpd = self.parent.parent.parent
         media_presentation_duration = parse_duration(mpd.media_presentation_duration).total_seconds()
-        base_url = self.base_urls[0].text
         segment_template = self.segment_templates[0]
         if (timescale := segment_template.timescale) is None:
             timescale = self.parent.segment_templates[0].timescale
         start_number = segment_template.start_number
         duration = float(segment_template.duration / timescale)
-        sequence_nos = set()
-        segments = []
-        for i in range(math.ceil(media_presentation_duration / duration)):
-            sequence_no = start_number + i
-            if sequence_no in sequence_nos:
-                continue
-            sequence_nos.add(sequence_no)
-            segment_url = get_segment_url(
-                f'{base_url}{replace_segment_name(segment_template.media, representation_id=self.id, bandwidth=self.bandwidth, number=sequence_no)}',
-                self.parent.parent.parent.base_uri
-            )
-            if segment_template.initialization:
-                initialization_url = get_segment_url(
-                    f'{base_url}{replace_segment_name(segment_template.initialization, representation_id=self.id, bandwidth=self.bandwidth, number=sequence_no)}',
-                    self.parent.parent.parent.base_uri
-                )
-            else:
-                initialization_url = None
-            segments.append({
+        media = self.compile_template(segment_template.media, ('Number',)).pattern.format
+        initialization = self.get_initialization('Number')
+        # 序号递增, 不需要去重和排序, 逐个计算后产出
+        for sequence_no in range(start_number, start_number + math.ceil(media_presentation_duration / duration)):
+            yield {
                 'sequence_no': sequence_no,
                 'duration': str(duration),
-                'segment_url': segment_url,
-                'initialization_url': initialization_url,
-            })
-        return sorted(segments, key=lambda x: x['sequence_no'])
+                'segment_url': media(Number=sequence_no),
+                'initialization_url': (
+                    initialization.format(Number=sequence_no)
+                    if isinstance(initialization, CompiledTemplate) else initialization
+                ),
+            }
 
     def get_time_segments(self):
-        base_url = self.base_urls[0].text
+        timeline = self.segment_templates[0].segment_timelines[0].base_urls
+        segments = self.iter_time_segments(timeline)
+        # 时间线通常是递增的, 边计算边产出; 只有出现倒序时才全部展开后排序
+        if self.is_timeline_ordered(timeline):
+            yield from segments
+        else:
+            yield from sorted(segments, key=lambda x: x['compare_no'])
+
+    def iter_time_segments(self, timeline: List['Segment']):
         segment_template = self.segment_templates[0]
         timescale = segment_template.timescale
+        media = self.compile_template(segment_template.media, ('Time',)).pattern.format
+        initialization = self.get_initialization('Time')
         t = 0
         sequence_nos = set()
-        segments = []
-        for s in segment_template.segment_timelines[0].base_urls:
+        for s in timeline:
             if s.t:
                 t = s.t
+            duration = str(s.d / timescale)
             for i in range((s.r or 0) + 1):
                 if t in sequence_nos:
                     continue
                 sequence_nos.add(t)
-                segment_url = get_segment_url(
-                    f'{base_url}{replace_segment_name(segment_template.media, representation_id=self.id, time=t)}',
-                    self.parent.parent.parent.base_uri
-                )
-                if segment_template.initialization:
-                    initialization_url = get_segment_url(
-                        f'{base_url}{replace_segment_name(segment_template.initialization, representation_id=self.id, time=t)}',
-                        self.parent.parent.parent.base_uri
-                    )
-                else:
-                    initialization_url = None
-                segments.append({
+                yield {
                     'compare_no': (t - segment_template.presentation_time_offset) / timescale,
                     'sequence_no': t,
-                    'duration': str(s.d / timescale),
-                    'segment_url': segment_url,
-                    'initialization_url': initialization_url,
-                })
+                    'duration': duration,
+                    'segment_url': media(Time=t),
+                    'initialization_url': (
+                        initialization.format(Time=t)
+                        if isinstance(initialization, CompiledTemplate) else initialization
+                    ),
+                }
                 t += s.d
-        return sorted(segments, key=lambda x: x['compare_no'])
+
+    @staticmethod
+    def is_timeline_ordered(timeline: List['Segment']) -> bool:
+        """
+        只遍历S标签判断时间线是否递增, 不展开重复的切片
+        :param timeline: SegmentTimeline中的S标签
+        :return: 无法确定时返回False, 由调用方排序
+        """
+        t = 0
+        last = None
+        for s in timeline:
+            if s.t:
+                t = s.t
+            if (count := (s.r or 0) + 1) <= 0:
+                continue
+            if last is not None and t < last:
+                return False
+            if t == last:
+                # 与上一个切片重复, 整组都会被跳过
+                continue
+            last = t + s.d * (count - 1)
+            t += s.d * count
+        return True
 
     @cached_property
     def segment_bases(self):
@@ -5,12 +5,13 @@
 import argparse
 import json
 import logging
+import os
 import sys
 import traceback
 from pathlib import Path
 
-from vodd.downloader import Downloader
-from vodd.utils.args import jsonloads, commalist
+from vodd.core.constants import ASYNC_CONCURRENCY
+from vodd.utils.args import boolean, jsonloads, commalist
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -26,7 +27,12 @@ def build_parser():
     parser = argparse.ArgumentParser(usage='VOD Downloader', description='--help')
     parser.add_argument('-c', type=str, dest='config', help='从配置文件中读取所有参数,配置参数会覆盖命令参数')
     parser.add_argument('-o', type=str, dest='save_path', help='需要保存的路径')
-    parser.add_argument('-r', type=float, default=5, dest='rate', help='下载速度,实际上会略小于当前值')
+    parser.add_argument('-r', type=float, default=5, dest='rate', help='下载并发数,未指定--threads时作为线程数量')
+    parser.add_argument('--threads', type=int, dest='threads', help='下载线程数量,默认与-r一致')
+    parser.add_argument('--limit-rate', type=float, default=0, dest='limit_rate',
+                        help='全局下载限速(MB/s),所有线程共享,0表示不限速')
+    parser.add_argument('--limit-burst', type=float, default=0, dest='limit_burst',
+                        help='限速的突发大小(MB),默认为1秒的带宽')
 
     downloader = parser.add_argument_group('downloader')
     downloader.add_argument('-p', type=str, dest='plugin', default='', help='插件名字')
@@ -35,6 +41,18 @@ def build_parser():
     downloader.add_argument('--drm-request', dest='drm_request', type=jsonloads, help='请求DRM许可使用的请求数据')
     downloader.add_argument('--drm-private-key-path', type=str, dest='private_key_path', help='DRM私钥文件路径')
     downloader.add_argument('--drm-client-id-path', type=str, dest='client_id_path', help='DRM客户端ID路径')
+    downloader.add_argument('--drm-key-store', type=str, dest='drm_key_store', default='',
+                            help='本机共享的DRM密钥缓存文件,默认在临时文件夹中')
+    downloader.add_argument('--drm-key-ttl', type=float, dest='drm_key_ttl', default=30 * 24 * 3600,
+                            help='DRM密钥缓存的有效期,单位秒,0表示不使用缓存')
+    downloader.add_argument('--drm-decrypter', type=str, dest='drm_decrypter', default='native', choices=['native', 'external'],
+                            help='DRM解密方式,默认native在进程内解密cenc/cbcs,失败时使用external;external只使用DRM.decrypter')
+    downloader.add_argument('--manifest-cache', type=str, dest='manifest_cache', default='',
+                            help='本机共享的清单缓存文件夹,默认在临时文件夹中')
+    downloader.add_argument('--manifest-max-age', type=float, dest='manifest_max_age', default=0,
+                            help='点播清单缓存的有效期,单位秒,有效期内不再请求,0表示每次都通过ETag/Last-Modified确认')
+    downloader.add_argument('--manifest-cache-size', type=float, dest='manifest_cache_size', default=64,
+                            help='清单缓存的总大小,单位MB,超过时淘汰最久未使用的清单,0表示不使用缓存')
     downloader.add_argument('--per-timeout', type=int, default=20 * 60, dest='per_timeout', help='单个切片超时时间')
     downloader.add_argument('--overall-timeout', type=int, default=2 * 60 * 60, dest='overall_timeout',
                             help='总体超时时间')
@@ -45,8 +63,47 @@ def build_parser():
                             help='最大的切片大小,超过此值时,必须使用分块模式,防止占用内存过大')
     downloader.add_argument('--chunk-file-size', type=int, default=200 * 1024 * 1024, dest='chunk_file_size',
                             help='分块文件大小')
+    downloader.add_argument('--range-connections', type=int, default=1, dest='range_connections',
+                            help='分块模式下单个大切片同时使用的连接数,大于1时按字节范围分段并发下载')
+    downloader.add_argument('--work-stealing', type=boolean, default=True, dest='work_stealing',
+                            help='单文件分段下载时,空闲线程接管剩余最多的分段的后半部分')
     downloader.add_argument('--segment-size', type=int, default=0, dest='segment_size',
                             help='下载切片的数量，默认全部下载')
+    downloader.add_argument('--resume', action='store_true', dest='resume',
+                            help='断点续传, 失败时保留临时文件夹, 下次只下载缺失或者不完整的切片')
+    downloader.add_argument('--adaptive', action='store_true', dest='adaptive',
+                            help='根据吞吐量、延迟和错误率自动调整并发数')
+    downloader.add_argument('--min-threads', type=int, default=1, dest='min_threads', help='自适应并发的最小并发数')
+    downloader.add_argument('--max-threads', type=int, default=32, dest='max_threads', help='自适应并发的最大并发数')
+    downloader.add_argument('--adaptive-interval', type=float, default=5, dest='adaptive_interval',
+                            help='自适应并发的调整间隔(秒)')
+    downloader.add_argument('--pool-size', type=int, default=0, dest='pool_size',
+                            help='每个域名的连接池大小,默认与线程数一致且不小于10')
+    downloader.add_argument('--host-pool-sizes', dest='host_pool_sizes', type=jsonloads,
+                            help='按域名设置连接池大小,例如{"cdn.example.com": 32}')
+    downloader.add_argument('--host-limits', dest='host_limits', type=jsonloads,
+                            help='按域名设置同时下载的切片数量上限,例如{"cdn.example.com": 8}')
+    downloader.add_argument('--prewarm', action='store_true', dest='prewarm', help='下载开始前预先建立到切片域名的连接')
+    downloader.add_argument('--ordered-write', type=boolean, default=True, dest='ordered_write',
+                            help='切片确认后立即按顺序写入轨道文件,下载结束时不再需要拼接')
+    downloader.add_argument('--stream-merge', action='store_true', dest='stream_merge',
+                            help='下载开始时启动FFmpeg,各个轨道通过命名管道边下载边合并,需要开启--ordered-write')
+    downloader.add_argument('--stats-file', type=str, default='', dest='stats_file',
+                            help='每秒将下载进度以JSON格式写入到该文件')
+    downloader.add_argument('--metrics-port', type=int, default=0, dest='metrics_port',
+                            help='在该端口提供Prometheus格式的下载指标, 0表示不开启')
+    downloader.add_argument('--metrics-host', type=str, default='127.0.0.1', dest='metrics_host',
+                            help='下载指标的监听地址, 默认只允许本机访问')
+    downloader.add_argument('--engine', type=str, dest='engine', default='thread', choices=['thread', 'asyncio'],
+                            help='下载引擎, thread使用线程池, asyncio使用单个事件循环')
+    downloader.add_argument('--async-concurrency', type=int, default=ASYNC_CONCURRENCY, dest='async_concurrency',
+                            help='asyncio引擎同时下载的切片数量')
+    downloader.add_argument('--stream-decrypt', type=boolean, default=True, dest='stream_decrypt',
+                            help='下载过程中流式解密,插件不支持时下载完成后再解密')
+    downloader.add_argument('--decrypt-processes', type=int, default=None, dest='decrypt_processes',
+                            help='解密进程数量,默认为CPU核心数,批量任务使用共享的进程池,0表示在下载线程中解密')
+    downloader.add_argument('--decrypt-queue', type=int, default=0, dest='decrypt_queue',
+                            help='等待解密的切片数量上限,队列已满时下载线程等待,默认为解密进程数量的2倍')
 
     selector = parser.add_argument_group('selector')
     selector.add_argument('--height', type=commalist, dest='height', default='1080,480,1080',
@@ -57,24 +114,39 @@ def build_parser():
     return parser
 
 
-def main(argv: list = None):
+def parse_args(argv: list) -> dict:
+    """
+    解析命令参数, -c指定的配置文件会覆盖命令参数
+    :param argv:
+    :return: Downloader的参数
+    """
     parser = build_parser()
+    args, unknown = parser.parse_known_args(argv)
+    if not ((args.save_path and args.url) or args.config):
+        raise ValueError("缺少参数[--url,-o]或者[-c]")
+    if args.config:
+        # 将配置文件的参数重新赋值到命令参数中
+        argv = list(argv)
+        argv.pop(position := argv.index('-c'))
+        argv.pop(position)
+        return parse_args([*argv, *json.loads(Path(args.config).read_text('utf-8'))])
+    for k, v in (kwargs := vars(args)).items():
+        if v == parser.get_default(k):
+            continue
+        logger.info(f'{k}: {v}')
+    return kwargs
+
+
+def main(argv: list = None):
     error_code = 0
     try:
         if argv is None:
             argv = sys.argv[1:]
-        args, unknown = parser.parse_known_args(argv)
-        if not ((args.save_path and args.url) or args.config):
-            raise ValueError("缺少参数[--url,-o]或者[-c]")
-        if args.config:
-            # 将配置文件的参数重新赋值到命令参数中
-            argv.pop(position := argv.index('-c'))
-            argv.pop(position)
-            return main(argv=[*argv, *json.loads(Path(args.config).read_text('utf-8'))])
-        for k, v in (kwargs := vars(args)).items():
-            if v == parser.get_default(k):
-                continue
-            logger.info(f'{k}: {v}')
+        kwargs = parse_args(argv)
+        if kwargs['decrypt_processes'] is None:
+            kwargs['decrypt_processes'] = os.cpu_count() or 1
+        # 参数解析完成后再导入下载器
+        from vodd.downloader import Downloader
         if (data := Downloader(**kwargs).start())['error']:
             error_code = 1
         print(f'{json.dumps(data, ensure_ascii=False)}', file=sys.stderr)
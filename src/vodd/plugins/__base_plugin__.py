@@ -4,12 +4,16 @@
 # @Version     : Python 3.13.7
 import abc
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Iterator, List
 
 from vodd.core.algorithms import best_video
 from vodd.core.constants import MediaName
-from vodd.core.models import Segment
+from vodd.core.exceptions import NotFoundError
+
+if TYPE_CHECKING:
+    from vodd.core.models import Segment
 
 
 class BasePlugin(metaclass=abc.ABCMeta):
@@ -20,6 +24,9 @@ class BasePlugin(metaclass=abc.ABCMeta):
         self.downloader: Downloader = downloader
         self.has_ad = False
         self._lock = threading.RLock()
+        # 每个密钥一个Future, 获取密钥时只等待对应的Future
+        self.key_futures: dict[str, Future] = {}
+        self._key_executor: ThreadPoolExecutor | None = None
 
     @abc.abstractmethod
     def get_formats(self) -> dict:
@@ -29,10 +36,91 @@ class BasePlugin(metaclass=abc.ABCMeta):
     def get_segments(self, formats: dict) -> List[Segment]:
         """获取切片"""
 
+    def iter_segments(self, formats: dict) -> Iterator[Segment]:
+        """
+        逐个产出切片, 下载可以在规划完成之前开始
+
+        每个轨道内的切片必须按照序号顺序产出, 默认等待get_segments全部返回
+        :param formats:
+        :return:
+        """
+        yield from self.get_segments(formats)
+
     @abc.abstractmethod
     def decrypt(self, segment: Segment) -> Path:
         """解密切片"""
 
+    def stream_transform(self, segment: Segment):
+        """
+        下载过程中对数据做流式转换(解密等), 替代下载完成后的decrypt
+        :param segment:
+        :return: 提供update(chunk) -> bytes和final() -> bytes的对象, None表示下载完成后再调用decrypt
+        """
+        return None
+
+    def decrypt_task(self, segment: Segment) -> tuple | None:
+        """
+        准备解密任务, 获取密钥等网络操作在下载线程中完成
+        :param segment:
+        :return: (函数, 参数), 在解密进程中执行, 函数必须是模块级函数且参数可以序列化, 返回解密后的文件;
+                 None表示由decrypt在下载线程中处理
+        """
+        return None
+
+    def prefetch_keys(self, segment: Segment):
+        """规划切片时调用, 在后台提前获取切片需要的密钥, 默认不预取"""
+
+    def resolve_key(self, name: str, fetch):
+        """
+        获取密钥, 同一个密钥只获取一次
+
+        第一个调用的线程直接执行fetch, 其他线程等待该密钥的Future, 不同的密钥之间互不阻塞
+        :param name: 密钥标识, 例如密钥链接
+        :param fetch: 获取密钥的函数
+        :return: fetch的返回值, 没有获取到密钥时抛出异常
+        """
+        with self._lock:
+            if owner := (future := self.key_futures.get(name)) is None:
+                future = self.key_futures[name] = Future()
+        if owner:
+            try:
+                # 空密钥不缓存, 否则之后的切片都会跳过解密
+                if not (key := fetch()):
+                    raise NotFoundError(f'没有获取到密钥: {name}')
+                future.set_result(key)
+            except BaseException as e:
+                # 失败的密钥不缓存, 切片重试时重新获取
+                with self._lock:
+                    self.key_futures.pop(name, None)
+                future.set_exception(e)
+        return future.result()
+
+    def prefetch_key(self, name: str, fetch):
+        """在后台线程中提前获取密钥, 下载线程需要时通过resolve_key等待结果"""
+        if name in self.key_futures:
+            return
+        with self._lock:
+            if self._key_executor is None:
+                self._key_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='key')
+        self._key_executor.submit(self.resolve_key, name, fetch)
+
+    def close(self):
+        """下载结束时调用, 取消尚未开始的预取"""
+        if self._key_executor is not None:
+            self._key_executor.shutdown(wait=False, cancel_futures=True)
+            self._key_executor = None
+
+    def steal(self) -> Segment | None:
+        """空闲线程申请新的下载任务, 默认没有可拆分的切片"""
+        return None
+
+    def dump_keys(self) -> dict:
+        """导出已获取的密钥, 用于断点续传"""
+        return {}
+
+    def load_keys(self, keys: dict):
+        """导入断点续传日志中的密钥"""
+
     def select_formats(self, formats: dict) -> dict:
         """选择格式"""
         video = best_video(formats[MediaName.video], **self.downloader.kwargs)
@@ -2,9 +2,106 @@
 # @Author      : LJQ
 # @Time        : 2025/9/16 12:19
 # @Version     : Python 3.13.7
+import importlib
+import logging
+import threading
+from collections.abc import Mapping
+
 from vodd.plugins.__base_plugin__ import BasePlugin
 from vodd.utils.probe import get_plugin_map
 
+logger = logging.getLogger(__name__)
+
+# 内置插件, 名字 -> 模块:类, 选择插件时才导入对应的模块
+BUILTIN_PLUGINS = {
+    'dash': 'vodd.plugins.dash:DASH',
+    'hls': 'vodd.plugins.hls:HLS',
+    'stream': 'vodd.plugins.stream:Stream',
+}
+# 第三方插件通过该入口点组声明, 例如: [project.entry-points."vodd.plugins"] name = "package.module:Class"
+ENTRY_POINT_GROUP = 'vodd.plugins'
+
+
+class PluginRegistry(Mapping):
+    """
+    插件注册表
+
+    只保存插件名字和位置, 使用插件时才导入对应的模块, 普通视频流下载不需要导入DRM、lxml、m3u8等依赖;
+    查找顺序: 内置插件 -> 入口点 -> 扫描插件文件夹(兼容直接放在插件文件夹中的插件)
+    """
+
+    def __init__(self, declared: dict = None):
+        """
+        :param declared: 名字 -> 模块:类, 默认为内置插件
+        """
+        self.declared = dict(BUILTIN_PLUGINS if declared is None else declared)
+        self._entry_points = None
+        self._scanned = None
+        self._loaded = {}
+        self._lock = threading.RLock()
+
+    @property
+    def entry_points(self) -> dict:
+        if self._entry_points is None:
+            from importlib.metadata import entry_points
+            self._entry_points = {}
+            for ep in entry_points(group=ENTRY_POINT_GROUP):
+                self._entry_points.setdefault(ep.name.lower(), ep)
+        return self._entry_points
+
+    @property
+    def scanned(self) -> dict:
+        """直接放在插件文件夹中的插件, 扫描时会导入插件文件夹中的所有模块"""
+        if self._scanned is None:
+            with self._lock:
+                if self._scanned is None:
+                    self._scanned = get_plugin_map(BasePlugin)
+        return self._scanned
+
+    def load(self, name: str) -> type | None:
+        """导入插件, 导入失败或者不可用时返回None"""
+        if name in self._loaded:
+            return self._loaded[name]
+        with self._lock:
+            if name in self._loaded:
+                return self._loaded[name]
+            cls = None
+            try:
+                if name in self.declared:
+                    module, _, attr = self.declared[name].partition(':')
+                    cls = getattr(importlib.import_module(module), attr)
+                elif name in self.entry_points:
+                    cls = self.entry_points[name].load()
+                else:
+                    cls = self.scanned.get(name)
+            except Exception as e:
+                logger.exception(f'导入插件失败: {name}, {e}')
+            if cls is not None and not getattr(cls, 'usable', None):
+                cls = None
+            self._loaded[name] = cls
+            return cls
+
+    def __getitem__(self, name: str) -> type:
+        if (cls := self.load(name)) is None:
+            raise KeyError(name)
+        return cls
+
+    def __contains__(self, name) -> bool:
+        return isinstance(name, str) and self.load(name) is not None
+
+    def __iter__(self):
+        """遍历所有可用的插件, 包括扫描插件文件夹得到的插件, 会导入插件模块"""
+        names = {*self.declared, *self.entry_points, *self.scanned}
+        for name in sorted(names):
+            if self.load(name) is not None:
+                yield name
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+_registry = PluginRegistry()
+
 
-def get_all_plugins():
-    return get_plugin_map(BasePlugin)
+def get_all_plugins() -> PluginRegistry:
+    return _registry
@@ -4,9 +4,10 @@
 # @Version     : Python 3.13.7
 import base64
 import copy
+import functools
 import logging
 from pathlib import Path
-from typing import List
+from typing import Iterator, List
 
 from DRM import mp4parse, decrypter
 from DRM.widevine.cdm import ContentDecryptionModules
@@ -15,10 +16,14 @@ from DRM.widevine.oemcrypto import OEMCrypto
 from vodd.core.algorithms import convert_to_num, get_resolution
 from vodd.core.constants import SUPPORTED_DRM_CIPHERS, MediaName
 from vodd.core.exceptions import *
+from vodd.core.files import KEY_STORE_PATH
 from vodd.core.models import Segment, VideoMedia, AudioMedia
+from vodd.core.segment_table import SegmentTable
 from vodd.format_parser.dash.parser import Parser
 from vodd.plugins.__base_plugin__ import BasePlugin
-from vodd.utils.dash_helper import get_representations, get_video_segments, get_audios_segments
+from vodd.utils.cenc import decrypt_cenc_file
+from vodd.utils.dash_helper import get_representations, iter_track_segments
+from vodd.utils.key_store import KeyStore
 from vodd.utils.request_adapter import get_request_kwargs
 
 logger = logging.getLogger(__name__)
@@ -29,6 +34,15 @@ class DASH(BasePlugin):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.drm_key_content = ''
+        # 批量下载时所有任务共享已获取的密钥, KID -> kid:key
+        if (context := self.downloader.context) is not None:
+            self.keys = context.keys.setdefault('dash', {})
+        else:
+            self.keys = {}
+        self.key_store = KeyStore(
+            self.downloader.kwargs.get('drm_key_store') or KEY_STORE_PATH,
+            self.downloader.kwargs.get('drm_key_ttl', 30 * 24 * 3600),
+        )
 
     def pre_checker(self, segment: Segment):
         if segment.cipher.name:
@@ -51,8 +65,9 @@ class DASH(BasePlugin):
         return resp.content
 
     def get_formats(self) -> dict:
-        resp = self.downloader.requester('GET', self.downloader.kwargs['url'])
-        mpd = Parser.from_string(resp.text, resp.url)
+        # MPD解析结果包含XML节点, 只缓存清单内容
+        manifest = self.downloader.fetch_manifest(self.downloader.kwargs['url'])
+        mpd = Parser.from_string(manifest.text, manifest.url)
         if (c := len(mpd.periods)) > 1:
             raise UnsupportedError(f'暂不支持多个Period: {c}')
         representations = get_representations(mpd.periods[0].adaptation_sets)
@@ -94,51 +109,132 @@ class DASH(BasePlugin):
         return formats
 
     def get_segments(self, formats: dict) -> List[Segment]:
-        segments = get_video_segments(formats[MediaName.video][0].data)
-        self.pre_checker(segments[0])
-        for ass in get_audios_segments([f.data for f in formats.get(MediaName.audio) or []]):
-            segments.extend(ass)
-        return segments
+        return list(self.iter_segments(formats))
+
+    def iter_segments(self, formats: dict) -> Iterator[Segment]:
+        table = SegmentTable()
+        for i, segment in enumerate(iter_track_segments(formats[MediaName.video][0].data, MediaName.video, 0, table)):
+            if i == 0:
+                self.pre_checker(segment)
+            yield segment
+        for group_no, fmt in enumerate(formats.get(MediaName.audio) or []):
+            yield from iter_track_segments(fmt.data, MediaName.audio, group_no, table)
+
+    def dump_keys(self) -> dict:
+        return {'drm_key_content': self.drm_key_content}
+
+    def load_keys(self, keys: dict):
+        self.drm_key_content = keys.get('drm_key_content') or self.drm_key_content
+
+    def prefetch_keys(self, segment: Segment):
+        # 元数据文件下载后即可从pssh获取密钥, 不需要等待第一个切片下载完成
+        if not segment.cipher.name or self.drm_key_content or not segment.init_path:
+            return
+        # 元数据文件完整下载后才读取pssh, 不完整的文件读取失败会让密钥获取失败
+        if f'init:{segment.init_path.name}' not in self.key_futures and self.downloader.is_init_confirmed(segment):
+            self.prefetch_key(f'init:{segment.init_path.name}', functools.partial(self.read_key, segment.init_path))
+
+    def get_key(self, segment: Segment) -> str:
+        """获取DRM密钥, 没有pssh时抛出异常"""
+        if self.drm_key_content:
+            return self.drm_key_content
+        # pssh一般只在元数据中
+        pssh_file = segment.init_path if segment.init_path else segment.filepath
+        return self.resolve_key(f'init:{pssh_file.name}', functools.partial(self.read_key, pssh_file))
+
+    def read_key(self, pssh_file: Path) -> str:
+        """从文件中读取pssh, 同一个pssh只请求一次许可"""
+        dmp = mp4parse.mp4dump(pssh_file.as_posix())
+        if not (pssh := mp4parse.get_pssh(dmp, pssh_file.as_posix())):
+            raise DRMDecryptionError(f'没有找到pssh: {pssh_file.name}')
+        kid = mp4parse.get_kids(dmp)[0]
+        return self.resolve_key(f'pssh:{pssh}', functools.partial(self.request_key, kid, pssh))
+
+    def request_key(self, kid: str, pssh: str) -> str:
+        # 其他任务或者本机已经获取过的密钥不再请求许可
+        if key_content := self.keys.get(kid):
+            self.drm_key_content = key_content
+            logger.warning(f'使用其他任务获取的DRM密钥: {kid}')
+            self.downloader.journal.write('keys', data=self.dump_keys())
+            return self.drm_key_content
+        if key_content := self.key_store.get(kid, pssh):
+            self.keys[kid] = key_content
+            self.drm_key_content = key_content
+            logger.warning(f'使用缓存的DRM密钥: {kid}')
+            self.downloader.journal.write('keys', data=self.dump_keys())
+            return self.drm_key_content
+        logger.warning(f'正在请求DRM密钥')
+        # 通过请求许可链接获取许可数据
+        cdm = ContentDecryptionModules(base64.b64decode(pssh))
+        private_key = Path(self.downloader.kwargs['private_key_path']).read_bytes()
+        raw_client_id = Path(self.downloader.kwargs['client_id_path']).read_bytes()
+        license_request = cdm.get_license_request(private_key, raw_client_id)
+        drm_request = copy.deepcopy(self.downloader.kwargs['drm_request'])
+        drm_request['data'] = license_request.raw
+        license_data = self.get_license(drm_request)
+        oem = OEMCrypto(license_data, license_request.msg, private_key)
+        # 返回解密秘钥
+        self.drm_key_content = f'{kid}:{oem.decrypt().todict()[kid]}'
+        logger.warning(f'DRM [kid:key]: {self.drm_key_content}')
+        self.keys[kid] = self.drm_key_content
+        self.key_store.put(self.drm_key_content, kid, pssh)
+        self.downloader.journal.write('keys', data=self.dump_keys())
+        return self.drm_key_content
+
+    def decrypt_task(self, segment: Segment) -> tuple | None:
+        if not segment.cipher.name:
+            return None
+        if segment.cipher.name not in SUPPORTED_DRM_CIPHERS:
+            raise UnsupportedError(f'暂不支持DRM: {segment.cipher.name}')
+        encrypt_file = segment.filepath
+        try:
+            if not (key := self.get_key(segment)):
+                raise DRMDecryptionError(f'没有DRM密钥: {encrypt_file.name}')
+        except Exception:
+            self.downloader.remove(encrypt_file)
+            raise
+        decrypt_file = encrypt_file.with_stem(f'{encrypt_file.stem}_drm_decrypt')
+        init_file = segment.init_path.as_posix() if segment.init_path else ''
+        return decrypt_drm_file, (
+            encrypt_file.as_posix(), decrypt_file.as_posix(), key, init_file,
+            self.downloader.kwargs.get('drm_decrypter') or 'native',
+        )
 
     def decrypt(self, segment: Segment) -> Path:
-        if segment.cipher.name:
-            if segment.cipher.name not in SUPPORTED_DRM_CIPHERS:
-                raise UnsupportedError(f'暂不支持DRM: {segment.cipher.name}')
-            encrypt_file = segment.filepath
-            try:
-                if not self.drm_key_content:
-                    with self._lock:
-                        # 双重检查，防止重复进入
-                        if not self.drm_key_content:
-                            logger.warning(f'正在请求DRM密钥')
-                            # pssh一般只在元数据中
-                            pssh_file = segment.init_path if segment.init_path else encrypt_file
-                            dmp = mp4parse.mp4dump(pssh_file.as_posix())
-                            pssh = mp4parse.get_pssh(dmp, pssh_file.as_posix())
-                            if not pssh:
-                                return encrypt_file
-                            kid = mp4parse.get_kids(dmp)[0]
-                            # 通过请求许可链接获取许可数据
-                            cdm = ContentDecryptionModules(base64.b64decode(pssh))
-                            private_key = Path(self.downloader.kwargs['private_key_path']).read_bytes()
-                            raw_client_id = Path(self.downloader.kwargs['client_id_path']).read_bytes()
-                            license_request = cdm.get_license_request(private_key, raw_client_id)
-                            drm_request = copy.deepcopy(self.downloader.kwargs['drm_request'])
-                            drm_request['data'] = license_request.raw
-                            license_data = self.get_license(drm_request)
-                            oem = OEMCrypto(license_data, license_request.msg, private_key)
-                            # 返回解密秘钥
-                            self.drm_key_content = f'{kid}:{oem.decrypt().todict()[kid]}'
-                            logger.warning(f'DRM [kid:key]: {self.drm_key_content}')
-                # DRM 解密
-                decrypt_file = encrypt_file.with_stem(f'{encrypt_file.stem}_drm_decrypt')
-                decrypter.decrypting_file(
-                    encrypt_file.as_posix(), decrypt_file.as_posix(), self.drm_key_content, segment.init_path.as_posix()
-                )
-                if not decrypter.has_decrypted(encrypt_file.as_posix(), decrypt_file.as_posix()):
-                    self.downloader.remove(decrypt_file)
-                    raise DRMDecryptionError(f"{self.drm_key_content=}")
-                return decrypt_file
-            finally:
-                self.downloader.remove(encrypt_file)
+        if task := self.decrypt_task(segment):
+            func, args = task
+            return Path(func(*args))
         return segment.filepath
+
+
+def decrypt_drm_file(encrypt_file: str, decrypt_file: str, key: str, init_file: str, engine: str = 'native') -> str:
+    """
+    DRM解密切片文件, 可以在解密进程中执行
+    :param encrypt_file: 加密文件, 解密后删除
+    :param decrypt_file: 解密后的文件
+    :param key: kid:key
+    :param init_file: 元数据文件
+    :param engine: native在进程内解密并通过box结构校验, external使用DRM.decrypter;
+        进程内解密失败、不支持的加密方式或者没有解密任何样本(缺少encv/enca/sinf或者senc/saiz)时使用external
+    :return: 解密后的文件
+    """
+    try:
+        if engine == 'native':
+            try:
+                if decrypt_cenc_file(encrypt_file, decrypt_file, key, init_file):
+                    return decrypt_file
+                Path(decrypt_file).unlink(missing_ok=True)
+                logger.warning(f'没有解密任何样本: {Path(encrypt_file).name}, 使用DRM.decrypter解密')
+            except Exception as e:
+                Path(decrypt_file).unlink(missing_ok=True)
+                logger.warning(f'{e}, 使用DRM.decrypter解密')
+        decrypter.decrypting_file(encrypt_file, decrypt_file, key, init_file)
+        if not decrypter.has_decrypted(encrypt_file, decrypt_file):
+            Path(decrypt_file).unlink(missing_ok=True)
+            raise DRMDecryptionError(f"drm_key_content='{key}'")
+        return decrypt_file
+    except DRMDecryptionError:
+        Path(decrypt_file).unlink(missing_ok=True)
+        raise
+    finally:
+        Path(encrypt_file).unlink(missing_ok=True)
@@ -2,10 +2,11 @@
 # @Author      : LJQ
 # @Time        : 2025/10/11 16:39
 # @Version     : Python 3.14.0
+import functools
 import logging
 import struct
 from pathlib import Path
-from typing import List
+from typing import Iterator, List
 
 import m3u8
 from Crypto.Cipher import AES
@@ -14,6 +15,7 @@ from vodd.core.algorithms import convert_to_num, get_resolution, parse_m3u8
 from vodd.core.constants import MediaName
 from vodd.core.exceptions import NotFoundError
 from vodd.core.models import AudioMedia, Cipher, Segment, VideoMedia
+from vodd.core.segment_table import SegmentTable
 from vodd.plugins import BasePlugin
 
 logger = logging.getLogger(__name__)
@@ -23,11 +25,15 @@ class HLS(BasePlugin):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.keys = {}
+        # 批量下载时所有任务共享已获取的密钥
+        if (context := self.downloader.context) is not None:
+            self.keys = context.keys.setdefault('hls', {})
+        else:
+            self.keys = {}
 
     def get_formats(self) -> dict:
-        resp = self.downloader.requester('GET', self.downloader.kwargs['url'])
-        media = parse_m3u8(resp.text, resp.url)
+        manifest = self.downloader.fetch_manifest(self.downloader.kwargs['url'])
+        media = parse_m3u8(manifest.text, manifest.url)
 
         videos = []
         for index, playlist in enumerate(media.playlists):  # type: int, m3u8.Playlist
@@ -47,7 +53,7 @@ class HLS(BasePlugin):
         if not videos:
             videos.append(VideoMedia(
                 index=0,
-                data=resp.url,
+                data=manifest.url,
                 height=0,
                 resolution=get_resolution(0, 0),
                 bandwidth=0,
@@ -77,81 +83,211 @@ class HLS(BasePlugin):
             formats[MediaName.audio] = audios
         return formats
 
-    def get_single_media_segments(self, url: str, group_no: int, media_type: str):
-        resp = self.downloader.requester('GET', url)
-        media = parse_m3u8(resp.text, resp.url)
+    def get_single_media_segments(self, url: str, group_no: int, media_type: str, table: SegmentTable = None):
+        # 播放列表的解析结果与内容一起缓存, 未修改时不需要再次解析
+        rows = self.downloader.fetch_manifest(url, plan_media_playlist).plan
+        table = SegmentTable() if table is None else table
         segments = []
-        for index, segment in enumerate(media.segments, start=1):
-            init_url = None
-            if segment.init_section:
-                init_url = segment.init_section.absolute_uri
-            cipher = Cipher(name='')
-            if (key := segment.key) and key.absolute_uri:
-                if (iv := key.iv) is not None:
-                    if iv[:2] == '0x':
-                        iv = iv[2:]
-                    iv = bytes.fromhex(iv)
-                cipher = Cipher(
-                    name=key.method,
-                    params={"url": key.absolute_uri, "iv": iv},
-                )
+        # 同一个密钥的切片共享加密参数
+        ciphers = {}
+        for index, row in enumerate(rows, start=1):
+            cipher = None
+            if key := row['key']:
+                if (cipher := ciphers.get(ck := tuple(key))) is None:
+                    method, key_url, iv = key
+                    if iv is not None:
+                        if iv[:2] == '0x':
+                            iv = iv[2:]
+                        iv = bytes.fromhex(iv)
+                    cipher = ciphers[ck] = Cipher(
+                        name=method,
+                        params={"url": key_url, "iv": iv},
+                    )
             headers = {}
-            if segment.byterange:
-                length, start = map(int, segment.byterange.split('@'))
+            if row['byterange']:
+                length, start = map(int, row['byterange'].split('@'))
                 headers['range'] = f'bytes={start}-{start + length - 1}'
-            segments.append(Segment(
+            segments.append(table.append(
                 type=media_type,
                 group_no=group_no,
                 index=index,
                 cipher=cipher,
-                url=segment.absolute_uri,
+                url=row['url'],
                 headers=headers,
-                duration=segment.duration,
-                discontinuity=segment.discontinuity,
-                init_url=init_url or '',
+                duration=row['duration'],
+                discontinuity=row['discontinuity'],
+                init_url=row['init_url'],
             ))
         return segments
 
     def get_segments(self, formats: dict) -> List[Segment]:
-        segments = self.get_single_media_segments(formats[MediaName.video][0].data, 0, MediaName.video)
+        return list(self.iter_segments(formats))
+
+    def iter_segments(self, formats: dict) -> Iterator[Segment]:
+        # 视频切片产出后再请求音频的播放列表
+        table = SegmentTable()
+        yield from self.get_single_media_segments(formats[MediaName.video][0].data, 0, MediaName.video, table)
         for group_no, fmt in enumerate(formats.get(MediaName.audio) or []):
-            segments.extend(self.get_single_media_segments(fmt.data, group_no, MediaName.audio))
-        return segments
+            yield from self.get_single_media_segments(fmt.data, group_no, MediaName.audio, table)
 
-    def decrypt(self, segment: Segment) -> Path:
+    def dump_keys(self) -> dict:
+        return {'hls': {k: v for k, v in self.keys.items() if isinstance(k, str)}}
+
+    def load_keys(self, keys: dict):
+        self.keys.update(keys.get('hls') or {})
+
+    def prefetch_keys(self, segment: Segment):
+        if segment.cipher.name and (url := segment.cipher.params.get('url')) and url not in self.keys:
+            self.prefetch_key(url, functools.partial(self.fetch_key, url))
+
+    def fetch_key(self, url: str) -> bytes:
+        resp = self.downloader.requester('GET', url)
+        if key := resp.content:
+            self.keys[url] = key
+            logger.warning(f'添加加密key: {url=}, {key=}')
+            self.downloader.journal.write('keys', data=self.dump_keys())
+            return key
+        raise NotFoundError(f'获取key失败: {key=}')
+
+    def get_key(self, segment: Segment) -> bytes:
+        """获取切片的解密key, 已获取的key会缓存"""
+        if 'url' in segment.cipher.params:
+            # 规划时已经在后台获取, 只等待当前切片的key
+            if (key := self.keys.get(url := segment.cipher.params['url'])) is None:
+                key = self.resolve_key(url, functools.partial(self.fetch_key, url))
+        elif 'key' in segment.cipher.params:
+            key = segment.cipher.params['key']
+        # 64字节key
+        if len(key) == 64:
+            if key not in self.keys:
+                k = bytes([
+                    54, 67, 48, 54, 48, 52, 56, 52, 69, 50, 57, 50, 52, 50, 54, 65,
+                    51, 49, 55, 54, 56, 68, 70, 57, 65, 55, 67, 54, 70, 66, 56, 49
+                ])
+                nk = bytes.fromhex(AES.new(k, AES.MODE_CBC, key[:16]).decrypt(key[16:])[:32].decode('utf-8'))
+                self.keys[key] = nk
+        else:
+            self.keys[key] = key
+        return self.keys[key]
+
+    def get_iv(self, segment: Segment) -> bytes:
+        return segment.cipher.params.get('iv') or struct.pack(">8xq", int(float(segment.index)))
+
+    def stream_transform(self, segment: Segment) -> 'StreamDecrypter | None':
+        is_ts = segment.filepath.suffix.lower() == '.ts'
+        if not segment.cipher.name and not is_ts:
+            return None
         if segment.cipher.name:
-            if 'url' in segment.cipher.params:
-                if (url := segment.cipher.params['url']) not in self.keys:
-                    with self._lock:
-                        if url not in self.keys:
-                            resp = self.downloader.requester('GET', url)
-                            if key := resp.content:
-                                self.keys[url] = key
-                                logger.warning(f'添加加密key: {url=}, {key=}')
-                            else:
-                                raise NotFoundError(f'获取key失败: {key=}')
-                if url in self.keys:
-                    key = self.keys[url]
-            elif 'key' in segment.cipher.params:
-                key = segment.cipher.params['key']
-            # 64字节key
-            if len(key) == 64:
-                if key not in self.keys:
-                    k = bytes([
-                        54, 67, 48, 54, 48, 52, 56, 52, 69, 50, 57, 50, 52, 50, 54, 65,
-                        51, 49, 55, 54, 56, 68, 70, 57, 65, 55, 67, 54, 70, 66, 56, 49
-                    ])
-                    nk = bytes.fromhex(AES.new(k, AES.MODE_CBC, key[:16]).decrypt(key[16:])[:32].decode('utf-8'))
-                    self.keys[key] = nk
-            else:
-                self.keys[key] = key
-            iv = segment.cipher.params.get('iv') or struct.pack(">8xq", int(float(segment.index)))
-            segment.filepath.write_bytes(
-                AES.new(self.keys[key], AES.MODE_CBC, iv=iv).decrypt(segment.filepath.read_bytes())
-            )
+            return StreamDecrypter(self.get_key(segment), self.get_iv(segment), is_ts)
+        return StreamDecrypter(None, None, is_ts)
+
+    def decrypt_task(self, segment: Segment) -> tuple | None:
+        if not segment.cipher.name:
+            return None
+        return decrypt_aes_file, (segment.filepath.as_posix(), self.get_key(segment), self.get_iv(segment))
+
+    def decrypt(self, segment: Segment) -> Path:
+        if task := self.decrypt_task(segment):
+            func, args = task
+            return Path(func(*args))
         # TS额外处理
         if segment.filepath.suffix.lower() == '.ts':
-            symbol = b'G@'
-            if (content := segment.filepath.read_bytes())[:2] != symbol and (position := content.find(symbol)) > -1:
-                segment.filepath.write_bytes(content[position:])
+            if (content := segment.filepath.read_bytes()) != (aligned := align_ts(content)):
+                segment.filepath.write_bytes(aligned)
         return segment.filepath
+
+
+TS_SYNC = b'G@'
+
+
+def align_ts(content: bytes) -> bytes:
+    """去掉TS切片开头的非TS数据"""
+    if content[:2] != TS_SYNC and (position := content.find(TS_SYNC)) > -1:
+        return content[position:]
+    return content
+
+
+class StreamDecrypter(object):
+    """
+    边下载边解密的流式转换, 每个字节只写入一次, 内存占用与切片大小无关
+
+    AES-CBC解密器在分块之间保留上一块密文作为IV, 不足16字节的部分留到下一个分块;
+    TS切片在找到同步字节之前暂存开头的数据, 结果与align_ts相同
+    """
+    __slots__ = ('cipher', 'rest', 'head', 'aligned')
+
+    def __init__(self, key: bytes | None, iv: bytes | None, is_ts: bool):
+        """
+        :param key: 为空时只对齐TS
+        :param iv:
+        :param is_ts: 是否去掉TS切片开头的非TS数据
+        """
+        self.cipher = AES.new(key, AES.MODE_CBC, iv=iv) if key else None
+        self.rest = b''
+        self.head = bytearray()
+        self.aligned = not is_ts
+
+    def update(self, chunk: bytes) -> bytes:
+        if self.cipher is not None:
+            if self.rest:
+                chunk = self.rest + chunk
+            size = len(chunk) - len(chunk) % 16
+            self.rest = chunk[size:]
+            chunk = self.cipher.decrypt(chunk[:size]) if size else b''
+        return chunk if self.aligned else self.align(chunk)
+
+    def align(self, chunk: bytes) -> bytes:
+        self.head += chunk
+        if len(self.head) < 2:
+            return b''
+        if self.head[:2] == TS_SYNC:
+            content = bytes(self.head)
+        elif (position := self.head.find(TS_SYNC)) > -1:
+            content = bytes(self.head[position:])
+        else:
+            return b''
+        self.aligned = True
+        self.head = bytearray()
+        return content
+
+    def final(self) -> bytes:
+        if self.rest:
+            # 与整体解密相同, 密文长度必须是16的倍数
+            raise ValueError('Data must be padded to 16 byte boundary in CBC mode')
+        # 没有找到同步字节时保留原始内容
+        return b'' if self.aligned else bytes(self.head)
+
+
+def decrypt_aes_file(path: str, key: bytes, iv: bytes) -> str:
+    """
+    AES-128-CBC解密切片文件, 可以在解密进程中执行
+    :param path: 切片文件, 解密后覆盖
+    :param key:
+    :param iv:
+    :return: 解密后的文件
+    """
+    file = Path(path)
+    content = AES.new(key, AES.MODE_CBC, iv=iv).decrypt(file.read_bytes())
+    if file.suffix.lower() == '.ts':
+        content = align_ts(content)
+    file.write_bytes(content)
+    return path
+
+
+def plan_media_playlist(content: str, url: str) -> list[dict]:
+    """将媒体播放列表解析为可以序列化的切片信息"""
+    media = parse_m3u8(content, url)
+    rows = []
+    for segment in media.segments:
+        key = None
+        if (k := segment.key) and k.absolute_uri:
+            key = [k.method, k.absolute_uri, k.iv]
+        rows.append({
+            'url': segment.absolute_uri,
+            'duration': segment.duration,
+            'discontinuity': segment.discontinuity,
+            'byterange': segment.byterange or '',
+            'init_url': segment.init_section.absolute_uri if segment.init_section else '',
+            'key': key,
+        })
+    return rows
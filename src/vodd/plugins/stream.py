@@ -4,6 +4,8 @@
 # @Version     : Python 3.14.0
 import copy
 import itertools
+import logging
+import time
 from pathlib import Path
 from typing import List
 
@@ -12,8 +14,12 @@ from vodd.core.constants import MediaName
 from vodd.core.models import VideoMedia, Segment
 from vodd.plugins import BasePlugin
 
+logger = logging.getLogger(__name__)
+
 
 class Stream(BasePlugin):
+    # 切片序号之间的间隔, 拆分切片时新切片的序号取两者的中间值
+    index_step = 1 << 20
 
     def get_formats(self) -> dict:
         return {
@@ -32,10 +38,14 @@ class Stream(BasePlugin):
         }
 
     def get_segments(self, formats: dict) -> List[Segment]:
-        resp = self.downloader.requester('head', self.downloader.kwargs['url'])
+        # 判断插件时已经获取了响应头
+        if (probe := self.downloader.probe) is not None:
+            headers = probe.headers
+        else:
+            headers = self.downloader.requester('head', self.downloader.kwargs['url']).headers
         if not (
-                resp.headers.get('Accept-Ranges', '').lower() == 'bytes'
-                and 'Content-Length' in resp.headers
+                headers.get('Accept-Ranges', '').lower() == 'bytes'
+                and 'Content-Length' in headers
         ):
             return [
                 Segment(
@@ -45,7 +55,7 @@ class Stream(BasePlugin):
                     url=self.downloader.kwargs['url'],
                 )
             ]
-        content_length = int(resp.headers['Content-Length'])
+        content_length = int(headers['Content-Length'])
         headers = copy.deepcopy(self.downloader.request_kwargs['headers'])
         headers['range'] = (f"bytes=0"
                             f"-{min(self.downloader.max_segment_size, content_length) - 1}")
@@ -68,11 +78,72 @@ class Stream(BasePlugin):
             segments.append(Segment(
                 type=MediaName.video,
                 group_no=0,
-                index=index,
+                index=index * self.index_step,
                 url=self.downloader.kwargs['url'],
                 headers=headers,
             ))
         return segments
 
+    def steal(self) -> Segment | None:
+        """
+        拆分正在下载的切片中剩余最多的一个
+
+        从当前下载位置到范围末尾的中点拆分, 原切片下载到拆分点后结束, 后半部分作为新切片返回,
+        还有切片尚未开始下载时等待, 之后可能可以拆分
+        :return:
+        """
+        d = self.downloader
+        if not (d.work_stealing and d.chunked_mode) or d.range_connections > 1:
+            return None
+        while not d.is_stop_all:
+            with d.range_lock:
+                # 拆分后的两部分都不小于4个分块
+                victim, remaining, waiting = None, 2 * 4 * max(d.chunk_size, 1024 * 1024), False
+                for task in d.tasks:
+                    if task.confirmed or 'range' not in task.headers or task.filepath.name in d.closed_ranges:
+                        continue
+                    if not (size := d.downloaded_size.get(task.filepath.name)) or not size[1]:
+                        waiting = True
+                    elif size[1] - size[0] > remaining:
+                        victim, remaining = task, size[1] - size[0]
+                if victim is not None and (segment := self.split(victim, remaining)) is not None:
+                    logger.info(f'拆分切片: {victim.filepath.name} -> {segment.filepath.name}, {segment.headers['range']}')
+                    return segment
+            if not waiting:
+                return None
+            time.sleep(0.2)
+        return None
+
+    def split(self, victim: Segment, remaining: int) -> Segment | None:
+        """
+        在剩余部分的中点拆分切片
+        :param victim: 正在下载的切片
+        :param remaining: 剩余的字节数
+        :return: 后半部分, 序号没有空余时返回None
+        """
+        d = self.downloader
+        group = d.segments[victim.type][victim.group_no]
+        position = next(i for i, s in enumerate(group) if s is victim)
+        next_index = group[position + 1].index if position + 1 < len(group) else victim.index + self.index_step
+        if (index := (victim.index + next_index) // 2) == victim.index:
+            return None
+        start, end = map(int, victim.headers['range'].split('=', 1)[1].split('-', 1))
+        split = d.downloaded_size[victim.filepath.name][0] + remaining // 2
+        headers = copy.deepcopy(victim.headers)
+        headers['range'] = f'bytes={start + split}-{end}'
+        segment = Segment(
+            type=victim.type,
+            group_no=victim.group_no,
+            index=index,
+            url=victim.url,
+            headers=headers,
+        )
+        d.add_task(segment, after=victim)
+        victim.headers = {**victim.headers, 'range': f'bytes={start}-{start + split - 1}'}
+        d.journal.write('split', name=victim.filepath.name, headers=victim.headers)
+        d.range_ends[victim.filepath.name] = split
+        d.downloaded_size[victim.filepath.name][1] = split
+        return segment
+
     def decrypt(self, segment: Segment) -> Path:
         return segment.filepath
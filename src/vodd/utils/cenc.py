@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 20:40
+# @Version     : Python 3.14.0
+"""
+fMP4通用加密(ISO/IEC 23001-7)的进程内解密
+
+从元数据(moov)中解析每个轨道的加密参数(schm/tenc), 从切片(moof)中解析样本位置(tfhd/trun)
+和样本加密信息(senc或saiz/saio), 直接在内存中解密mdat中的样本:
+    cenc: AES-CTR, 同一个样本的所有加密子样本使用连续的密钥流, 合并后一次解密
+    cbcs: AES-CBC模式加密, 每个子样本从IV重新开始, 只解密加密部分的完整块, 合并后一次解密
+解密后senc/saiz/saio/pssh改为free, 不改变其他box的偏移
+"""
+import re
+import struct
+from pathlib import Path
+
+from Crypto.Cipher import AES
+
+from vodd.core.exceptions import DRMDecryptionError, UnsupportedError
+
+SUPPORTED_SCHEMES = {'cenc', 'cbcs'}
+# PIFF格式的样本加密信息
+PIFF_SENC = bytes.fromhex('a2394f525a9b4f14a2446c427c648df4')
+# 视觉/音频样本描述中子box之前的固定字段长度
+VISUAL_ENTRY_SIZE = 78
+AUDIO_ENTRY_SIZE = 28
+
+
+class TrackEncryption(object):
+    """轨道的默认加密参数"""
+    __slots__ = (
+        'track_id', 'scheme', 'original_format', 'is_protected', 'iv_size', 'kid',
+        'crypt_byte_block', 'skip_byte_block', 'constant_iv', 'default_sample_size',
+    )
+
+    def __init__(self, track_id: int):
+        self.track_id = track_id
+        self.scheme = ''
+        self.original_format = ''
+        self.is_protected = False
+        self.iv_size = 0
+        self.kid = b''
+        self.crypt_byte_block = 0
+        self.skip_byte_block = 0
+        self.constant_iv = b''
+        self.default_sample_size = 0
+
+
+def iter_boxes(data, start: int = 0, end: int = None):
+    """
+    遍历同一层级的box
+    :param data:
+    :param start:
+    :param end:
+    :return: (类型, 起始位置, 头部长度, 大小)
+    """
+    end = len(data) if end is None else end
+    while start + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, start)
+        header = 8
+        if size == 1:
+            size, = struct.unpack_from('>Q', data, start + 8)
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header or start + size > end:
+            raise DRMDecryptionError(f'box大小错误: {box_type}, {start=}, {size=}')
+        yield box_type, start, header, size
+        start += size
+
+
+def find_box(data, path: tuple, start: int = 0, end: int = None) -> tuple | None:
+    """按照路径查找第一个box, 例如(b'mdia', b'minf', b'stbl')"""
+    for box_type, offset, header, size in iter_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return box_type, offset, header, size
+            return find_box(data, path[1:], offset + header, offset + size)
+    return None
+
+
+def parse_keys(content: str) -> dict[bytes, bytes]:
+    """解析kid:key格式的密钥, 多个密钥之间使用空白或逗号分隔"""
+    keys = {}
+    for item in re.split(r'[\s,;]+', content.strip()):
+        if item:
+            kid, key = item.split(':', 1)
+            keys[bytes.fromhex(kid.replace('-', ''))] = bytes.fromhex(key)
+    return keys
+
+
+def parse_init(data) -> dict[int, TrackEncryption]:
+    """
+    解析元数据中每个轨道的加密参数
+    :param data: 元数据文件内容
+    :return: {track_id: TrackEncryption}
+    """
+    tracks = {}
+    sample_sizes = {}
+    if (moov := find_box(data, (b'moov',))) is None:
+        raise DRMDecryptionError('元数据中没有moov')
+    for box_type, offset, header, size in iter_boxes(data, moov[1] + moov[2], moov[1] + moov[3]):
+        if box_type == b'trak':
+            if (track := parse_trak(data, offset + header, offset + size)) is not None:
+                tracks[track.track_id] = track
+        elif box_type == b'mvex':
+            for t, o, h, _ in iter_boxes(data, offset + header, offset + size):
+                if t == b'trex':
+                    track_id, _, _, default_sample_size = struct.unpack_from('>4I', data, o + h + 4)
+                    sample_sizes[track_id] = default_sample_size
+    for track_id, track in tracks.items():
+        track.default_sample_size = sample_sizes.get(track_id, 0)
+    return tracks
+
+
+def parse_trak(data, start: int, end: int) -> TrackEncryption | None:
+    if (tkhd := find_box(data, (b'tkhd',), start, end)) is None:
+        return None
+    p = tkhd[1] + tkhd[2]
+    track = TrackEncryption(struct.unpack_from('>I', data, p + (20 if data[p] == 1 else 12))[0])
+    if (stsd := find_box(data, (b'mdia', b'minf', b'stbl', b'stsd'), start, end)) is None:
+        return None
+    for entry_type, offset, header, size in iter_boxes(data, stsd[1] + stsd[2] + 8, stsd[1] + stsd[3]):
+        if entry_type == b'encv':
+            children = offset + header + VISUAL_ENTRY_SIZE
+        elif entry_type == b'enca':
+            # QuickTime格式的音频样本描述版本1和2有额外的字段
+            version, = struct.unpack_from('>H', data, offset + header + 8)
+            children = offset + header + AUDIO_ENTRY_SIZE + {1: 16, 2: 36}.get(version, 0)
+        else:
+            continue
+        if (sinf := find_box(data, (b'sinf',), children, offset + size)) is None:
+            continue
+        parse_sinf(data, sinf[1] + sinf[2], sinf[1] + sinf[3], track)
+        return track
+    return None
+
+
+def parse_sinf(data, start: int, end: int, track: TrackEncryption):
+    for box_type, offset, header, size in iter_boxes(data, start, end):
+        p = offset + header
+        if box_type == b'frma':
+            track.original_format = bytes(data[p:p + 4]).decode('latin-1')
+        elif box_type == b'schm':
+            track.scheme = bytes(data[p + 4:p + 8]).decode('latin-1')
+        elif box_type == b'schi' and (tenc := find_box(data, (b'tenc',), p, offset + size)) is not None:
+            q = tenc[1] + tenc[2]
+            if data[q] > 0:
+                track.crypt_byte_block = data[q + 5] >> 4
+                track.skip_byte_block = data[q + 5] & 0x0f
+            track.is_protected = bool(data[q + 6])
+            track.iv_size = data[q + 7]
+            track.kid = bytes(data[q + 8:q + 24])
+            if track.is_protected and not track.iv_size:
+                track.constant_iv = bytes(data[q + 25:q + 25 + data[q + 24]])
+
+
+def parse_sample_info(data, p: int, count: int, iv_size: int, has_subsamples: bool) -> tuple[list, int]:
+    """
+    解析连续的样本加密信息(senc或saio指向的辅助信息)
+    :return: ([(iv, [(明文长度, 密文长度)]), ...], 结束位置)
+    """
+    samples = []
+    for _ in range(count):
+        iv = bytes(data[p:p + iv_size])
+        p += iv_size
+        subsamples = []
+        if has_subsamples:
+            n, = struct.unpack_from('>H', data, p)
+            p += 2
+            subsamples = list(struct.iter_unpack('>HI', data[p:p + n * 6]))
+            p += n * 6
+        samples.append((iv, subsamples))
+    return samples, p
+
+
+def parse_traf(data, start: int, end: int, moof_start: int, tracks: dict) -> tuple | None:
+    """
+    解析轨道片段中样本的位置和加密信息
+    :return: (轨道, [(样本位置, 样本大小)], [(iv, 子样本)], 需要改为free的box位置) 轨道未加密时返回None
+    """
+    boxes = {}
+    truns = []
+    for box_type, offset, header, size in iter_boxes(data, start, end):
+        if box_type == b'trun':
+            truns.append(offset + header)
+        elif box_type == b'uuid' and bytes(data[offset + header:offset + header + 16]) == PIFF_SENC:
+            boxes.setdefault(b'senc', (offset, header + 16))
+        else:
+            boxes.setdefault(box_type, (offset, header))
+    if b'tfhd' not in boxes:
+        raise DRMDecryptionError('轨道片段中没有tfhd')
+    p = sum(boxes[b'tfhd'])
+    flags = int.from_bytes(data[p + 1:p + 4])
+    track_id, = struct.unpack_from('>I', data, p + 4)
+    if (track := tracks.get(track_id)) is None or not track.is_protected:
+        return None
+    if track.scheme not in SUPPORTED_SCHEMES:
+        raise UnsupportedError(f'暂不支持加密方式: {track.scheme}')
+    p += 8
+    base = moof_start
+    if flags & 0x01:
+        base, = struct.unpack_from('>Q', data, p)
+        p += 8
+    if flags & 0x02:
+        p += 4
+    if flags & 0x08:
+        p += 4
+    default_size = track.default_sample_size
+    if flags & 0x10:
+        default_size, = struct.unpack_from('>I', data, p)
+    # 样本位置
+    samples = []
+    position = base
+    for p in truns:
+        flags = int.from_bytes(data[p + 1:p + 4])
+        count, = struct.unpack_from('>I', data, p + 4)
+        p += 8
+        if flags & 0x01:
+            position = base + struct.unpack_from('>i', data, p)[0]
+            p += 4
+        if flags & 0x04:
+            p += 4
+        # 每个样本的字段: 时长、大小、标志、时间偏移
+        fields = [bit for bit in (0x100, 0x200, 0x400, 0x800) if flags & bit]
+        if 0x200 in fields:
+            index = fields.index(0x200)
+            sizes = [values[index] for values in struct.iter_unpack(f'>{len(fields)}I', data[p:p + count * 4 * len(fields)])]
+        else:
+            sizes = [default_size] * count
+        for size in sizes:
+            samples.append((position, size))
+            position += size
+    # 样本加密信息
+    if b'senc' in boxes:
+        offset, header = boxes[b'senc']
+        p = offset + header
+        flags = int.from_bytes(data[p + 1:p + 4])
+        iv_size = track.iv_size
+        p += 4
+        if flags & 0x01:
+            # PIFF格式可以覆盖默认的iv长度
+            iv_size = data[p + 3]
+            p += 20
+        count, = struct.unpack_from('>I', data, p)
+        infos, _ = parse_sample_info(data, p + 4, count, iv_size, bool(flags & 0x02))
+    elif b'saiz' in boxes and b'saio' in boxes:
+        infos = parse_auxiliary_info(data, boxes[b'saiz'], boxes[b'saio'], base, track)
+    else:
+        raise DRMDecryptionError(f'轨道片段中没有样本加密信息: {track_id}')
+    free = [offset for name, (offset, _) in boxes.items() if name in (b'senc', b'saiz', b'saio')]
+    return track, samples, infos, free
+
+
+def parse_auxiliary_info(data, saiz: tuple, saio: tuple, base: int, track: TrackEncryption) -> list:
+    """没有senc时通过saiz/saio读取样本加密信息"""
+    p = sum(saiz)
+    p += 12 if int.from_bytes(data[p + 1:p + 4]) & 0x01 else 4
+    default_info_size = data[p]
+    count, = struct.unpack_from('>I', data, p + 1)
+    sizes = [default_info_size] * count if default_info_size else list(data[p + 5:p + 5 + count])
+    p = sum(saio)
+    version = data[p]
+    p += 12 if int.from_bytes(data[p + 1:p + 4]) & 0x01 else 4
+    if not struct.unpack_from('>I', data, p)[0]:
+        raise DRMDecryptionError('saio中没有偏移')
+    offset, = struct.unpack_from('>Q' if version else '>I', data, p + 4)
+    p = base + offset
+    infos = []
+    for size in sizes:
+        info, p = parse_sample_info(data, p, 1, track.iv_size, size > track.iv_size)
+        infos.extend(info)
+    return infos
+
+
+def decrypt_ctr(view: memoryview, key: bytes, iv: bytes, ranges: list):
+    """cenc: 同一个样本的加密部分使用连续的密钥流"""
+    cipher = AES.new(key, AES.MODE_CTR, nonce=b'', initial_value=iv.ljust(16, b'\0'))
+    if len(ranges) == 1:
+        start, length = ranges[0]
+        view[start:start + length] = cipher.decrypt(view[start:start + length])
+        return
+    content = cipher.decrypt(b''.join(view[start:start + length] for start, length in ranges))
+    position = 0
+    for start, length in ranges:
+        view[start:start + length] = content[position:position + length]
+        position += length
+
+
+def decrypt_cbcs(view: memoryview, key: bytes, iv: bytes, ranges: list, crypt: int, skip: int):
+    """cbcs: 每个子样本从IV重新开始, 按照crypt:skip的模式只解密其中的完整块"""
+    for start, length in ranges:
+        end = start + length // 16 * 16
+        if not crypt and not skip:
+            # 没有模式时加密所有完整块(一般为音频)
+            blocks = [(start, end - start)]
+        else:
+            stride = (crypt + skip) * 16
+            blocks = [(p, min(crypt * 16, end - p)) for p in range(start, end, stride)]
+        if not blocks or not blocks[0][1]:
+            continue
+        cipher = AES.new(key, AES.MODE_CBC, iv=iv)
+        if len(blocks) == 1:
+            p, n = blocks[0]
+            view[p:p + n] = cipher.decrypt(view[p:p + n])
+            continue
+        content = cipher.decrypt(b''.join(view[p:p + n] for p, n in blocks))
+        position = 0
+        for p, n in blocks:
+            view[p:p + n] = content[position:position + n]
+            position += n
+
+
+def decrypt_segment(data: bytearray, tracks: dict[int, TrackEncryption], keys: dict[bytes, bytes]) -> int:
+    """
+    在内存中解密切片, 解密前校验box结构: 样本数量与加密信息一致, 子样本长度之和等于样本大小,
+    样本都在数据范围内, 轨道的KID有对应的密钥
+    :param data: 切片内容, 原地解密
+    :param tracks: parse_init的结果
+    :param keys: {kid: key}
+    :return: 解密的样本数量
+    """
+    view = memoryview(data)
+    decrypted = 0
+    for box_type, moof_start, header, size in list(iter_boxes(data)):
+        if box_type != b'moof':
+            continue
+        for t, offset, h, s in list(iter_boxes(data, moof_start + header, moof_start + size)):
+            if t == b'pssh':
+                data[offset + 4:offset + 8] = b'free'
+            if t != b'traf' or (traf := parse_traf(data, offset + h, offset + s, moof_start, tracks)) is None:
+                continue
+            track, samples, infos, free = traf
+            if len(samples) != len(infos):
+                raise DRMDecryptionError(f'样本数量与加密信息不一致: {len(samples)}/{len(infos)}')
+            if (key := keys.get(track.kid)) is None:
+                raise DRMDecryptionError(f'没有KID对应的密钥: {track.kid.hex()}')
+            for (position, sample_size), (iv, subsamples) in zip(samples, infos):
+                if position < 0 or position + sample_size > len(data):
+                    raise DRMDecryptionError(f'样本超出数据范围: {position=}, {sample_size=}')
+                if subsamples:
+                    if sum(clear + protected for clear, protected in subsamples) != sample_size:
+                        raise DRMDecryptionError(f'子样本长度与样本大小不一致: {position=}, {sample_size=}')
+                    ranges = []
+                    p = position
+                    for clear, protected in subsamples:
+                        if protected:
+                            ranges.append((p + clear, protected))
+                        p += clear + protected
+                else:
+                    ranges = [(position, sample_size)]
+                if not ranges:
+                    continue
+                iv = iv or track.constant_iv
+                if track.scheme == 'cenc':
+                    decrypt_ctr(view, key, iv, ranges)
+                else:
+                    decrypt_cbcs(view, key, iv, ranges, track.crypt_byte_block, track.skip_byte_block)
+                decrypted += 1
+            for p in free:
+                data[p + 4:p + 8] = b'free'
+    return decrypted
+
+
+_init_cache = {}
+
+
+def load_init(init_file: str) -> dict[int, TrackEncryption]:
+    """同一个进程中解析过的元数据直接复用"""
+    stat = (path := Path(init_file)).stat()
+    if (cached := _init_cache.get(init_file)) is None or cached[0] != (stat.st_size, stat.st_mtime_ns):
+        cached = _init_cache[init_file] = ((stat.st_size, stat.st_mtime_ns), parse_init(path.read_bytes()))
+    return cached[1]
+
+
+def decrypt_cenc_file(encrypt_file: str, decrypt_file: str, key_content: str, init_file: str) -> int:
+    """
+    解密切片文件
+    :param encrypt_file: 加密文件
+    :param decrypt_file: 解密后的文件
+    :param key_content: kid:key
+    :param init_file: 元数据文件, 切片自带moov时可以为空
+    :return: 解密的样本数量
+    """
+    data = bytearray(Path(encrypt_file).read_bytes())
+    tracks = load_init(init_file) if init_file else parse_init(data)
+    decrypted = decrypt_segment(data, tracks, parse_keys(key_content))
+    Path(decrypt_file).write_bytes(data)
+    return decrypted
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 12:40
+# @Version     : Python 3.14.0
+import heapq
+import itertools
+import threading
+import time
+
+
+class AdaptiveController(object):
+    """
+    AIMD并发控制器
+
+    根据吞吐量、请求延迟以及错误/限流比例动态调整同时下载的切片数量:
+    没有错误且吞吐量没有下降时加性增加, 出现限流(429/503)或者错误比例过高时乘性减少,
+    延迟明显升高且吞吐量没有提升时减少1个
+    """
+    throttle_codes = {429, 503}
+
+    def __init__(
+            self,
+            initial: int,
+            min_workers: int = 1,
+            max_workers: int = 32,
+            interval: float = 5,
+            error_ratio: float = 0.1,
+            enabled: bool = False,
+    ):
+        self.enabled = enabled
+        self.min_workers = max(min_workers, 1)
+        self.max_workers = max(max_workers, self.min_workers)
+        self.limit = min(max(initial, self.min_workers), self.max_workers)
+        self.interval = interval
+        self.error_ratio = error_ratio
+        self.active = 0
+        self._cond = threading.Condition()
+        # 统计窗口
+        self.requests = 0
+        self.errors = 0
+        self.throttles = 0
+        self.latency = 0.0
+        self.best_latency = 0.0
+        self.last_throughput = 0.0
+        self.last_bytes = 0
+        self.last_time = time.monotonic()
+
+    def __enter__(self):
+        if self.enabled:
+            with self._cond:
+                while self.active >= self.limit:
+                    self._cond.wait()
+                self.active += 1
+        return self
+
+    def __exit__(self, *exc):
+        if self.enabled:
+            with self._cond:
+                self.active -= 1
+                self._cond.notify()
+
+    def record(self, status_code: int | None, latency: float):
+        """
+        记录一次请求的结果
+        :param status_code: 状态码, None表示请求异常
+        :param latency: 请求耗时(秒)
+        :return:
+        """
+        if not self.enabled:
+            return
+        with self._cond:
+            self.requests += 1
+            self.latency += latency
+            if status_code in self.throttle_codes:
+                self.throttles += 1
+            elif status_code is None or status_code >= 500:
+                self.errors += 1
+
+    def adjust(self, downloaded: int) -> str | None:
+        """
+        每隔interval秒调整一次并发数
+        :param downloaded: 当前已下载的总字节数
+        :return: 并发数变化时返回调整原因
+        """
+        if not self.enabled or (now := time.monotonic()) - self.last_time < self.interval:
+            return None
+        with self._cond:
+            throughput = (downloaded - self.last_bytes) / (now - self.last_time)
+            avg_latency = self.latency / self.requests if self.requests else 0
+            old = self.limit
+            if self.throttles or (self.requests and self.errors / self.requests > self.error_ratio):
+                self.limit = max(self.min_workers, self.limit // 2)
+                reason = f'限流: {self.throttles}, 错误: {self.errors}/{self.requests}'
+            elif (
+                    self.best_latency
+                    and avg_latency > 2 * self.best_latency
+                    and throughput <= self.last_throughput
+            ):
+                self.limit = max(self.min_workers, self.limit - 1)
+                reason = f'延迟升高: {avg_latency:.2f}s > 2 * {self.best_latency:.2f}s'
+            elif throughput >= self.last_throughput * 0.95 and self.active >= old:
+                self.limit = min(self.max_workers, self.limit + 1)
+                reason = f'吞吐量: {throughput / 1024 / 1024:.2f}MB/s'
+            else:
+                reason = ''
+            if avg_latency:
+                self.best_latency = min(self.best_latency or avg_latency, avg_latency)
+            self.requests = self.errors = self.throttles = 0
+            self.latency = 0.0
+            self.last_throughput = throughput
+            self.last_bytes = downloaded
+            self.last_time = now
+            if self.limit == old:
+                return None
+            self._cond.notify_all()
+            return f'{old} -> {self.limit}, {reason}'
+
+
+class PriorityBudget(object):
+    """
+    多个任务共享的并发额度
+
+    额度不足时按照优先级(数值越大越优先)和等待顺序分配, limit为0表示不限制
+    """
+
+    def __init__(self, limit: int = 0):
+        self.limit = limit
+        self.active = 0
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def acquire(self, priority: int = 0):
+        if self.limit <= 0:
+            return
+        with self._cond:
+            heapq.heappush(self._waiters, entry := (-priority, next(self._seq)))
+            while self.active >= self.limit or self._waiters[0] != entry:
+                self._cond.wait()
+            heapq.heappop(self._waiters)
+            self.active += 1
+            # 额度还有剩余时, 下一个等待者也可以继续
+            self._cond.notify_all()
+
+    def release(self):
+        if self.limit <= 0:
+            return
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def slot(self, priority: int = 0) -> '_BudgetSlot':
+        """按照指定优先级占用额度的上下文管理器, 可以重复使用"""
+        return _BudgetSlot(self, priority)
+
+
+class _BudgetSlot(object):
+    __slots__ = ('budget', 'priority')
+
+    def __init__(self, budget: PriorityBudget, priority: int):
+        self.budget = budget
+        self.priority = priority
+
+    def __enter__(self):
+        self.budget.acquire(self.priority)
+        return self
+
+    def __exit__(self, *exc):
+        self.budget.release()
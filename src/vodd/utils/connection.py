@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 13:20
+# @Version     : Python 3.14.0
+import contextlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionManager(object):
+    """
+    按域名管理Session的连接池
+
+    requests默认每个域名最多保留10个连接, 并发数超过10时连接会被频繁关闭和重建,
+    这里按照并发数设置连接池大小, 支持按域名单独设置连接池大小和并发上限
+    """
+
+    def __init__(
+            self,
+            session: requests.Session,
+            pool_size: int = 10,
+            host_pool_sizes: dict = None,
+            host_limits: dict = None,
+    ):
+        self.session = session
+        self.pool_size = pool_size
+        self.host_pool_sizes = host_pool_sizes or {}
+        self.adapters = []
+        self.mount('http://', pool_size)
+        self.mount('https://', pool_size)
+        for host, size in self.host_pool_sizes.items():
+            self.mount(f'http://{host}/', size)
+            self.mount(f'https://{host}/', size)
+        self.host_limit_sizes = {host: n for host, n in (host_limits or {}).items() if n > 0}
+        self.host_limits = {host: threading.BoundedSemaphore(n) for host, n in self.host_limit_sizes.items()}
+
+    def mount(self, prefix: str, pool_size: int):
+        adapter = HTTPAdapter(pool_connections=100, pool_maxsize=pool_size)
+        self.session.mount(prefix, adapter)
+        self.adapters.append(adapter)
+
+    def get_pool_size(self, host: str) -> int:
+        return self.host_pool_sizes.get(host, self.pool_size)
+
+    @contextlib.contextmanager
+    def limit(self, url: str):
+        """域名并发上限"""
+        if (semaphore := self.host_limits.get(urlparse(url).netloc)) is None:
+            yield
+            return
+        with semaphore:
+            yield
+
+    def prewarm(self, urls: list, request_kwargs: dict, connections: int):
+        """
+        预先建立到切片域名的连接, 减少下载开始时的TCP/TLS握手
+        :param urls: 切片链接
+        :param request_kwargs: 请求参数
+        :param connections: 每个域名最多建立的连接数
+        :return:
+        """
+        hosts = {}
+        for url in urls:
+            hosts.setdefault(urlparse(url).netloc, url)
+        jobs = []
+        for host, url in hosts.items():
+            n = min(connections, self.get_pool_size(host), self.host_limit_sizes.get(host, connections))
+            jobs.extend([url] * n)
+        if not jobs:
+            return
+
+        def warm(u: str):
+            try:
+                self.session.head(u, **{**request_kwargs, 'allow_redirects': False})
+            except Exception as e:
+                logger.debug(f'预建连接失败: {u}, {e}')
+
+        with ThreadPoolExecutor(max_workers=min(len(jobs), 64)) as executor:
+            list(executor.map(warm, jobs))
+        logger.info(f'预建连接: {', '.join(f'{h}' for h in hosts)}, 共{len(jobs)}个')
+
+    def stats(self) -> dict:
+        """
+        每个域名的连接复用统计
+        :return: {host: {'connections': 新建连接数, 'requests': 请求数, 'reused': 复用次数}}
+        """
+        result = {}
+        for adapter in self.adapters:
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                if (pool := pools.get(key)) is None:
+                    continue
+                host = pool.host if pool.port in (None, 80, 443) else f'{pool.host}:{pool.port}'
+                item = result.setdefault(host, {'connections': 0, 'requests': 0, 'reused': 0})
+                item['connections'] += pool.num_connections
+                item['requests'] += pool.num_requests
+                item['reused'] += max(pool.num_requests - pool.num_connections, 0)
+        return result
@@ -2,10 +2,11 @@
 # @Author      : LJQ
 # @Time        : 2025/10/15 18:59
 # @Version     : Python 3.14.0
-from typing import Dict, List
+from typing import Dict, Iterator, List
 
 from vodd.core.constants import MediaName, SUPPORTED_DRM_CIPHERS
-from vodd.core.models import Segment, Cipher
+from vodd.core.models import Cipher
+from vodd.core.segment_table import SegmentTable
 from vodd.format_parser.dash import tags
 
 
@@ -21,41 +22,34 @@ def get_representations(adaptation_sets: List[tags.AdaptationSet]) -> Dict[str,
     return representations
 
 
-def get_video_segments(representation: tags.Representation):
-    # 拼接视频切片
+def iter_track_segments(
+        representation: tags.Representation, media_type: str, group_no: int, table: SegmentTable
+) -> Iterator:
+    # 拼接切片, 边展开时间线边产出
     # TODO: byterange
-    segments = []
     cipher = get_cipher(representation.content_protections)
     for index, segment in enumerate(representation.segments):
-        segments.append(Segment(
-            type=MediaName.video,
-            group_no=0,
+        yield table.append(
+            type=media_type,
+            group_no=group_no,
             index=index,
             cipher=cipher,
             url=segment['segment_url'],
             duration=segment['duration'],
             init_url=segment['initialization_url'],
-        ))
-    return segments
+        )
+
+
+def get_video_segments(representation: tags.Representation):
+    return list(iter_track_segments(representation, MediaName.video, 0, SegmentTable()))
 
 
 def get_audios_segments(representations: List[tags.Representation]):
-    audios = []
-    for group_no, audio in enumerate(representations):
-        segments = []
-        cipher = get_cipher(audio.content_protections)
-        for index, segment in enumerate(audio.segments):
-            segments.append(Segment(
-                type=MediaName.audio,
-                group_no=group_no,
-                index=index,
-                url=segment['segment_url'],
-                duration=segment['duration'],
-                cipher=cipher,
-                init_url=segment['initialization_url'],
-            ))
-        audios.append(segments)
-    return audios
+    table = SegmentTable()
+    return [
+        list(iter_track_segments(audio, MediaName.audio, group_no, table))
+        for group_no, audio in enumerate(representations)
+    ]
 
 
 def get_cipher(content_protections: List[tags.ContentProtection]) -> Cipher:
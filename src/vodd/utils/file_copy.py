@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 14:40
+# @Version     : Python 3.14.0
+import errno
+import logging
+import os
+import shutil
+import struct
+from pathlib import Path
+from typing import BinaryIO
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# linux/fs.h: _IOW(0x94, 13, struct file_clone_range)
+FICLONERANGE = 0x4020940D
+# 出现这些错误时换下一种方式拼接
+_FALLBACK_ERRNOS = {
+    errno.ENOSYS,
+    errno.ENOTTY,
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.EBADF,
+    errno.EPERM,
+}
+# 出现这些错误时说明当前系统或者文件系统不支持, 后续不再尝试
+_UNSUPPORTED_ERRNOS = {errno.ENOSYS, errno.ENOTTY, errno.EOPNOTSUPP, errno.ENOTSUP}
+_disabled = set()
+
+
+def _reflink(fsrc: BinaryIO, fdst: BinaryIO, size: int, offset: int, chunk_size: int) -> bool:
+    """写时复制, 只修改文件系统的元数据(btrfs/xfs等), 目标偏移必须按块对齐"""
+    if fcntl is None or offset % os.fstatvfs(fdst.fileno()).f_bsize:
+        return False
+    # 长度为0表示复制到源文件末尾, 末尾不足一个块也可以
+    fcntl.ioctl(fdst.fileno(), FICLONERANGE, struct.pack('qQQQ', fsrc.fileno(), 0, 0, offset))
+    return True
+
+
+def _copy_file_range(fsrc: BinaryIO, fdst: BinaryIO, size: int, offset: int, chunk_size: int) -> bool:
+    """在内核中复制, 数据不经过用户态"""
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    copied = 0
+    while copied < size:
+        if not (n := os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied, copied, offset + copied)):
+            break
+        copied += n
+    return copied == size
+
+
+def _sendfile(fsrc: BinaryIO, fdst: BinaryIO, size: int, offset: int, chunk_size: int) -> bool:
+    """在内核中复制, 写入到目标文件的当前位置"""
+    if not hasattr(os, 'sendfile'):
+        return False
+    fdst.seek(offset)
+    copied = 0
+    while copied < size:
+        if not (n := os.sendfile(fdst.fileno(), fsrc.fileno(), copied, size - copied)):
+            break
+        copied += n
+    return copied == size
+
+
+def _python(fsrc: BinaryIO, fdst: BinaryIO, size: int, offset: int, chunk_size: int) -> bool:
+    """分块读取后写入"""
+    fsrc.seek(0)
+    fdst.seek(offset)
+    shutil.copyfileobj(fsrc, fdst, chunk_size)
+    return True
+
+
+COPIERS = {
+    'reflink': _reflink,
+    'copy_file_range': _copy_file_range,
+    'sendfile': _sendfile,
+    'python': _python,
+}
+
+
+def append_file(src: Path, fdst: BinaryIO, chunk_size: int = 1024 * 1024, methods: tuple = tuple(COPIERS)) -> str:
+    """
+    将文件追加到目标文件末尾
+
+    依次尝试reflink、copy_file_range、sendfile, 都不可用时使用分块读写
+    目标文件不能以追加模式(O_APPEND)打开, 否则copy_file_range不可用
+    :param src: 源文件
+    :param fdst: 已打开的目标文件
+    :param chunk_size: 分块读写的大小
+    :param methods: 可以使用的方式
+    :return: 实际使用的方式
+    """
+    fdst.flush()
+    offset = fdst.seek(0, os.SEEK_END)
+    with open(src, 'rb') as fsrc:
+        if not (size := os.fstat(fsrc.fileno()).st_size):
+            return 'empty'
+        for method in methods:
+            if method in _disabled:
+                continue
+            try:
+                if COPIERS[method](fsrc, fdst, size, offset, chunk_size):
+                    fdst.seek(offset + size)
+                    return method
+            except OSError as e:
+                if e.errno not in _FALLBACK_ERRNOS:
+                    raise
+                if e.errno in _UNSUPPORTED_ERRNOS:
+                    logger.debug(f'不支持的文件拼接方式: {method}, {e}')
+                    _disabled.add(method)
+            # 丢弃失败时已经写入的部分
+            fdst.truncate(offset)
+            fdst.seek(offset)
+    raise OSError(f'无法拼接文件: {src}')
+
+
+def pipe_file(src: Path, fdst: BinaryIO, chunk_size: int = 1024 * 1024):
+    """
+    将文件写入管道, 优先使用sendfile
+    :param src: 源文件
+    :param fdst: 已打开的管道
+    :param chunk_size: 分块读写的大小
+    :return:
+    """
+    fdst.flush()
+    with open(src, 'rb') as fsrc:
+        size = os.fstat(fsrc.fileno()).st_size
+        copied = 0
+        if hasattr(os, 'sendfile') and 'sendfile' not in _disabled:
+            try:
+                while copied < size:
+                    if not (n := os.sendfile(fdst.fileno(), fsrc.fileno(), copied, size - copied)):
+                        break
+                    copied += n
+            except OSError as e:
+                if e.errno not in _FALLBACK_ERRNOS:
+                    raise
+        if copied < size:
+            fsrc.seek(copied)
+            shutil.copyfileobj(fsrc, fdst, chunk_size)
+            fdst.flush()
+
+
+def open_for_append(path: Path) -> BinaryIO:
+    """以非追加模式打开文件并定位到末尾"""
+    f = open(path, 'r+b' if path.exists() else 'wb')
+    f.seek(0, os.SEEK_END)
+    return f
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 11:30
+# @Version     : Python 3.14.0
+import json
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def _default(obj):
+    if isinstance(obj, bytes):
+        return {'__bytes__': obj.hex()}
+    if isinstance(obj, Path):
+        return obj.as_posix()
+    raise TypeError(f'无法序列化: {type(obj).__name__}')
+
+
+def _object_hook(obj: dict):
+    if len(obj) == 1 and '__bytes__' in obj:
+        return bytes.fromhex(obj['__bytes__'])
+    return obj
+
+
+class Journal(object):
+    """
+    断点续传日志
+
+    以追加的方式将下载计划和每个切片的确认状态写入到临时文件夹中,
+    程序中断后可以据此只下载缺失或者不完整的切片
+    """
+    name = 'journal.jsonl'
+
+    def __init__(self, temp_dir: Path, enabled: bool = False):
+        self.path = temp_dir / self.name
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._file = None
+        # 从日志中读取的内容
+        self.header = {}
+        self.segments = []
+        self.planned = None
+        self.confirmed = {}
+        self.inits = {}
+        self.tracks = {}
+        self.keys = {}
+
+    def load(self, url: str) -> bool:
+        """
+        读取已存在的日志
+        :param url: 播放链接, 与日志不一致时日志作废
+        :return: 是否存在完整的下载计划
+        """
+        if not self.enabled or not self.path.exists():
+            return False
+        from vodd.core.models import Segment
+        splits = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line, object_hook=_object_hook)
+                except json.JSONDecodeError:
+                    # 程序中断时最后一行可能不完整
+                    continue
+                match record.pop('kind'):
+                    case 'header':
+                        self.header = record
+                    case 'segment':
+                        try:
+                            self.segments.append(Segment(**record['data']))
+                        except Exception as e:
+                            logger.error(f'断点续传日志切片错误: {e}')
+                            return False
+                    case 'split':
+                        splits[record['name']] = record['headers']
+                    case 'planned':
+                        self.planned = record
+                    case 'confirmed':
+                        self.confirmed[record['name']] = record
+                    case 'init':
+                        self.inits[record['name']] = record
+                    case 'track':
+                        self.tracks[record['name']] = record
+                    case 'keys':
+                        self.keys.update(record['data'])
+        if self.header.get('url') != url or self.planned is None or self.planned['count'] > len(self.segments):
+            logger.warning(f'断点续传日志无效, 重新下载: {self.path}')
+            return False
+        # 下载过程中被拆分的切片只下载到拆分点
+        for segment in self.segments:
+            if (headers := splits.get(segment.filepath.name)) is not None:
+                segment.headers = headers
+        logger.info(f'读取断点续传日志: {len(self.confirmed)}/{len(self.segments)}')
+        return True
+
+    def write(self, kind: str, **record):
+        if not self.enabled:
+            return
+        line = json.dumps({'kind': kind, **record}, ensure_ascii=False, default=_default)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(f'{line}\n')
+            self._file.flush()
+
+    def is_complete(self, filepath: Path, record: dict) -> bool:
+        """文件存在且大小与记录一致"""
+        if not record or not filepath or not filepath.exists():
+            return False
+        return filepath.stat().st_size == record['size']
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 21:40
+# @Version     : Python 3.14.0
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class KeyStore(object):
+    """
+    本机共享的DRM密钥缓存
+
+    以KID和PSSH为键保存kid:key, 请求许可之前先查询, 同一个作品的重复下载和其他清晰度不需要再次请求许可;
+    写入时持有文件锁并以替换的方式更新, 多个进程同时写入不会丢失记录, 读取时不需要加锁; 过期的记录在写入时清理
+    """
+
+    def __init__(self, path: Path, ttl: float = 30 * 24 * 3600):
+        """
+        :param path: 缓存文件
+        :param ttl: 有效期(秒), 0表示不使用缓存
+        """
+        self.path = Path(path)
+        self.ttl = ttl
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def names(kid: str = '', pssh: str = '') -> list[str]:
+        names = []
+        if kid:
+            names.append(f"kid:{kid.lower().replace('-', '')}")
+        if pssh:
+            names.append(f"pssh:{hashlib.sha256(pssh.encode('utf-8')).hexdigest()}")
+        return names
+
+    def read(self) -> dict:
+        try:
+            return json.loads(self.path.read_text('utf-8'))
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logger.warning(f'密钥缓存文件损坏, 忽略: {self.path}, {e}')
+            return {}
+
+    @contextlib.contextmanager
+    def locked(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_name(f'{self.path.name}.lock'), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get(self, kid: str = '', pssh: str = '') -> str | None:
+        """
+        查询密钥
+        :param kid:
+        :param pssh: base64格式
+        :return: kid:key, 没有或者已过期时返回None
+        """
+        if not self.enabled:
+            return None
+        entries = self.read()
+        now = time.time()
+        for name in self.names(kid, pssh):
+            if (entry := entries.get(name)) and entry['expires_at'] > now:
+                return entry['key']
+        return None
+
+    def put(self, key: str, kid: str = '', pssh: str = ''):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self.locked():
+            entries = {k: v for k, v in self.read().items() if v.get('expires_at', 0) > now}
+            for name in self.names(kid, pssh):
+                entries[name] = {'key': key, 'expires_at': now + self.ttl}
+            tmp = self.path.with_name(f'.{self.path.name}.{os.getpid()}.tmp')
+            # 密钥只允许当前用户读取
+            with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
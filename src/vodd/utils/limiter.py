@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 12:05
+# @Version     : Python 3.14.0
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    令牌桶限速器, 由所有下载线程共享
+
+    rate为每秒允许下载的字节数, 0表示不限速; burst为令牌桶容量, 默认为1秒的带宽
+    令牌桶开始限速时是满的, 第一批数据不需要等待;
+    令牌允许透支, 透支的部分由调用方等待偿还, 因此单个分块大于burst时也能正常限速
+    parent为上一级限速器(多个任务共享的总带宽), 消耗令牌时同时从两级扣除
+    """
+
+    def __init__(self, rate: float = 0, burst: float = 0, parent: 'TokenBucket' = None):
+        self._lock = threading.Lock()
+        self.parent = parent
+        self.rate = 0
+        self.burst = 0
+        self.tokens = 0
+        self.updated_at = time.monotonic()
+        self.set_rate(rate, burst)
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 or (self.parent is not None and self.parent.enabled)
+
+    def set_rate(self, rate: float, burst: float = 0):
+        """
+        运行时调整限速
+        :param rate: 每秒字节数, 0表示不限速
+        :param burst: 突发大小, 0表示1秒的带宽
+        :return:
+        """
+        with self._lock:
+            self._refill()
+            unlimited = not self.rate
+            self.rate = max(rate or 0, 0)
+            self.burst = burst or self.rate
+            self.tokens = self.burst if unlimited else min(self.tokens, self.burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount: int) -> float:
+        """
+        预留令牌
+        :param amount: 字节数
+        :return: 需要等待的秒数
+        """
+        delay = self.parent.reserve(amount) if self.parent is not None else 0
+        if not self.rate:
+            return delay
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return delay
+            return max(-self.tokens / self.rate, delay)
+
+    def consume(self, amount: int):
+        """消耗令牌, 令牌不足时阻塞等待"""
+        if delay := self.reserve(amount):
+            time.sleep(delay)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 22:30
+# @Version     : Python 3.14.0
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+
+class Manifest(object):
+    __slots__ = ('url', 'text', 'plan', 'cached', 'headers')
+
+    def __init__(self, url: str, text: str, plan=None, cached: bool = False, headers=None):
+        """
+        :param url: 重定向后的链接, 用于解析相对路径
+        :param text: 清单内容
+        :param plan: 解析结果
+        :param cached: 是否使用了缓存(未过期或者服务器返回304)
+        :param headers: 响应头
+        """
+        self.url = url
+        self.text = text
+        self.plan = plan
+        self.cached = cached
+        self.headers = headers if headers is not None else {}
+
+
+def is_live(text: str) -> bool:
+    """直播清单随时会变化, 每次都需要向服务器确认"""
+    if text.lstrip().startswith('#EXTM3U'):
+        if '#EXT-X-STREAM-INF' in text or '#EXT-X-ENDLIST' in text:
+            return False
+        return '#EXT-X-PLAYLIST-TYPE:VOD' not in text
+    return 'type="dynamic"' in text or "type='dynamic'" in text
+
+
+class ManifestCache(object):
+    """
+    本机共享的MPD/m3u8清单缓存
+
+    以规范化的链接为键保存清单内容、ETag/Last-Modified和解析结果, 点播清单在max_age内直接使用,
+    过期后通过If-None-Match/If-Modified-Since向服务器确认, 返回304时继续使用缓存的内容和解析结果;
+    每个清单一个文件, 以替换的方式写入, 总大小超过max_size时按最近使用时间淘汰
+    """
+
+    def __init__(self, path: Path, max_age: float = 0, max_size: int = 64 * 1024 * 1024):
+        """
+        :param path: 缓存文件夹
+        :param max_age: 点播清单不需要确认的有效期(秒), 0表示每次都向服务器确认
+        :param max_size: 缓存总大小(字节), 0表示不使用缓存
+        """
+        self.path = Path(path)
+        self.max_age = max_age
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    @staticmethod
+    def normalize(url: str) -> str:
+        """协议和域名不区分大小写, 去掉默认端口和锚点"""
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        netloc = parts.netloc.lower()
+        if (scheme, parts.port) in (('http', 80), ('https', 443)):
+            netloc = netloc.rsplit(':', 1)[0]
+        return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+    def entry_path(self, url: str) -> Path:
+        return self.path / f"{hashlib.sha256(self.normalize(url).encode('utf-8')).hexdigest()}.json"
+
+    def contains(self, url: str) -> bool:
+        return self.enabled and self.entry_path(url).exists()
+
+    def load(self, url: str) -> dict | None:
+        try:
+            entry = json.loads((path := self.entry_path(url)).read_text('utf-8'))
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.warning(f'清单缓存文件损坏, 忽略: {url}, {e}')
+            return None
+        if entry.get('key') != self.normalize(url):
+            return None
+        # 修改时间作为最近使用时间
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def save(self, url: str, entry: dict):
+        self.path.mkdir(parents=True, exist_ok=True)
+        path = self.entry_path(url)
+        tmp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp.write_text(json.dumps(entry, ensure_ascii=False), 'utf-8')
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """总大小超过上限时删除最久未使用的清单"""
+        with self._lock:
+            files = []
+            for path in self.path.glob('*.json'):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_size:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+    def fetch(self, request, url: str, planner=None, fresh: bool = False) -> Manifest:
+        """
+        获取清单
+        :param request: 请求函数, 参数与Downloader.requester相同
+        :param url:
+        :param planner: 解析函数, 参数为(清单内容, 链接), 返回值需要可以序列化为JSON, 与清单一起缓存
+        :param fresh: 本次运行中已经确认过, 直接使用缓存
+        :return:
+        """
+        if not self.enabled:
+            resp = request('GET', url)
+            return Manifest(resp.url, resp.text, planner(resp.text, resp.url) if planner else None, headers=resp.headers)
+        plan_name = f'{planner.__module__}.{planner.__qualname__}' if planner else ''
+        now = time.time()
+        if (entry := self.load(url)) is not None:
+            if fresh or (not entry['live'] and now - entry['validated_at'] < self.max_age):
+                logger.info(f'使用缓存的清单: {url}')
+                return self.hit(url, entry, plan_name, planner, now, validated=False)
+            headers = {}
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+            resp = request('GET', url, headers=headers) if headers else request('GET', url)
+            if resp.status_code == 304:
+                logger.info(f'清单未修改: {url}')
+                return self.hit(url, entry, plan_name, planner, now, validated=True)
+        else:
+            resp = request('GET', url)
+        return self.put(url, Manifest(resp.url, resp.text, headers=resp.headers), planner)
+
+    def put(self, url: str, manifest: Manifest, planner=None) -> Manifest:
+        """保存从服务器获取的清单, 内容没有变化时保留已有的解析结果"""
+        if not self.enabled:
+            return Manifest(manifest.url, manifest.text, planner(manifest.text, manifest.url) if planner else None)
+        plans = {}
+        if (entry := self.load(url)) is not None and entry['text'] == manifest.text:
+            plans = entry['plans']
+        plan_name = f'{planner.__module__}.{planner.__qualname__}' if planner else ''
+        if planner and plan_name not in plans:
+            plans[plan_name] = planner(manifest.text, manifest.url)
+        self.save(url, {
+            'key': self.normalize(url),
+            'url': manifest.url,
+            'text': manifest.text,
+            'etag': manifest.headers.get('ETag') or '',
+            'last_modified': manifest.headers.get('Last-Modified') or '',
+            'live': is_live(manifest.text),
+            'validated_at': time.time(),
+            'plans': plans,
+        })
+        return Manifest(manifest.url, manifest.text, plans.get(plan_name), headers=manifest.headers)
+
+    def hit(self, url: str, entry: dict, plan_name: str, planner, now: float, validated: bool) -> Manifest:
+        changed = validated
+        if validated:
+            entry['validated_at'] = now
+        if planner and plan_name not in entry['plans']:
+            entry['plans'][plan_name] = planner(entry['text'], entry['url'])
+            changed = True
+        if changed:
+            self.save(url, entry)
+        return Manifest(entry['url'], entry['text'], entry['plans'].get(plan_name), cached=True)
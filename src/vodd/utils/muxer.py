@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 15:40
+# @Version     : Python 3.14.0
+import logging
+import subprocess
+from pathlib import Path
+
+from vodd.core.exceptions import MediaMergeError
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingMuxer(object):
+    """
+    流式合并
+
+    下载开始时启动FFmpeg, 输入为每个轨道的命名管道, 切片按顺序写入管道的同时完成合并
+    """
+
+    def __init__(self, command: str, output: Path, log_path: Path):
+        self.command = command
+        self.output = output
+        self.log_path = log_path
+        self.process: subprocess.Popen | None = None
+
+    def start(self):
+        logger.info(f'启动流式合并: {self.command}')
+        with open(self.log_path, 'wb') as log:
+            self.process = subprocess.Popen(
+                self.command,
+                shell=True,  # 允许使用字符串形式的命令
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=log,
+            )
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def wait(self, timeout: float = None):
+        try:
+            returncode = self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.kill()
+            raise MediaMergeError(f'timeout: {timeout}')
+        if returncode != 0:
+            raise MediaMergeError(f'{returncode}, {self.stderr}')
+
+    @property
+    def stderr(self) -> str:
+        try:
+            return self.log_path.read_text('utf-8', errors='replace')
+        except OSError:
+            return ''
+
+    def kill(self):
+        if self.is_alive():
+            self.process.kill()
+            self.process.wait()
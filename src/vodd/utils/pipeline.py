@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 19:50
+# @Version     : Python 3.14.0
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StageMeter(object):
+    """
+    流水线阶段的利用率统计
+
+    累加阶段内所有执行者的忙碌时间, 利用率 = 忙碌时间 / (经过时间 * 执行者数量)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.busy = 0.0
+        self.count = 0
+        self.started_at = None
+
+    def add(self, seconds: float):
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = time.monotonic() - seconds
+            self.busy += seconds
+            self.count += 1
+
+    def measure(self):
+        """计时的上下文管理器, 可以在多个线程中同时使用"""
+        return _Timer(self)
+
+    def report(self, capacity: int) -> dict:
+        elapsed = time.monotonic() - self.started_at if self.started_at is not None else 0
+        return {
+            'count': self.count,
+            'busy': round(self.busy, 3),
+            'capacity': capacity,
+            'utilisation': round(self.busy / (elapsed * capacity), 4) if elapsed and capacity else 0.0,
+        }
+
+
+class _Timer(object):
+    __slots__ = ('meter', 'start')
+
+    def __init__(self, meter: StageMeter):
+        self.meter = meter
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.meter.add(time.perf_counter() - self.start)
+
+
+def _execute(func, args: tuple) -> tuple:
+    """在解密进程中执行, 同时返回耗时"""
+    st = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - st
+
+
+class SharedProcessPool(object):
+    """批量下载时所有任务共享的解密进程池, 第一次提交解密任务时启动"""
+
+    def __init__(self, processes: int):
+        self.processes = processes
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._pool is None:
+                from concurrent.futures import ProcessPoolExecutor
+                logger.info(f'启动共享解密进程: {self.processes}')
+                self._pool = ProcessPoolExecutor(max_workers=self.processes)
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+class DecryptStage(object):
+    """
+    解密阶段
+
+    解密是CPU密集型操作, 在下载线程中执行会争抢GIL, 加密视频的下载速度远低于带宽,
+    因此下载线程只负责获取密钥和提交任务, 解密在进程池中执行, 完成后由收尾线程重命名并确认切片
+
+    下载阶段 -> [有界队列] -> 解密进程 -> 收尾线程
+    队列满时提交会阻塞下载线程, 避免下载远快于解密时堆积过多待解密的文件
+    """
+
+    def __init__(self, processes: int, queue_size: int = 0, on_error=None, shared: SharedProcessPool = None):
+        """
+        :param processes: 解密进程数量, 0表示在下载线程中解密
+        :param queue_size: 提交后尚未收尾的任务上限, 默认为进程数量的2倍
+        :param on_error: 解密或收尾失败时的回调, 参数为异常
+        :param shared: 共享的进程池, 指定时不再单独启动进程, processes不为0时使用共享进程池的进程数量
+        """
+        self.shared = shared
+        if shared is not None and processes:
+            processes = shared.processes
+        self.processes = processes
+        self.queue_size = queue_size or processes * 2
+        self.on_error = on_error
+        self.decrypt_meter = StageMeter()
+        self.finish_meter = StageMeter()
+        # 下载线程因队列已满而等待的时间
+        self.blocked = 0.0
+        self.pending = 0
+        self._slots = threading.BoundedSemaphore(max(self.queue_size, 1))
+        self._cond = threading.Condition()
+        self._done = queue.Queue()
+        self._pool = None
+        self._finisher: threading.Thread | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+    def _start(self):
+        with self._cond:
+            if self._pool is None:
+                # 没有加密切片时不需要导入多进程模块
+                if self.shared is not None:
+                    self._pool = self.shared.get()
+                else:
+                    from concurrent.futures import ProcessPoolExecutor
+                    logger.info(f'启动解密进程: {self.processes}, 队列长度: {self.queue_size}')
+                    self._pool = ProcessPoolExecutor(max_workers=self.processes)
+                self._finisher = threading.Thread(target=self.finish, name='decrypt-finisher', daemon=True)
+                self._finisher.start()
+
+    def submit(self, job: tuple, callback):
+        """
+        提交解密任务, 队列已满时阻塞
+        :param job: (函数, 参数), 函数必须是模块级函数, 参数可以序列化
+        :param callback: 解密完成后在收尾线程中调用, 参数为函数的返回值
+        :return:
+        """
+        if self._pool is None:
+            self._start()
+        waited = 0.0
+        if not self._slots.acquire(blocking=False):
+            st = time.perf_counter()
+            self._slots.acquire()
+            waited = time.perf_counter() - st
+        with self._cond:
+            self.pending += 1
+            self.blocked += waited
+        func, args = job
+        try:
+            future = self._pool.submit(_execute, func, args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda f: self._done.put((f, callback)))
+
+    def _release(self):
+        self._slots.release()
+        with self._cond:
+            self.pending -= 1
+            self._cond.notify_all()
+
+    def finish(self):
+        while (item := self._done.get()) is not None:
+            future, callback = item
+            try:
+                result, cost = future.result()
+                self.decrypt_meter.add(cost)
+                with self.finish_meter.measure():
+                    callback(result)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+                else:
+                    logger.error(f'解密任务异常: {e}')
+            finally:
+                self._release()
+
+    def join(self):
+        """等待已提交的任务全部收尾"""
+        with self._cond:
+            while self.pending:
+                self._cond.wait()
+
+    def close(self):
+        self.join()
+        if self._pool is not None:
+            self._done.put(None)
+            # 共享的进程池由SharedContext关闭
+            if self.shared is None:
+                self._pool.shutdown()
+            self._pool = None
+
+    def report(self, threads: int) -> dict:
+        """
+        各阶段统计
+        :param threads: 下载线程数量, 不使用解密进程时解密也在下载线程中执行
+        :return:
+        """
+        if not self.enabled:
+            return {'decrypt': self.decrypt_meter.report(threads)}
+        return {
+            'decrypt': self.decrypt_meter.report(self.processes),
+            'finish': self.finish_meter.report(1),
+            'queue': {'pending': self.pending, 'capacity': self.queue_size, 'blocked': round(self.blocked, 3)},
+        }
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 16:20
+# @Version     : Python 3.14.0
+import json
+import logging
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class _Counter(object):
+    """单个线程的计数器, 只由所属线程修改"""
+    __slots__ = ('name', 'bytes', 'completed', 'completed_bytes')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.bytes = 0
+        self.completed = 0
+        self.completed_bytes = 0
+
+
+class ProgressStats(object):
+    """
+    下载进度统计
+
+    每个线程只累加自己的计数器, 不需要加锁; 汇总时只遍历线程数量的计数器,
+    与切片数量无关, 下载速度使用指数加权移动平均(EWMA), 预估剩余时间更加平稳;
+    确认的切片按名字去重, 拆分、接管和续传重放时重复确认的切片只统计一次
+    """
+
+    def __init__(self, tau: float = 10):
+        self.tau = tau
+        self.total = 0
+        self.base_completed = 0
+        self.confirmed = set()
+        self.start_time = time.time()
+        self.counters: list[_Counter] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # 最近一次汇总的结果
+        self.speed = None
+        self.last_bytes = 0
+        self.last_time = time.monotonic()
+        self.snapshot = {}
+
+    @property
+    def counter(self) -> _Counter:
+        if (counter := getattr(self._local, 'counter', None)) is None:
+            counter = self._local.counter = _Counter(threading.current_thread().name)
+            with self._lock:
+                self.counters.append(counter)
+        return counter
+
+    def start(self, total: int, confirmed=()):
+        """
+        开始统计
+        :param total: 切片总数
+        :param confirmed: 开始前已经确认的切片名字(断点续传)
+        :return:
+        """
+        self.total = total
+        with self._lock:
+            self.confirmed = set(confirmed)
+            self.base_completed = len(self.confirmed)
+        self.start_time = time.time()
+        self.speed = None
+        self.last_bytes = self.downloaded
+        self.last_time = time.monotonic()
+
+    def add_bytes(self, n: int):
+        self.counter.bytes += n
+
+    def add_task(self):
+        """下载过程中新增了任务"""
+        with self._lock:
+            self.total += 1
+
+    def complete(self, name: str, size: int):
+        """
+        切片已确认
+        :param name: 切片名字, 已经确认过的切片不再统计
+        :param size: 切片大小
+        :return:
+        """
+        with self._lock:
+            if name in self.confirmed:
+                return
+            self.confirmed.add(name)
+        counter = self.counter
+        counter.completed_bytes += size
+        counter.completed += 1
+
+    @property
+    def downloaded(self) -> int:
+        return sum(c.bytes for c in self.counters)
+
+    @property
+    def completed(self) -> int:
+        return self.base_completed + sum(c.completed for c in self.counters)
+
+    @property
+    def is_complete(self) -> bool:
+        return self.completed >= self.total
+
+    def update(self, **extra) -> dict:
+        """
+        汇总所有线程的计数器, 更新下载速度和预估剩余时间
+        :param extra: 附加到结果中的字段
+        :return:
+        """
+        now = time.monotonic()
+        downloaded = self.downloaded
+        completed = 0
+        completed_bytes = 0
+        workers = {}
+        for c in self.counters:
+            completed += c.completed
+            completed_bytes += c.completed_bytes
+            workers[c.name] = c.bytes
+        # 间隔太短时不采样, 第一次采样作为初始速度
+        if (dt := now - self.last_time) >= 0.5:
+            rate = (downloaded - self.last_bytes) / dt
+            alpha = 1 - math.exp(-dt / self.tau)
+            self.speed = rate if self.speed is None else alpha * rate + (1 - alpha) * self.speed
+            self.last_bytes = downloaded
+            self.last_time = now
+        speed = self.speed or 0.0
+        completed += self.base_completed
+        # 按已确认切片的平均大小估算总大小, 正在下载的部分从剩余中扣除
+        if counted := completed - self.base_completed:
+            estimated = completed_bytes / counted * (self.total - completed)
+            remaining = max(estimated - max(downloaded - completed_bytes, 0), 0)
+        else:
+            remaining = 0
+        self.snapshot = {
+            'time': time.time(),
+            'elapsed': time.time() - self.start_time,
+            'downloaded_bytes': downloaded,
+            'completed_bytes': completed_bytes,
+            'remaining_bytes': int(remaining),
+            'completed': completed,
+            'total': self.total,
+            'speed': speed,
+            'eta': remaining / speed if speed and counted else None,
+            'workers': workers,
+            **extra,
+        }
+        return self.snapshot
+
+    def write(self, path: Path):
+        """以替换的方式写入JSON统计文件, 读取方不会读到不完整的内容"""
+        tmp = path.with_name(f'.{path.name}.tmp')
+        tmp.write_text(json.dumps(self.snapshot, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, path)
+
+    def prometheus(self) -> str:
+        """Prometheus文本格式"""
+        s = self.snapshot
+        lines = []
+        for name, kind, value in (
+                ('vodd_downloaded_bytes_total', 'counter', s.get('downloaded_bytes', 0)),
+                ('vodd_completed_bytes_total', 'counter', s.get('completed_bytes', 0)),
+                ('vodd_segments_completed', 'gauge', s.get('completed', 0)),
+                ('vodd_segments_total', 'gauge', s.get('total', 0)),
+                ('vodd_speed_bytes_per_second', 'gauge', s.get('speed', 0)),
+                ('vodd_eta_seconds', 'gauge', s.get('eta') if s.get('eta') is not None else 'NaN'),
+                ('vodd_elapsed_seconds', 'gauge', s.get('elapsed', 0)),
+                ('vodd_concurrency', 'gauge', s.get('concurrency', 0)),
+        ):
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {value}')
+        lines.append('# TYPE vodd_worker_downloaded_bytes_total counter')
+        for worker, value in s.get('workers', {}).items():
+            lines.append(f'vodd_worker_downloaded_bytes_total{{worker="{worker}"}} {value}')
+        lines.append('# TYPE vodd_stage_utilisation gauge')
+        for stage, value in s.get('stages', {}).items():
+            if 'utilisation' in value:
+                lines.append(f'vodd_stage_utilisation{{stage="{stage}"}} {value['utilisation']}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer(object):
+    """在后台线程中提供Prometheus指标, 只返回最近一次汇总的结果, 默认只监听本机"""
+
+    def __init__(self, stats: ProgressStats, port: int, host: str = '127.0.0.1'):
+        self.stats = stats
+        self.address = (host, port)
+        self._server = None
+
+    def start(self):
+        import http.server
+        stats = self.stats
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = stats.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(self.address, Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f'指标服务: http://{self.address[0]}:{self._server.server_address[1]}/metrics')
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 13:55
+# @Version     : Python 3.14.0
+import errno
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from vodd.utils.file_copy import append_file, open_for_append, pipe_file
+
+if TYPE_CHECKING:
+    from vodd.core.models import Segment
+
+logger = logging.getLogger(__name__)
+
+
+class OrderedTrackWriter(object):
+    """
+    轨道顺序写入器
+
+    切片确认后, 如果它之前的切片都已经写入, 立即追加到轨道文件并删除切片文件;
+    否则切片文件留在磁盘上作为溢出文件, 等前面的切片到达后再按顺序写入,
+    下载结束时轨道文件已经拼接完成, 不需要再次读取所有切片;
+    元数据文件复制到轨道文件的开头, 获取DRM密钥和解密切片还需要使用, 轨道写入完成后才删除
+    """
+
+    def __init__(self, path: Path, segments: list[Segment], chunk_size: int, journal=None, sealed: bool = True):
+        self.path = path
+        self.segments = list(segments)
+        self.positions = {segment.filepath.name: i for i, segment in enumerate(segments)}
+        self.chunk_size = chunk_size
+        self.journal = journal
+        # 轨道的切片是否已经全部规划完成
+        self.sealed = sealed
+        self.next = 0
+        self.ready = set()
+        self.writing = False
+        self.init_path = None
+        self._lock = threading.Lock()
+        self._file = None
+
+    @property
+    def finished(self) -> bool:
+        return self.sealed and self.next >= len(self.segments)
+
+    def add(self, segment: Segment):
+        """边规划边下载时, 追加新规划的切片"""
+        with self._lock:
+            self.positions[segment.filepath.name] = len(self.segments)
+            self.segments.append(segment)
+
+    def seal(self):
+        """轨道的切片已经全部规划完成"""
+        with self._lock:
+            self.sealed = True
+
+    def open(self, init_path: Path = None, record: dict = None):
+        """
+        打开轨道文件
+        :param init_path: 元数据文件, 作为轨道文件的开头
+        :param record: 断点续传日志中的写入进度
+        :return:
+        """
+        self.init_path = init_path
+        if resumed := record and self.path.exists() and self.path.stat().st_size >= record['size']:
+            # 断点续传: 丢弃最后一次记录之后写入的内容, 已写入的切片不再下载, 轨道文件中已经包含元数据
+            with open(self.path, 'r+b') as f:
+                f.truncate(record['size'])
+            self.next = record['count']
+            for segment in self.segments[:self.next]:
+                segment.confirmed = True
+            logger.info(f'轨道已写入: {self.path.name}, {self.next}/{len(self.segments)}')
+        else:
+            self.path.unlink(missing_ok=True)
+        self._file = open_for_append(self.path)
+        if init_path and not resumed:
+            append_file(init_path, self._file, self.chunk_size)
+
+    def push(self, segment: Segment):
+        """
+        切片已确认
+
+        同一时间只有一个线程负责写入, 其他线程只登记后立即返回, 不会阻塞下载
+        :param segment:
+        :return:
+        """
+        with self._lock:
+            if (position := self.positions[segment.filepath.name]) < self.next:
+                return
+            self.ready.add(position)
+            if self.writing:
+                return
+            self.writing = True
+        try:
+            while True:
+                with self._lock:
+                    if self.next not in self.ready:
+                        self.writing = False
+                        break
+                    self.ready.remove(self.next)
+                    segment = self.segments[self.next]
+                self.append(segment.filepath)
+                with self._lock:
+                    self.next += 1
+                    count = self.next
+                    batch_end = self.next not in self.ready
+                if self.journal is not None and batch_end:
+                    self._file.flush()
+                    self.journal.write('track', name=self.path.name, count=count, size=self._file.tell())
+        except BaseException:
+            with self._lock:
+                self.writing = False
+            raise
+
+    def insert(self, segment: Segment, after: Segment):
+        """
+        下载过程中新增的切片, 排在after之后
+        :param segment:
+        :param after: 尚未写入的切片
+        :return:
+        """
+        with self._lock:
+            position = self.positions[after.filepath.name] + 1
+            self.segments.insert(position, segment)
+            self.ready = {p + 1 if p >= position else p for p in self.ready}
+            for i in range(position, len(self.segments)):
+                self.positions[self.segments[i].filepath.name] = i
+
+    def append(self, filepath: Path):
+        append_file(filepath, self._file, self.chunk_size)
+        filepath.unlink()
+
+    def remove_init(self):
+        """轨道写入完成后删除元数据文件, 未完成时保留, 用于解密和断点续传"""
+        if self.finished and self.init_path is not None:
+            self.init_path.unlink(missing_ok=True)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.remove_init()
+
+
+class PipeTrackWriter(OrderedTrackWriter):
+    """
+    管道顺序写入器
+
+    与OrderedTrackWriter相同的顺序规则, 但是写入的是FFmpeg正在读取的命名管道,
+    由单独的线程负责写入, FFmpeg读取变慢时只会阻塞该线程, 不会阻塞下载线程
+    """
+
+    def __init__(self, path: Path, segments: list[Segment], chunk_size: int, is_alive=None):
+        super().__init__(path, segments, chunk_size)
+        self.is_alive = is_alive or (lambda: True)
+        self.error = None
+        self._cond = threading.Condition(self._lock)
+        self._thread = None
+
+    def open(self, init_path: Path = None, record: dict = None):
+        self.init_path = init_path
+        self.path.unlink(missing_ok=True)
+        os.mkfifo(self.path)
+        self._thread = threading.Thread(target=self.feed, args=(init_path,), daemon=True)
+        self._thread.start()
+
+    def push(self, segment: Segment):
+        with self._cond:
+            if (position := self.positions[segment.filepath.name]) < self.next:
+                return
+            self.ready.add(position)
+            self._cond.notify()
+
+    def open_pipe(self) -> int | None:
+        """等待FFmpeg打开管道的读取端"""
+        while self.is_alive():
+            try:
+                fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as e:
+                if e.errno != errno.ENXIO:
+                    raise
+                time.sleep(0.1)
+                continue
+            os.set_blocking(fd, True)
+            return fd
+        return None
+
+    def feed(self, init_path: Path = None):
+        try:
+            if (fd := self.open_pipe()) is None:
+                return
+            with os.fdopen(fd, 'wb') as pipe:
+                if init_path:
+                    # 元数据文件在close时删除, 解密后续的切片还需要使用
+                    pipe_file(init_path, pipe, self.chunk_size)
+                while not self.finished:
+                    with self._cond:
+                        while self.next not in self.ready:
+                            # FFmpeg已经退出时不再等待
+                            if not self.is_alive():
+                                return
+                            self._cond.wait(1)
+                        self.ready.remove(self.next)
+                        segment = self.segments[self.next]
+                    pipe_file(segment.filepath, pipe, self.chunk_size)
+                    segment.filepath.unlink()
+                    with self._cond:
+                        self.next += 1
+        except Exception as e:
+            logger.error(f'写入管道失败: {self.path.name}, {e}')
+            self.error = e
+
+    def close(self):
+        """等待写入线程结束, 需要提前结束时先停止FFmpeg"""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.remove_init()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 09:30
+# @Version     : Python 3.14.0
+"""测试共用的fixture"""
+import pytest
+
+URL = 'http://127.0.0.1/index.m3u8'
+
+
+@pytest.fixture
+def make_downloader(tmp_path, monkeypatch):
+    """
+    创建使用临时文件夹的Downloader, 参数与命令行默认值一致, 不需要安装FFmpeg
+    :return: make_downloader(*argv, **kwargs)
+    """
+    from vodd import downloader as module
+    from vodd.main import parse_args
+    monkeypatch.setattr(module, 'TEMP_DIR', tmp_path / 'temp')
+    monkeypatch.setattr(module, 'MANIFEST_CACHE_DIR', tmp_path / 'manifests')
+    monkeypatch.setattr(module, 'find_executable', lambda name: name)
+
+    def make(*argv, **kwargs):
+        options = parse_args(['-o', (tmp_path / 'out.ts').as_posix(), '--url', URL, *argv])
+        options.update(kwargs)
+        return module.Downloader(**options)
+
+    return make
+
+
+class FileServer(object):
+    """
+    本地HTTP服务, 提供files中的内容
+
+    支持HEAD、Range和keep-alive, 记录每个请求的路径和Range; ranges为False时忽略Range
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.ranges = True
+        self.requests = []
+        self.server = None
+
+    def url(self, path: str) -> str:
+        return f'http://127.0.0.1:{self.server.server_address[1]}{path}'
+
+    def start(self):
+        import http.server
+        import threading
+        owner = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_HEAD(self):
+                self.respond(body=False)
+
+            def do_GET(self):
+                self.respond(body=True)
+
+            def respond(self, body: bool):
+                owner.requests.append((self.command, self.path, self.headers.get('Range')))
+                if (content := owner.files.get(self.path)) is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                status = 200
+                if owner.ranges and (value := self.headers.get('Range')):
+                    start, _, end = value.removeprefix('bytes=').partition('-')
+                    start, end = int(start), min(int(end) if end else len(content) - 1, len(content) - 1)
+                    self.send_response(status := 206)
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{len(content)}')
+                    content = content[start:end + 1]
+                else:
+                    self.send_response(status)
+                if owner.ranges:
+                    self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def file_server():
+    server = FileServer()
+    server.start()
+    yield server
+    server.stop()
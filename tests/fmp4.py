@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 00:20
+# @Version     : Python 3.14.0
+"""
+生成加密fMP4元数据和切片的测试工具
+
+与benchmarks/bench_cenc.py相同的box结构, 额外支持多个子样本、saiz/saio和PIFF格式的样本加密信息;
+加密使用独立的逐块实现, 不依赖被测试的解密代码
+"""
+import struct
+
+from Crypto.Cipher import AES
+
+KID = bytes.fromhex('0123456789abcdef0123456789abcdef')
+KEY = bytes.fromhex('00112233445566778899aabbccddeeff')
+PIFF_SENC = bytes.fromhex('a2394f525a9b4f14a2446c427c648df4')
+
+
+def box(box_type: bytes, *payload: bytes) -> bytes:
+    content = b''.join(payload)
+    return struct.pack('>I4s', len(content) + 8, box_type) + content
+
+
+def full_box(box_type: bytes, version: int, flags: int, *payload: bytes) -> bytes:
+    return box(box_type, struct.pack('>I', (version << 24) | flags), *payload)
+
+
+def build_init(
+        scheme: str = 'cenc',
+        crypt: int = 0,
+        skip: int = 0,
+        constant_iv: bytes = b'',
+        iv_size: int = 8,
+        kid: bytes = KID,
+        encrypted: bool = True,
+        default_sample_size: int = 0,
+) -> bytes:
+    """
+    视频轨道的元数据
+    :param scheme: schm中的加密方式
+    :param crypt: cbcs模式的加密块数量, 与skip都不为0时使用版本1的tenc
+    :param skip: cbcs模式的跳过块数量
+    :param constant_iv: 固定IV, 不为空时样本加密信息中没有IV
+    :param iv_size: 每个样本的IV长度
+    :param kid:
+    :param encrypted: False时样本描述为avc1, 没有sinf
+    :param default_sample_size: trex中的默认样本大小
+    :return:
+    """
+    version = 1 if crypt or skip or constant_iv else 0
+    pattern = (crypt << 4) | skip if version else 0
+    if constant_iv:
+        tenc = full_box(b'tenc', version, 0, bytes([0, pattern, 1, 0]), kid, bytes([len(constant_iv)]), constant_iv)
+    else:
+        tenc = full_box(b'tenc', version, 0, bytes([0, pattern, 1, iv_size]), kid)
+    sinf = box(
+        b'sinf',
+        box(b'frma', b'avc1'),
+        full_box(b'schm', 0, 0, scheme.encode(), struct.pack('>I', 0x10000)),
+        box(b'schi', tenc),
+    )
+    visual = bytes(6) + struct.pack('>H', 1) + bytes(16) + struct.pack('>HH', 1920, 1080) \
+        + struct.pack('>II', 0x480000, 0x480000) + bytes(4) + struct.pack('>H', 1) + bytes(32) \
+        + struct.pack('>Hh', 0x18, -1)
+    avcc = box(b'avcC', bytes([1, 0x64, 0, 0x28, 0xff, 0xe0, 0, 0]))
+    entry = box(b'encv', visual, avcc, sinf) if encrypted else box(b'avc1', visual, avcc)
+    stbl = box(
+        b'stbl',
+        full_box(b'stsd', 0, 0, struct.pack('>I', 1), entry),
+        full_box(b'stts', 0, 0, bytes(4)),
+        full_box(b'stsc', 0, 0, bytes(4)),
+        full_box(b'stsz', 0, 0, bytes(8)),
+        full_box(b'stco', 0, 0, bytes(4)),
+    )
+    minf = box(
+        b'minf',
+        full_box(b'vmhd', 0, 1, bytes(8)),
+        box(b'dinf', full_box(b'dref', 0, 0, struct.pack('>I', 1), full_box(b'url ', 0, 1))),
+        stbl,
+    )
+    mdia = box(
+        b'mdia',
+        full_box(b'mdhd', 0, 0, struct.pack('>IIIIHH', 0, 0, 90000, 0, 0x55c4, 0)),
+        full_box(b'hdlr', 0, 0, bytes(4), b'vide', bytes(12), b'video\0'),
+        minf,
+    )
+    tkhd = full_box(b'tkhd', 0, 3, struct.pack('>III', 0, 0, 1), bytes(4 + 4 + 8 + 8 + 36), struct.pack('>II', 1920 << 16, 1080 << 16))
+    mvhd = full_box(b'mvhd', 0, 0, struct.pack('>IIII', 0, 0, 90000, 0), struct.pack('>IH', 0x10000, 0x100), bytes(10 + 36 + 24), struct.pack('>I', 2))
+    mvex = box(b'mvex', full_box(b'trex', 0, 0, struct.pack('>5I', 1, 1, 0, default_sample_size, 0)))
+    return box(b'ftyp', b'iso6', struct.pack('>I', 0), b'iso6dash') + box(b'moov', mvhd, box(b'trak', tkhd, mdia), mvex)
+
+
+def encrypt_cbc_blocks(content: bytes, iv: bytes, crypt: int, skip: int) -> bytes:
+    """按照crypt:skip的模式逐块加密完整块, 不足16字节的部分保持明文"""
+    ecb = AES.new(KEY, AES.MODE_ECB)
+    out = bytearray(content)
+    previous = iv
+    for block, p in enumerate(range(0, len(content) // 16 * 16, 16)):
+        # 0:0表示所有完整块都加密
+        if not crypt + skip or block % (crypt + skip) < crypt:
+            value = int.from_bytes(content[p:p + 16]) ^ int.from_bytes(previous)
+            previous = ecb.encrypt(value.to_bytes(16))
+            out[p:p + 16] = previous
+    return bytes(out)
+
+
+def encrypt_sample(sample: bytes, subsamples: list | None, scheme: str, iv: bytes, crypt: int = 0, skip: int = 0) -> bytes:
+    """
+    加密样本
+    :param sample:
+    :param subsamples: [(明文长度, 密文长度)], None表示整个样本加密
+    :param scheme: cenc时所有加密部分使用连续的密钥流, cbcs时每个子样本从IV重新开始
+    :param iv:
+    :param crypt:
+    :param skip:
+    :return:
+    """
+    ranges = []
+    p = 0
+    for clear, protected in subsamples if subsamples is not None else [(0, len(sample))]:
+        ranges.append((p + clear, protected))
+        p += clear + protected
+    out = bytearray(sample)
+    if scheme == 'cenc':
+        cipher = AES.new(KEY, AES.MODE_CTR, nonce=b'', initial_value=iv.ljust(16, b'\0'))
+        for start, length in ranges:
+            out[start:start + length] = cipher.encrypt(sample[start:start + length])
+    else:
+        for start, length in ranges:
+            out[start:start + length] = encrypt_cbc_blocks(sample[start:start + length], iv, crypt, skip)
+    return bytes(out)
+
+
+def build_segment(
+        samples: list[bytes],
+        subsamples: list | None = None,
+        scheme: str = 'cenc',
+        crypt: int = 0,
+        skip: int = 0,
+        constant_iv: bytes = b'',
+        iv_size: int = 8,
+        info: str = 'senc',
+        sequence: int = 1,
+) -> bytes:
+    """
+    加密切片
+    :param samples: 明文样本
+    :param subsamples: 每个样本的子样本, None表示整个样本加密; 加密和写入的都是这里的子样本
+    :param scheme:
+    :param crypt:
+    :param skip:
+    :param constant_iv:
+    :param iv_size:
+    :param info: 样本加密信息的格式, senc、piff(uuid)或者saio(saiz/saio指向moof之后的数据)
+    :param sequence:
+    :return:
+    """
+    ivs = [b'' if constant_iv else (sequence * 100000 + i).to_bytes(iv_size) for i in range(len(samples))]
+    maps = subsamples if subsamples is not None else [None] * len(samples)
+    encrypted = [encrypt_sample(s, m, scheme, iv or constant_iv, crypt, skip) for s, m, iv in zip(samples, maps, ivs)]
+    entries = []
+    for iv, m in zip(ivs, maps):
+        entry = iv
+        if subsamples is not None:
+            entry += struct.pack('>H', len(m)) + b''.join(struct.pack('>HI', clear, protected) for clear, protected in m)
+        entries.append(entry)
+    flags = 0x02 if subsamples is not None else 0
+    aux = b''
+    if info == 'senc':
+        boxes = [full_box(b'senc', 0, flags, struct.pack('>I', len(samples)), *entries)]
+    elif info == 'piff':
+        boxes = [box(b'uuid', PIFF_SENC, struct.pack('>II', flags, len(samples)), *entries)]
+    else:
+        aux = b''.join(entries)
+
+    def moof(aux_offset: int, data_offset: int) -> bytes:
+        trun = full_box(b'trun', 0, 0x201, struct.pack('>Ii', len(samples), data_offset), *[struct.pack('>I', len(s)) for s in samples])
+        if info == 'saio':
+            infos = [
+                full_box(b'saiz', 0, 0, bytes([0]), struct.pack('>I', len(samples)), bytes(len(e) for e in entries)),
+                full_box(b'saio', 0, 0, struct.pack('>II', 1, aux_offset)),
+            ]
+        else:
+            infos = boxes
+        traf = box(
+            b'traf',
+            full_box(b'tfhd', 0, 0x020000, struct.pack('>I', 1)),
+            full_box(b'tfdt', 1, 0, struct.pack('>Q', sequence * 90000)),
+            trun,
+            *infos,
+        )
+        return box(b'moof', full_box(b'mfhd', 0, 0, struct.pack('>I', sequence)), traf)
+
+    size = len(moof(0, 0))
+    # saiz/saio的辅助信息放在moof和mdat之间的free中, 偏移相对于moof的开头
+    free = box(b'free', aux) if aux else b''
+    return moof(size + 8, size + len(free) + 8) + free + box(b'mdat', *encrypted)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 09:10
+# @Version     : Python 3.14.0
+"""asyncio下载引擎的请求重试、SSL参数和导入开销"""
+import asyncio
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from vodd.core.exceptions import HTTPStatusCodeError
+from vodd.utils.concurrency import AdaptiveController
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from vodd.async_downloader import AsyncEngine  # noqa: E402
+
+
+class SSLFailingSession(object):
+    """每次请求都抛出证书错误, 记录传入的ssl参数"""
+
+    def __init__(self):
+        self.ssl = []
+
+    async def get(self, url: str, ssl=None, **kwargs):
+        self.ssl.append(ssl)
+        key = SimpleNamespace(host='cdn.example.com', port=443, ssl=ssl)
+        raise aiohttp.ClientSSLError(key, OSError('certificate verify failed'))
+
+
+def make_engine(**request_kwargs) -> AsyncEngine:
+    downloader = SimpleNamespace(
+        async_concurrency=1,
+        max_download_times=2,
+        request_kwargs={'headers': {}, **request_kwargs},
+        controller=AdaptiveController(4, enabled=True),
+    )
+    return AsyncEngine(downloader)
+
+
+def test_ssl_errors_are_recorded():
+    engine = make_engine()
+    session = SSLFailingSession()
+    with pytest.raises(HTTPStatusCodeError):
+        asyncio.run(engine.requester(aiohttp, session, 'https://cdn.example.com/0.ts', {}))
+    # 第一次校验证书, 出错后不再校验
+    assert session.ssl == [True, False]
+    assert (engine.downloader.controller.requests, engine.downloader.controller.errors) == (2, 2)
+
+
+def test_ssl_option():
+    assert make_engine().ssl_option() is True
+    assert make_engine(verify=False).ssl_option() is False
+
+
+def test_import_is_lazy():
+    # 导入引擎不应该导入pydantic模型
+    code = 'import sys, vodd.async_downloader; print("vodd.core.models" in sys.modules)'
+    assert subprocess.check_output([sys.executable, '-c', code], text=True).strip() == 'False'
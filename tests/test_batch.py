@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 14:00
+# @Version     : Python 3.14.0
+"""批量下载共享的连接池、密钥、并发额度和解密进程池"""
+import json
+import threading
+
+import pytest
+
+from vodd import batch
+from vodd.plugins.hls import HLS
+
+
+@pytest.fixture
+def context():
+    context = batch.SharedContext(max_workers=1, pool_size=8, limit_rate=10, decrypt_processes=2)
+    yield context
+    context.close()
+
+
+def test_shared_resources(make_downloader, context):
+    first = make_downloader(context=context)
+    second = make_downloader(context=context)
+    assert first.session is second.session is context.session
+    assert first.connections is second.connections is context.connections
+    assert first.limiter.parent is second.limiter.parent is context.limiter
+    assert first.decrypt_stage.shared is context.decrypt_pool
+    assert first.decrypt_stage.processes == 2
+    assert context.session.get_adapter('https://cdn.example.com/')._pool_maxsize == 8
+    # 已获取的密钥在任务之间复用
+    HLS(downloader=first).keys['https://cdn.example.com/key'] = b'0' * 16
+    assert HLS(downloader=second).keys == {'https://cdn.example.com/key': b'0' * 16}
+
+
+def test_budget(make_downloader, context):
+    first = make_downloader(context=context)
+    second = make_downloader(context=context, priority=1)
+    entered = threading.Event()
+
+    def worker():
+        with second.budget:
+            entered.set()
+
+    with first.budget:
+        thread = threading.Thread(target=worker)
+        thread.start()
+        # 所有任务同时只能下载一个切片
+        assert not entered.wait(0.2)
+    thread.join(5)
+    assert entered.is_set()
+    assert context.budget.active == 0
+
+
+def test_close(context):
+    pool = context.decrypt_pool.get()
+    assert context.decrypt_pool.get() is pool
+    assert pool.submit(sum, [1, 2]).result() == 3
+    context.close()
+    assert context.decrypt_pool._pool is None
+    with pytest.raises(RuntimeError):
+        pool.submit(sum, [1, 2])
+
+
+def test_run_job_errors(context):
+    # 缺少链接
+    result = batch.run_job(context, ['-o', 'a.mp4'])
+    assert result['error']['message'] == 'Exception'
+    assert result['save_path'] == ''
+    # argparse的参数错误不会结束整个批量任务
+    result = batch.run_job(context, ['-o', 'a.mp4', '--url', 'http://127.0.0.1/a.m3u8', '-r', 'x'])
+    assert result == {'error': {'message': 'Exception', 'reason': '2'}, 'save_path': ''}
+
+
+def test_main(tmp_path, monkeypatch):
+    jobs = [['-o', f'{i}.mp4', '--url', f'http://127.0.0.1/{i}.m3u8'] for i in range(3)]
+    (jobs_path := tmp_path / 'jobs.jsonl').write_text(
+        '\n'.join(json.dumps(job) for job in jobs) + '\n\n', encoding='utf-8'
+    )
+    contexts = set()
+
+    def run_job(context, argv, **extra):
+        contexts.add(id(context))
+        save_path = argv[1]
+        return {'error': {'message': 'failed'} if save_path == '1.mp4' else {}, 'save_path': save_path}
+
+    monkeypatch.setattr(batch, 'run_job', run_job)
+    results_path = tmp_path / 'results.jsonl'
+    with pytest.raises(SystemExit) as e:
+        batch.main(['-i', jobs_path.as_posix(), '-o', results_path.as_posix(), '--jobs', '2'])
+    assert e.value.code == 1
+    assert len(contexts) == 1
+    results = [json.loads(line) for line in results_path.read_text(encoding='utf-8').splitlines()]
+    assert sorted(r['save_path'] for r in results) == ['0.mp4', '1.mp4', '2.mp4']
+    assert [r['save_path'] for r in results if r['error']] == ['1.mp4']
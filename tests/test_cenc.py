@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 00:30
+# @Version     : Python 3.14.0
+"""fMP4通用加密的进程内解密: tenc/senc/saiz/saio的解析、子样本和cbcs模式"""
+import os
+
+import pytest
+
+from fmp4 import KEY, KID, build_init, build_segment
+from vodd.core.exceptions import DRMDecryptionError, UnsupportedError
+from vodd.utils.cenc import decrypt_cenc_file, decrypt_segment, find_box, iter_boxes, parse_init, parse_keys
+
+KEYS = {KID: KEY}
+# 多个子样本, 包括没有加密部分的子样本、不足16字节的加密部分和只有明文的样本
+SUBSAMPLES = [
+    [(5, 1000)],
+    [(5, 100), (20, 333), (0, 64)],
+    [(3, 0), (7, 15)],
+    [(50, 0)],
+    [(0, 2000)],
+]
+SAMPLES = [os.urandom(sum(c + p for c, p in m)) for m in SUBSAMPLES]
+# 加密方式: (scheme, crypt, skip, constant_iv, iv_size)
+SCHEMES = {
+    'cenc': ('cenc', 0, 0, b'', 8),
+    'cenc-iv16': ('cenc', 0, 0, b'', 16),
+    'cbcs-1:9': ('cbcs', 1, 9, bytes(range(16)), 0),
+    'cbcs-0:0': ('cbcs', 0, 0, b'', 16),
+}
+
+
+def mdat(data) -> bytes:
+    _, offset, header, size = find_box(data, (b'mdat',))
+    return bytes(data[offset + header:offset + size])
+
+
+def traf_boxes(data) -> list[bytes]:
+    _, offset, header, size = find_box(data, (b'moof', b'traf'))
+    return [box_type for box_type, *_ in iter_boxes(data, offset + header, offset + size)]
+
+
+def test_parse_keys():
+    keys = parse_keys(f' {KID.hex()}:{KEY.hex()},\n01234567-89ab-cdef-0123-456789abcdee:{KEY.hex()} ')
+    assert keys == {KID: KEY, bytes.fromhex('0123456789abcdef0123456789abcdee'): KEY}
+
+
+def test_parse_init_cenc():
+    tracks = parse_init(build_init('cenc', default_sample_size=512))
+    track = tracks[1]
+    assert (track.scheme, track.original_format, track.is_protected) == ('cenc', 'avc1', True)
+    assert (track.iv_size, track.kid, track.constant_iv) == (8, KID, b'')
+    assert (track.crypt_byte_block, track.skip_byte_block) == (0, 0)
+    assert track.default_sample_size == 512
+
+
+def test_parse_init_cbcs_pattern():
+    track = parse_init(build_init('cbcs', 1, 9, bytes(range(16))))[1]
+    assert (track.scheme, track.crypt_byte_block, track.skip_byte_block) == ('cbcs', 1, 9)
+    assert (track.iv_size, track.constant_iv) == (0, bytes(range(16)))
+
+
+def test_parse_init_clear_track():
+    assert parse_init(build_init(encrypted=False)) == {}
+
+
+def test_parse_init_without_moov():
+    with pytest.raises(DRMDecryptionError):
+        parse_init(b'\x00\x00\x00\x08free')
+
+
+@pytest.mark.parametrize('info', ['senc', 'piff', 'saio'])
+@pytest.mark.parametrize('name', list(SCHEMES))
+def test_decrypt_subsamples(name, info):
+    scheme, crypt, skip, constant_iv, iv_size = SCHEMES[name]
+    tracks = parse_init(build_init(scheme, crypt, skip, constant_iv, iv_size))
+    data = bytearray(build_segment(SAMPLES, SUBSAMPLES, scheme, crypt, skip, constant_iv, iv_size, info))
+    size = len(data)
+    assert mdat(data) != b''.join(SAMPLES)
+    # 只有明文的样本不计入
+    assert decrypt_segment(data, tracks, KEYS) == len(SAMPLES) - 1
+    assert mdat(data) == b''.join(SAMPLES)
+    # 样本加密信息改为free, 不改变其他box的偏移
+    assert len(data) == size
+    assert traf_boxes(data) == [b'tfhd', b'tfdt', b'trun', *[b'free'] * (2 if info == 'saio' else 1)]
+
+
+@pytest.mark.parametrize('name', list(SCHEMES))
+def test_decrypt_full_samples(name):
+    scheme, crypt, skip, constant_iv, iv_size = SCHEMES[name]
+    samples = [os.urandom(size) for size in (16, 100, 4096, 7)]
+    tracks = parse_init(build_init(scheme, crypt, skip, constant_iv, iv_size))
+    data = bytearray(build_segment(samples, None, scheme, crypt, skip, constant_iv, iv_size))
+    assert decrypt_segment(data, tracks, KEYS) == len(samples)
+    assert mdat(data) == b''.join(samples)
+
+
+def test_cbcs_pattern_skips_blocks():
+    # 1:9模式只加密每10个块中的第1个, 其余块保持明文
+    sample = os.urandom(16 * 25)
+    data = build_segment([sample], [[(0, len(sample))]], 'cbcs', 1, 9, bytes(16), 0)
+    encrypted = mdat(data)
+    for block in range(25):
+        p = block * 16
+        assert (encrypted[p:p + 16] == sample[p:p + 16]) == (block % 10 != 0)
+
+
+def test_clear_track_is_not_decrypted():
+    data = bytearray(build_segment(SAMPLES, SUBSAMPLES))
+    assert decrypt_segment(data, parse_init(build_init(encrypted=False)), KEYS) == 0
+
+
+def test_missing_key():
+    data = bytearray(build_segment(SAMPLES, SUBSAMPLES))
+    with pytest.raises(DRMDecryptionError):
+        decrypt_segment(data, parse_init(build_init()), {bytes(16): KEY})
+
+
+def test_subsample_size_mismatch():
+    subsamples = [[(clear + 1, protected) for clear, protected in m] for m in SUBSAMPLES]
+    data = bytearray(build_segment(SAMPLES, subsamples))
+    with pytest.raises(DRMDecryptionError):
+        decrypt_segment(data, parse_init(build_init()), KEYS)
+
+
+def test_sample_count_mismatch():
+    data = bytearray(build_segment(SAMPLES, SUBSAMPLES))
+    _, offset, header, _ = find_box(data, (b'moof', b'traf', b'senc'))
+    data[offset + header + 4:offset + header + 8] = (len(SAMPLES) - 1).to_bytes(4)
+    with pytest.raises(DRMDecryptionError):
+        decrypt_segment(data, parse_init(build_init()), KEYS)
+
+
+def test_unsupported_scheme():
+    data = bytearray(build_segment(SAMPLES, SUBSAMPLES))
+    with pytest.raises(UnsupportedError):
+        decrypt_segment(data, parse_init(build_init('cens')), KEYS)
+
+
+def test_decrypt_cenc_file(tmp_path):
+    (init := tmp_path / 'init.mp4').write_bytes(build_init('cbcs', 1, 9, bytes(16)))
+    (encrypted := tmp_path / '1.m4s').write_bytes(build_segment(SAMPLES, SUBSAMPLES, 'cbcs', 1, 9, bytes(16)))
+    key = f'{KID.hex()}:{KEY.hex()}'
+    decrypted = tmp_path / '1_dec.m4s'
+    assert decrypt_cenc_file(str(encrypted), str(decrypted), key, str(init)) == len(SAMPLES) - 1
+    assert mdat(decrypted.read_bytes()) == b''.join(SAMPLES)
+    # 切片自带moov时不需要元数据文件
+    encrypted.write_bytes(init.read_bytes() + build_segment(SAMPLES, SUBSAMPLES, 'cbcs', 1, 9, bytes(16)))
+    assert decrypt_cenc_file(str(encrypted), str(decrypted), key, '') == len(SAMPLES) - 1
+
+
+class FakeDecrypter(object):
+    """替换DRM.decrypter, 记录是否使用了external解密"""
+
+    def __init__(self, succeed: bool = True):
+        self.succeed = succeed
+        self.calls = []
+
+    def decrypting_file(self, encrypt_file: str, decrypt_file: str, key: str, init_file: str):
+        self.calls.append(encrypt_file)
+        if self.succeed:
+            with open(decrypt_file, 'wb') as f:
+                f.write(b'external')
+
+    def has_decrypted(self, encrypt_file: str, decrypt_file: str) -> bool:
+        return self.succeed
+
+
+@pytest.fixture
+def dash(monkeypatch):
+    dash = pytest.importorskip('vodd.plugins.dash')
+    monkeypatch.setattr(dash, 'decrypter', FakeDecrypter())
+    return dash
+
+
+def write_files(tmp_path, encrypted: bool = True) -> tuple[str, str, str, str]:
+    (init := tmp_path / 'init.mp4').write_bytes(build_init(encrypted=encrypted))
+    (encrypt_file := tmp_path / '1.m4s').write_bytes(build_segment(SAMPLES, SUBSAMPLES))
+    return str(encrypt_file), str(tmp_path / '1_dec.m4s'), f'{KID.hex()}:{KEY.hex()}', str(init)
+
+
+def test_drm_native(dash, tmp_path):
+    encrypt_file, decrypt_file, key, init = write_files(tmp_path)
+    assert dash.decrypt_drm_file(encrypt_file, decrypt_file, key, init, engine='native') == decrypt_file
+    assert mdat(open(decrypt_file, 'rb').read()) == b''.join(SAMPLES)
+    assert dash.decrypter.calls == []
+    assert not os.path.exists(encrypt_file)
+
+
+def test_drm_native_without_samples_falls_back(dash, tmp_path):
+    # 元数据中没有encv时进程内没有解密任何样本, 使用external解密
+    encrypt_file, decrypt_file, key, init = write_files(tmp_path, encrypted=False)
+    dash.decrypt_drm_file(encrypt_file, decrypt_file, key, init, engine='native')
+    assert dash.decrypter.calls == [encrypt_file]
+    assert open(decrypt_file, 'rb').read() == b'external'
+
+
+def test_drm_native_default(dash, tmp_path):
+    encrypt_file, decrypt_file, key, init = write_files(tmp_path)
+    assert dash.decrypt_drm_file(encrypt_file, decrypt_file, key, init) == decrypt_file
+    assert mdat(open(decrypt_file, 'rb').read()) == b''.join(SAMPLES)
+    assert dash.decrypter.calls == []
+
+
+def test_drm_native_failure_falls_back(dash, tmp_path):
+    # 没有KID对应的密钥时进程内解密失败, 使用external解密
+    encrypt_file, decrypt_file, _, init = write_files(tmp_path)
+    key = f'{bytes(16).hex()}:{KEY.hex()}'
+    assert dash.decrypt_drm_file(encrypt_file, decrypt_file, key, init) == decrypt_file
+    assert dash.decrypter.calls == [encrypt_file]
+    assert open(decrypt_file, 'rb').read() == b'external'
+    assert not os.path.exists(encrypt_file)
+
+
+def test_drm_native_and_external_failure(dash, tmp_path):
+    dash.decrypter.succeed = False
+    encrypt_file, decrypt_file, _, init = write_files(tmp_path)
+    with pytest.raises(DRMDecryptionError):
+        dash.decrypt_drm_file(encrypt_file, decrypt_file, f'{bytes(16).hex()}:{KEY.hex()}', init)
+    assert dash.decrypter.calls == [encrypt_file]
+    assert not os.path.exists(decrypt_file)
+    assert not os.path.exists(encrypt_file)
+
+
+def test_drm_external_failure(dash, tmp_path):
+    dash.decrypter.succeed = False
+    encrypt_file, decrypt_file, key, init = write_files(tmp_path)
+    with pytest.raises(DRMDecryptionError):
+        dash.decrypt_drm_file(encrypt_file, decrypt_file, key, init, engine='external')
+    assert not os.path.exists(decrypt_file)
+    assert not os.path.exists(encrypt_file)
+
+
+def test_drm_decrypter_default():
+    from vodd.main import parse_args
+    assert parse_args(['-o', 'a.mp4', '--url', 'http://127.0.0.1/a.mpd'])['drm_decrypter'] == 'native'
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 23:50
+# @Version     : Python 3.14.0
+"""AIMD并发控制器和共享并发额度"""
+import threading
+import time
+
+from vodd.utils.concurrency import AdaptiveController, PriorityBudget
+
+
+def make_controller(**kwargs) -> AdaptiveController:
+    options = {'initial': 4, 'min_workers': 1, 'max_workers': 8, 'interval': 0, 'enabled': True}
+    return AdaptiveController(**{**options, **kwargs})
+
+
+def test_disabled():
+    controller = make_controller(enabled=False)
+    controller.record(429, 0.1)
+    assert controller.adjust(1000) is None
+    assert controller.limit == 4
+    with controller:
+        assert controller.active == 0
+
+
+def test_additive_increase():
+    controller = make_controller()
+    controller.active = controller.limit
+    controller.record(200, 0.1)
+    assert controller.adjust(1000) is not None
+    assert controller.limit == 5
+
+
+def test_no_increase_when_idle():
+    # 并发没有用满时不增加
+    controller = make_controller()
+    controller.record(200, 0.1)
+    assert controller.adjust(1000) is None
+    assert controller.limit == 4
+
+
+def test_multiplicative_decrease_on_throttle():
+    controller = make_controller(initial=8)
+    controller.record(429, 0.1)
+    assert controller.adjust(1000) is not None
+    assert controller.limit == 4
+    controller.record(503, 0.1)
+    controller.adjust(2000)
+    controller.record(None, 0.1)
+    controller.adjust(3000)
+    assert controller.limit == 1
+
+
+def test_error_ratio():
+    controller = make_controller(initial=8, error_ratio=0.5)
+    controller.record(200, 0.1)
+    controller.record(500, 0.1)
+    # 错误比例没有超过阈值
+    controller.adjust(1000)
+    assert controller.limit == 8
+    controller.record(500, 0.1)
+    controller.adjust(2000)
+    assert controller.limit == 4
+
+
+def test_latency_rise():
+    controller = make_controller()
+    controller.record(200, 0.1)
+    controller.adjust(10 ** 9)
+    controller.record(200, 1.0)
+    assert controller.adjust(10 ** 9) is not None
+    assert controller.limit == 3
+
+
+def test_limit_blocks_workers():
+    controller = make_controller(initial=1)
+    entered = threading.Event()
+
+    def worker():
+        with controller:
+            entered.set()
+
+    with controller:
+        thread = threading.Thread(target=worker)
+        thread.start()
+        assert not entered.wait(0.1)
+    assert entered.wait(1)
+    thread.join()
+    assert controller.active == 0
+
+
+def test_budget_unlimited():
+    budget = PriorityBudget(0)
+    for _ in range(100):
+        budget.acquire()
+    assert budget.active == 0
+
+
+def test_budget_priority_order():
+    budget = PriorityBudget(1)
+    order = []
+
+    def worker(name: str, priority: int):
+        with budget.slot(priority):
+            order.append(name)
+
+    budget.acquire()
+    threads = []
+    for name, priority in (('low', 0), ('high', 5), ('middle', 1)):
+        threads.append(thread := threading.Thread(target=worker, args=(name, priority)))
+        thread.start()
+        # 保证等待顺序
+        time.sleep(0.05)
+    budget.release()
+    for thread in threads:
+        thread.join(1)
+    assert order == ['high', 'middle', 'low']
+    assert budget.active == 0
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 10:00
+# @Version     : Python 3.14.0
+"""按域名的连接池大小、并发上限和连接复用统计"""
+import threading
+
+import requests
+
+from vodd.utils.connection import ConnectionManager
+
+
+def test_pool_sizes():
+    session = requests.Session()
+    manager = ConnectionManager(session, pool_size=32, host_pool_sizes={'cdn.example.com': 4})
+    assert session.get_adapter('https://other.example.com/a.ts')._pool_maxsize == 32
+    assert session.get_adapter('http://cdn.example.com/a.ts')._pool_maxsize == 4
+    assert session.get_adapter('https://cdn.example.com/a.ts')._pool_maxsize == 4
+    assert manager.get_pool_size('cdn.example.com') == 4
+    assert manager.get_pool_size('other.example.com') == 32
+
+
+def test_host_limit():
+    manager = ConnectionManager(requests.Session(), host_limits={'cdn.example.com': 1, 'zero.example.com': 0})
+    entered = threading.Event()
+
+    def worker():
+        with manager.limit('http://cdn.example.com/1.ts'):
+            entered.set()
+
+    with manager.limit('http://cdn.example.com/0.ts'):
+        # 其他域名和上限为0的域名不受限制
+        with manager.limit('http://other.example.com/0.ts'), manager.limit('http://zero.example.com/0.ts'):
+            pass
+        thread = threading.Thread(target=worker)
+        thread.start()
+        assert not entered.wait(0.1)
+    assert entered.wait(1)
+    thread.join()
+
+
+def test_reuse_stats(file_server):
+    file_server.files['/0.ts'] = b'x' * 100
+    manager = ConnectionManager(requests.Session(), pool_size=2)
+    for _ in range(5):
+        assert manager.session.get(file_server.url('/0.ts')).content == b'x' * 100
+    host = f'127.0.0.1:{file_server.server.server_address[1]}'
+    assert manager.stats()[host] == {'connections': 1, 'requests': 5, 'reused': 4}
+
+
+def test_prewarm(file_server):
+    file_server.files['/0.ts'] = b'x'
+    manager = ConnectionManager(requests.Session(), pool_size=4, host_limits={})
+    url = file_server.url('/0.ts')
+    manager.prewarm([url, url], {'timeout': 5}, connections=3)
+    # 每个域名最多建立connections个连接
+    assert [r[0] for r in file_server.requests] == ['HEAD'] * 3
+    host = f'127.0.0.1:{file_server.server.server_address[1]}'
+    assert manager.stats()[host]['requests'] == 3
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 14:30
+# @Version     : Python 3.14.0
+"""下载服务的令牌校验、请求体类型、参数白名单和输出文件夹限制"""
+import json
+import os
+import stat
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from vodd.daemon import DaemonServer, Job, check_remote_argv, load_token, resolve_save_path
+
+TOKEN = 'secret-token'
+
+
+class RecordingManager(object):
+    """只记录提交的参数, 不执行下载"""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def submit(self, argv: list, priority: int = 0) -> Job:
+        job = Job(argv, priority)
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    manager = RecordingManager()
+    server = DaemonServer(manager, TOKEN, port=0, output_root=tmp_path / 'output')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    deadline = time.monotonic() + 5
+    while server._server is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    server.url = f'http://127.0.0.1:{server._server.server_address[1]}'
+    yield server
+    server.shutdown()
+
+
+def request(server, method: str, path: str, data=None, token: str = TOKEN, content_type: str = 'application/json'):
+    headers = {'Content-Type': content_type}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    body = None if data is None else json.dumps(data).encode('utf-8')
+    req = urllib.request.Request(f'{server.url}{path}', body, headers, method=method)
+    try:
+        with urllib.request.urlopen(req) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.mark.parametrize('argv', [
+    ['-o', 'a.mp4', '--url', 'http://127.0.0.1/a.m3u8', '--threads', '8', '--drm-decrypter', 'native'],
+    ['-o=a.mp4', '--url=http://127.0.0.1/a.m3u8', '--height', '1080,720', '--bandwidth=1.5'],
+])
+def test_allowed_argv(argv):
+    check_remote_argv(argv)
+
+
+@pytest.mark.parametrize('argv', [
+    ['-c', '/etc/passwd'],
+    ['--drm-request', 'x'],
+    ['--thread', '8'],
+    ['-o/etc/a.mp4'],
+    ['--height', '__import__("os")'],
+    ['--framerate=[x for x in ()]'],
+])
+def test_rejected_argv(argv):
+    with pytest.raises(ValueError):
+        check_remote_argv(argv)
+
+
+def test_resolve_save_path(tmp_path):
+    root = tmp_path / 'output'
+    root.mkdir()
+    assert resolve_save_path(['-o', 'a/b.mp4', '--url', 'x'], root) == ['-o', (root / 'a/b.mp4').as_posix(), '--url', 'x']
+    assert resolve_save_path(['-o=b.mp4'], root) == [f'-o={(root / "b.mp4").as_posix()}']
+    assert resolve_save_path(['-o', 'a/../c.mp4'], root) == ['-o', (root / 'c.mp4').as_posix()]
+
+
+@pytest.mark.parametrize('save_path', ['../a.mp4', '/etc/a.mp4', '.', 'link/a.mp4'])
+def test_save_path_outside(tmp_path, save_path):
+    root = tmp_path / 'output'
+    root.mkdir()
+    (root / 'link').symlink_to(tmp_path)
+    with pytest.raises(ValueError):
+        resolve_save_path(['-o', save_path], root)
+    with pytest.raises(ValueError):
+        resolve_save_path([f'-o={save_path}'], root)
+
+
+def test_load_token(tmp_path):
+    assert load_token('given', tmp_path / 'token') == 'given'
+    assert not (tmp_path / 'token').exists()
+    token = load_token('', path := tmp_path / 'token')
+    assert path.read_text(encoding='utf-8') == token
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert load_token('', path) != token
+
+
+def test_authorization(daemon):
+    assert request(daemon, 'GET', '/jobs', token='')[0] == 401
+    assert request(daemon, 'GET', '/jobs', token='wrong')[0] == 401
+    assert request(daemon, 'POST', '/jobs', {'argv': ['-o', 'a.mp4', '--url', 'x']}, token='wrong')[0] == 401
+    assert not daemon.manager.jobs
+    assert request(daemon, 'GET', '/jobs/missing')[0] == 404
+
+
+def test_content_type(daemon):
+    status, _ = request(daemon, 'POST', '/jobs', {'argv': ['-o', 'a.mp4', '--url', 'x']}, content_type='text/plain')
+    assert status == 415
+    assert not daemon.manager.jobs
+
+
+def test_submit(daemon, tmp_path):
+    status, data = request(daemon, 'POST', '/jobs', {'argv': ['-o', 'a.mp4', '--url', 'x'], 'priority': 2})
+    assert status == 201
+    job = daemon.manager.get(data['id'])
+    assert job.argv == ['-o', (tmp_path / 'output' / 'a.mp4').resolve().as_posix(), '--url', 'x']
+    assert job.priority == 2
+    assert request(daemon, 'GET', f'/jobs/{job.id}')[1]['status'] == 'queued'
+    assert request(daemon, 'GET', f'/jobs/{job.id}/result')[0] == 409
+
+
+@pytest.mark.parametrize('argv', [
+    ['-o', '../a.mp4', '--url', 'x'],
+    ['-o', '/tmp/a.mp4', '--url', 'x'],
+    ['-c', 'config.json'],
+    ['--drm-request', '{"function": "x"}'],
+    'not a list',
+])
+def test_submit_rejected(daemon, argv):
+    status, data = request(daemon, 'POST', '/jobs', {'argv': argv})
+    assert status == 400
+    assert data['error']
+    assert not daemon.manager.jobs
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 10:40
+# @Version     : Python 3.14.0
+"""零拷贝文件拼接, 每种方式不可用时换下一种方式"""
+import os
+
+import pytest
+
+from vodd.utils.file_copy import COPIERS, append_file, open_for_append, pipe_file
+
+
+@pytest.mark.parametrize('method', list(COPIERS))
+def test_append(tmp_path, method):
+    parts = [os.urandom(size) for size in (4096, 1, 70000, 0, 12345)]
+    target = tmp_path / 'track.mp4'
+    used = set()
+    with open_for_append(target) as f:
+        for i, part in enumerate(parts):
+            (src := tmp_path / f'{i}.m4s').write_bytes(part)
+            used.add(append_file(src, f, 1024, methods=(method, 'python')))
+    assert target.read_bytes() == b''.join(parts)
+    # 当前系统不支持时换成分块读写
+    assert used <= {method, 'python', 'empty'}
+
+
+def test_open_for_append(tmp_path):
+    target = tmp_path / 'track.mp4'
+    with open_for_append(target) as f:
+        f.write(b'INIT')
+    (src := tmp_path / '0.m4s').write_bytes(b'<0>')
+    with open_for_append(target) as f:
+        assert f.tell() == 4
+        append_file(src, f)
+    assert target.read_bytes() == b'INIT<0>'
+
+
+def test_no_method(tmp_path):
+    (src := tmp_path / '0.m4s').write_bytes(b'<0>')
+    with open_for_append(tmp_path / 'track.mp4') as f:
+        with pytest.raises(OSError):
+            append_file(src, f, methods=())
+
+
+@pytest.mark.skipif(not hasattr(os, 'pipe'), reason='需要管道')
+def test_pipe_file(tmp_path):
+    (src := tmp_path / '0.m4s').write_bytes(content := os.urandom(30000))
+    r, w = os.pipe()
+    with os.fdopen(r, 'rb') as reader, os.fdopen(w, 'wb') as writer:
+        # 管道缓冲区足够大, 不需要另外的线程读取
+        pipe_file(src, writer, 1024)
+        writer.close()
+        assert reader.read() == content
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 23:30
+# @Version     : Python 3.14.0
+"""断点续传日志的写入、读取和校验"""
+from pathlib import Path
+
+from vodd.core.models import Segment
+from vodd.utils.journal import Journal
+
+URL = 'http://127.0.0.1/index.m3u8'
+
+
+def make_segment(temp_dir: Path, index: int) -> Segment:
+    return Segment(type='video', group_no=0, index=index, url=f'http://127.0.0.1/{index}.ts',
+                   filepath=temp_dir / f'{index}.ts', duration=4.0)
+
+
+def write_plan(journal: Journal, temp_dir: Path, count: int = 3, planned: bool = True) -> list[Segment]:
+    segments = [make_segment(temp_dir, i) for i in range(count)]
+    journal.write('header', url=URL)
+    for segment in segments:
+        journal.write('segment', data=segment.model_dump(exclude_none=True))
+    if planned:
+        journal.write('planned', count=count, chunked_mode=False)
+    return segments
+
+
+def test_round_trip(tmp_path):
+    journal = Journal(tmp_path, enabled=True)
+    segments = write_plan(journal, tmp_path)
+    journal.write('confirmed', name=segments[1].filepath.name, size=10, length=10)
+    journal.write('init', name='init.mp4', size=5)
+    journal.write('track', name='video.mp4', size=100, done=2)
+    journal.write('keys', data={'kid': b'\x01\x02'})
+    journal.close()
+
+    loaded = Journal(tmp_path, enabled=True)
+    assert loaded.load(URL)
+    assert [s.url for s in loaded.segments] == [s.url for s in segments]
+    assert loaded.segments[0].filepath == segments[0].filepath
+    assert loaded.planned['count'] == 3
+    assert set(loaded.confirmed) == {'1.ts'}
+    assert loaded.inits['init.mp4']['size'] == 5
+    assert loaded.tracks['video.mp4']['done'] == 2
+    # bytes通过十六进制往返
+    assert loaded.keys == {'kid': b'\x01\x02'}
+
+
+def test_disabled_does_nothing(tmp_path):
+    journal = Journal(tmp_path, enabled=False)
+    write_plan(journal, tmp_path)
+    assert not journal.path.exists()
+    assert not journal.load(URL)
+
+
+def test_url_mismatch(tmp_path):
+    journal = Journal(tmp_path, enabled=True)
+    write_plan(journal, tmp_path)
+    journal.close()
+    assert not Journal(tmp_path, enabled=True).load('http://127.0.0.1/other.m3u8')
+
+
+def test_incomplete_plan(tmp_path):
+    journal = Journal(tmp_path, enabled=True)
+    write_plan(journal, tmp_path, planned=False)
+    journal.close()
+    assert not Journal(tmp_path, enabled=True).load(URL)
+    # 计划的切片数量多于已写入的切片
+    journal = Journal(tmp_path, enabled=True)
+    journal.write('planned', count=4, chunked_mode=False)
+    journal.close()
+    assert not Journal(tmp_path, enabled=True).load(URL)
+
+
+def test_truncated_last_line(tmp_path):
+    journal = Journal(tmp_path, enabled=True)
+    segments = write_plan(journal, tmp_path)
+    journal.write('confirmed', name=segments[0].filepath.name, size=10, length=10)
+    journal.close()
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"kind": "confirmed", "name": "2.ts", "si')
+    loaded = Journal(tmp_path, enabled=True)
+    assert loaded.load(URL)
+    assert set(loaded.confirmed) == {'0.ts'}
+
+
+def test_split_headers(tmp_path):
+    journal = Journal(tmp_path, enabled=True)
+    segments = write_plan(journal, tmp_path)
+    journal.write('split', name=segments[2].filepath.name, headers={'Range': 'bytes=0-99'})
+    journal.close()
+    loaded = Journal(tmp_path, enabled=True)
+    assert loaded.load(URL)
+    assert loaded.segments[2].headers == {'Range': 'bytes=0-99'}
+    assert loaded.segments[0].headers == {}
+
+
+def test_is_complete(tmp_path):
+    journal = Journal(tmp_path, enabled=True)
+    path = tmp_path / '0.ts'
+    assert not journal.is_complete(path, {'size': 3})
+    path.write_bytes(b'abc')
+    assert journal.is_complete(path, {'size': 3})
+    assert not journal.is_complete(path, {'size': 4})
+    assert not journal.is_complete(path, None)
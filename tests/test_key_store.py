@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 15:30
+# @Version     : Python 3.14.0
+"""本机共享的DRM密钥缓存: 查询、有效期和多进程写入"""
+import os
+import stat
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from vodd.utils import key_store as module
+from vodd.utils.key_store import KeyStore
+
+KID = '0123456789ABCDEF0123456789ABCDEF'
+KEY = f'{KID.lower()}:00112233445566778899aabbccddeeff'
+PSSH = 'AAAAOHBzc2gAAAAA7e+LqXnWSs6jyCfc1R0h7QAAABgSEAEjRWeJq83vASNFZ4mrze8='
+
+
+def put_keys(path: str, start: int, count: int):
+    """在子进程中写入密钥"""
+    store = KeyStore(path)
+    for i in range(start, start + count):
+        store.put(f'{i:032x}:{i:032x}', kid=f'{i:032x}')
+
+
+def test_get_put(tmp_path):
+    store = KeyStore(tmp_path / 'keys' / 'drm_keys.json')
+    assert store.get(KID, PSSH) is None
+    store.put(KEY, kid=KID, pssh=PSSH)
+    # KID不区分大小写和连字符, 只有KID或者只有PSSH也可以查询
+    assert store.get(f'{KID[:8]}-{KID[8:12]}-{KID[12:16]}-{KID[16:20]}-{KID[20:]}') == KEY
+    assert store.get(KID.lower()) == KEY
+    assert store.get(pssh=PSSH) == KEY
+    assert store.get('f' * 32) is None
+    # 密钥只允许当前用户读取
+    assert stat.S_IMODE(os.stat(store.path).st_mode) == 0o600
+    assert sorted(p.name for p in store.path.parent.iterdir()) == ['drm_keys.json', 'drm_keys.json.lock']
+
+
+def test_ttl(tmp_path, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(module.time, 'time', lambda: now)
+    store = KeyStore(tmp_path / 'drm_keys.json', ttl=60)
+    store.put(KEY, kid=KID)
+    now += 59
+    assert store.get(KID) == KEY
+    now += 1
+    assert store.get(KID) is None
+    # 写入时清理过期的记录
+    store.put(KEY, kid='f' * 32)
+    assert list(store.read()) == [f"kid:{'f' * 32}"]
+
+
+def test_disabled(tmp_path):
+    store = KeyStore(tmp_path / 'drm_keys.json', ttl=0)
+    store.put(KEY, kid=KID)
+    assert not store.path.exists()
+    assert store.get(KID) is None
+
+
+def test_corrupted(tmp_path):
+    store = KeyStore(tmp_path / 'drm_keys.json')
+    store.path.write_text('{"kid:', encoding='utf-8')
+    assert store.get(KID) is None
+    store.put(KEY, kid=KID)
+    assert store.get(KID) == KEY
+
+
+def test_concurrent_threads(tmp_path):
+    path = (tmp_path / 'drm_keys.json').as_posix()
+    threads = [threading.Thread(target=put_keys, args=(path, i * 20, 20)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(KeyStore(path).read()) == 80
+
+
+def test_concurrent_processes(tmp_path):
+    # 多个进程同时写入时持有文件锁, 不会丢失记录
+    path = (tmp_path / 'drm_keys.json').as_posix()
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        for future in [executor.submit(put_keys, path, i * 25, 25) for i in range(4)]:
+            future.result()
+    store = KeyStore(path)
+    assert len(store.read()) == 100
+    assert store.get(f'{99:032x}') == f'{99:032x}:{99:032x}'
+    assert not list(tmp_path.glob('.*.tmp'))
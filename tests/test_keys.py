@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 16:00
+# @Version     : Python 3.14.0
+"""密钥Future: 同一个密钥只获取一次, 失败和空密钥不缓存"""
+import threading
+
+import pytest
+
+from vodd.core.exceptions import DRMDecryptionError, NotFoundError
+from vodd.core.models import Cipher, Segment
+from vodd.plugins.stream import Stream
+
+
+class Fetcher(object):
+    """按顺序返回结果或者抛出异常, 记录调用次数"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if isinstance(result := self.results.pop(0), BaseException):
+            raise result
+        return result
+
+
+@pytest.fixture
+def plugin(make_downloader):
+    return Stream(downloader=make_downloader())
+
+
+def test_resolve_once(plugin):
+    fetch = Fetcher(b'key')
+    assert plugin.resolve_key('a', fetch) == b'key'
+    assert plugin.resolve_key('a', fetch) == b'key'
+    assert fetch.calls == 1
+
+
+def test_failure_refetch(plugin):
+    fetch = Fetcher(ConnectionError('timeout'), b'key')
+    with pytest.raises(ConnectionError):
+        plugin.resolve_key('a', fetch)
+    assert 'a' not in plugin.key_futures
+    # 切片重试时重新获取
+    assert plugin.resolve_key('a', fetch) == b'key'
+    assert fetch.calls == 2
+
+
+@pytest.mark.parametrize('empty', [b'', '', None])
+def test_empty_key_not_cached(plugin, empty):
+    fetch = Fetcher(empty, b'key')
+    with pytest.raises(NotFoundError):
+        plugin.resolve_key('a', fetch)
+    assert 'a' not in plugin.key_futures
+    assert plugin.resolve_key('a', fetch) == b'key'
+    assert fetch.calls == 2
+
+
+def test_waiters_share_failure(plugin):
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise ConnectionError('timeout')
+
+    errors = []
+
+    def worker():
+        try:
+            plugin.resolve_key('a', fetch)
+        except ConnectionError as e:
+            errors.append(e)
+
+    owner = threading.Thread(target=worker)
+    owner.start()
+    assert started.wait(5)
+    waiters = [threading.Thread(target=worker) for _ in range(3)]
+    for t in waiters:
+        t.start()
+    release.set()
+    for t in [owner, *waiters]:
+        t.join(5)
+    # 等待中的线程收到同一个异常, 只请求了一次
+    assert len(calls) == 1
+    assert len(errors) == 4
+    assert 'a' not in plugin.key_futures
+
+
+def test_prefetch(plugin):
+    fetch = Fetcher(b'key')
+    plugin.prefetch_key('a', fetch)
+    plugin.prefetch_key('a', fetch)
+    assert plugin.resolve_key('a', Fetcher(b'other')) == b'key'
+    assert fetch.calls == 1
+    plugin.close()
+
+
+@pytest.fixture
+def dash(make_downloader, monkeypatch, tmp_path):
+    module = pytest.importorskip('vodd.plugins.dash')
+    d = make_downloader('--drm-key-store', (tmp_path / 'drm_keys.json').as_posix())
+    d.temp_dir.mkdir(parents=True, exist_ok=True)
+    plugin = module.DASH(downloader=d)
+    segment = Segment(
+        type='video', group_no=0, index=0, url='http://127.0.0.1/1.m4s', cipher=Cipher(name='widevine'),
+        init_url='http://127.0.0.1/init.mp4',
+    )
+    d.core.add_segment_path(segment)
+    return module, plugin, segment
+
+
+def test_prefetch_after_init_confirmed(dash):
+    module, plugin, segment = dash
+    read = []
+    plugin.read_key = lambda path: read.append(path) or 'kid:key'
+    segment.init_path.write_bytes(b'partial')
+    # 元数据文件还没有下载完成
+    plugin.prefetch_keys(segment)
+    assert not plugin.key_futures
+    plugin.downloader.journal.inits[segment.init_path.name] = {'name': segment.init_path.name, 'size': 7}
+    plugin.prefetch_keys(segment)
+    assert plugin.get_key(segment) == 'kid:key'
+    assert read == [segment.init_path]
+    plugin.close()
+
+
+def test_no_pssh(dash, monkeypatch):
+    module, plugin, segment = dash
+
+    class MP4Parse(object):
+        @staticmethod
+        def mp4dump(path):
+            return {}
+
+        @staticmethod
+        def get_pssh(dmp, path):
+            return ''
+
+    monkeypatch.setattr(module, 'mp4parse', MP4Parse)
+    segment.init_path.write_bytes(b'init')
+    segment.filepath.write_bytes(b'encrypted')
+    with pytest.raises(DRMDecryptionError):
+        plugin.get_key(segment)
+    assert not plugin.key_futures
+    # 没有密钥时不跳过解密, 删除加密文件后重试
+    with pytest.raises(DRMDecryptionError):
+        plugin.decrypt_task(segment)
+    assert not segment.filepath.exists()
+
+
+def test_empty_key_fails_decrypt(dash):
+    module, plugin, segment = dash
+    plugin.get_key = lambda s: ''
+    segment.filepath.write_bytes(b'encrypted')
+    with pytest.raises(DRMDecryptionError):
+        plugin.decrypt_task(segment)
+    assert not segment.filepath.exists()
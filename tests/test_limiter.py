@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/18 23:40
+# @Version     : Python 3.14.0
+"""令牌桶限速器"""
+import pytest
+
+from vodd.utils import limiter
+from vodd.utils.limiter import TokenBucket
+
+
+class FakeClock(object):
+    """替换limiter中的time模块, sleep只推进时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(limiter, 'time', clock)
+    return clock
+
+
+def test_unlimited(clock):
+    bucket = TokenBucket()
+    assert not bucket.enabled
+    assert bucket.reserve(10 ** 9) == 0
+    bucket.consume(10 ** 9)
+    assert clock.slept == []
+
+
+def test_starts_full(clock):
+    bucket = TokenBucket(rate=1000, burst=2000)
+    assert bucket.reserve(2000) == 0
+    assert bucket.reserve(1000) == pytest.approx(1.0)
+
+
+def test_refill_and_overdraft(clock):
+    bucket = TokenBucket(rate=1000)
+    assert bucket.enabled and bucket.burst == 1000
+    assert bucket.reserve(500) == 0
+    # 透支的部分按速率等待
+    assert bucket.reserve(1000) == pytest.approx(0.5)
+    clock.now += 1.5
+    assert bucket.reserve(500) == 0
+    # 单次大于burst也可以透支
+    assert bucket.reserve(3000) == pytest.approx(2.5)
+
+
+def test_burst_caps_tokens(clock):
+    bucket = TokenBucket(rate=1000, burst=200)
+    clock.now += 60
+    assert bucket.reserve(200) == 0
+    assert bucket.reserve(100) == pytest.approx(0.1)
+
+
+def test_consume_sleeps(clock):
+    bucket = TokenBucket(rate=100)
+    bucket.consume(50)
+    assert clock.slept == []
+    bucket.consume(100)
+    assert clock.slept == [pytest.approx(0.5)]
+
+
+def test_parent_limits_child(clock):
+    parent = TokenBucket(rate=100)
+    child = TokenBucket(parent=parent)
+    assert child.enabled
+    assert child.reserve(100) == 0
+    assert child.reserve(100) == pytest.approx(1.0)
+    # 两级都限速时取较长的等待
+    child.set_rate(1000)
+    clock.now += 1
+    assert child.reserve(100) == pytest.approx(1.0)
+
+
+def test_set_rate(clock):
+    bucket = TokenBucket(rate=100)
+    bucket.set_rate(0)
+    assert not bucket.enabled
+    assert bucket.reserve(10 ** 6) == 0
+    # 重新开始限速时令牌桶是满的
+    bucket.set_rate(1000)
+    assert bucket.reserve(1000) == 0
+    assert bucket.reserve(1000) == pytest.approx(1.0)
+    # 调整速率时保留已透支的部分
+    bucket.set_rate(2000)
+    assert bucket.reserve(0) == pytest.approx(0.5)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 01:10
+# @Version     : Python 3.14.0
+"""清单缓存的过期、304确认、解析结果复用和淘汰"""
+import os
+from types import SimpleNamespace
+
+from vodd.utils.manifest_cache import ManifestCache, is_live
+
+URL = 'https://cdn.example.com/vod/index.m3u8'
+VOD = '#EXTM3U\n#EXT-X-PLAYLIST-TYPE:VOD\n#EXTINF:4,\n0.ts\n#EXT-X-ENDLIST\n'
+LIVE = '#EXTM3U\n#EXT-X-MEDIA-SEQUENCE:10\n#EXTINF:4,\n10.ts\n'
+
+
+class FakeServer(object):
+    """记录请求头, 请求头中的ETag与当前内容一致时返回304"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.etag = '"1"'
+        self.requests = []
+
+    def request(self, method: str, url: str, headers: dict = None):
+        self.requests.append(headers or {})
+        if headers and headers.get('If-None-Match') == self.etag:
+            return SimpleNamespace(status_code=304, url=url, text='', headers={})
+        return SimpleNamespace(status_code=200, url=url, text=self.text, headers={'ETag': self.etag})
+
+    def update(self, text: str):
+        self.text = text
+        self.etag = f'"{int(self.etag.strip(chr(34))) + 1}"'
+
+
+def make_planner():
+    """解析函数, 与缓存一起保存的结果为切片链接"""
+
+    def planner(text: str, url: str) -> list:
+        planner.calls += 1
+        return [line for line in text.splitlines() if line and not line.startswith('#')]
+
+    planner.calls = 0
+    return planner
+
+
+def test_revalidate_with_304(tmp_path):
+    cache = ManifestCache(tmp_path, max_age=0)
+    server, planner = FakeServer(VOD), make_planner()
+    first = cache.fetch(server.request, URL, planner)
+    assert (first.text, first.plan, first.cached) == (VOD, ['0.ts'], False)
+    second = cache.fetch(server.request, URL, planner)
+    assert server.requests[-1] == {'If-None-Match': '"1"'}
+    assert (second.text, second.plan, second.cached) == (VOD, ['0.ts'], True)
+    # 304时复用缓存的解析结果
+    assert planner.calls == 1
+
+
+def test_changed_manifest(tmp_path):
+    cache = ManifestCache(tmp_path, max_age=0)
+    server, planner = FakeServer(VOD), make_planner()
+    cache.fetch(server.request, URL, planner)
+    server.update(VOD.replace('0.ts', '1.ts'))
+    manifest = cache.fetch(server.request, URL, planner)
+    assert (manifest.plan, manifest.cached) == (['1.ts'], False)
+    assert planner.calls == 2
+
+
+def test_max_age(tmp_path):
+    cache = ManifestCache(tmp_path, max_age=3600)
+    server = FakeServer(VOD)
+    cache.fetch(server.request, URL)
+    assert cache.fetch(server.request, URL).cached
+    assert len(server.requests) == 1
+    # 直播清单每次都向服务器确认
+    live = 'https://cdn.example.com/live/index.m3u8'
+    server.update(LIVE)
+    cache.fetch(server.request, live)
+    cache.fetch(server.request, live)
+    assert len(server.requests) == 3
+
+
+def test_fresh(tmp_path):
+    cache = ManifestCache(tmp_path, max_age=0)
+    server = FakeServer(LIVE)
+    cache.fetch(server.request, URL)
+    assert cache.fetch(server.request, URL, fresh=True).cached
+    assert len(server.requests) == 1
+
+
+def test_disabled(tmp_path):
+    cache = ManifestCache(tmp_path / 'cache', max_size=0)
+    server, planner = FakeServer(VOD), make_planner()
+    for _ in range(2):
+        assert cache.fetch(server.request, URL, planner).plan == ['0.ts']
+    assert len(server.requests) == 2
+    assert not (tmp_path / 'cache').exists()
+
+
+def test_normalize(tmp_path):
+    cache = ManifestCache(tmp_path)
+    assert cache.normalize('HTTPS://CDN.Example.com:443/a?x=1#top') == 'https://cdn.example.com/a?x=1'
+    assert cache.normalize('http://cdn.example.com:8080') == 'http://cdn.example.com:8080/'
+    server = FakeServer(VOD)
+    cache.fetch(server.request, URL)
+    assert cache.contains(URL.replace('https://cdn', 'HTTPS://CDN'))
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = ManifestCache(tmp_path, max_size=10 ** 6)
+    server = FakeServer(VOD)
+    urls = [f'https://cdn.example.com/{i}/index.m3u8' for i in range(3)]
+    for i, url in enumerate(urls):
+        cache.fetch(server.request, url)
+        os.utime(cache.entry_path(url), (1000 + i, 1000 + i))
+    cache.load(urls[0])
+    # 只需要淘汰一个清单
+    cache.max_size = sum(cache.entry_path(url).stat().st_size for url in urls) - 1
+    cache.evict()
+    assert [cache.contains(url) for url in urls] == [True, False, True]
+
+
+def test_is_live():
+    assert not is_live(VOD)
+    assert is_live(LIVE)
+    assert not is_live('#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1\nv.m3u8\n')
+    assert is_live('<MPD type="dynamic">')
+    assert not is_live('<MPD type="static">')
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 15:00
+# @Version     : Python 3.14.0
+"""解密阶段的进程池、有界队列、收尾线程和利用率统计"""
+import operator
+import threading
+
+import pytest
+
+from vodd.utils.pipeline import DecryptStage, SharedProcessPool, StageMeter
+
+
+@pytest.fixture
+def shared():
+    pool = SharedProcessPool(2)
+    yield pool
+    pool.shutdown()
+
+
+def test_shared_pool_lazy(shared):
+    # 第一次提交解密任务时才启动进程
+    stage = DecryptStage(1, shared=shared)
+    assert shared._pool is None
+    assert stage.processes == 2
+    assert stage.queue_size == 4
+    pool = shared.get()
+    assert shared.get() is pool
+    shared.shutdown()
+    assert shared._pool is None
+    shared.shutdown()
+    assert shared.get() is not pool
+
+
+def test_shared_stages(shared):
+    results = []
+    lock = threading.Lock()
+
+    def callback(result):
+        with lock:
+            results.append((threading.current_thread().name, result))
+
+    stages = [DecryptStage(1, shared=shared) for _ in range(2)]
+    for i, stage in enumerate(stages):
+        for j in range(5):
+            stage.submit((operator.mul, (i + 1, j)), callback)
+    for stage in stages:
+        stage.close()
+    # 关闭任务的解密阶段不会关闭共享的进程池
+    assert shared._pool is not None
+    assert shared.get().submit(operator.add, 1, 2).result() == 3
+    assert sorted(r for _, r in results) == sorted([j for j in range(5)] + [2 * j for j in range(5)])
+    assert {name for name, _ in results} == {'decrypt-finisher'}
+    report = stages[0].report(8)
+    assert report['decrypt']['count'] == 5
+    assert report['decrypt']['capacity'] == 2
+    assert report['finish']['count'] == 5
+    assert report['queue'] == {'pending': 0, 'capacity': 4, 'blocked': report['queue']['blocked']}
+
+
+def test_errors():
+    errors = []
+    stage = DecryptStage(1, on_error=errors.append)
+    try:
+        stage.submit((operator.truediv, (1, 0)), lambda result: None)
+        stage.submit((operator.add, (1, 1)), lambda result: 1 / 0)
+        stage.join()
+    finally:
+        stage.close()
+    assert len(errors) == 2
+    assert all(isinstance(e, ZeroDivisionError) for e in errors)
+    assert stage.pending == 0
+
+
+def test_bounded_queue():
+    stage = DecryptStage(1, queue_size=1)
+    released = threading.Event()
+    finished = []
+    try:
+        stage.submit((operator.add, (1, 1)), lambda result: released.wait(5))
+        thread = threading.Thread(target=stage.submit, args=((operator.add, (2, 2)), finished.append))
+        thread.start()
+        # 第一个任务还没有收尾, 提交第二个任务时阻塞
+        thread.join(0.3)
+        assert thread.is_alive()
+        released.set()
+        thread.join(5)
+        stage.join()
+    finally:
+        released.set()
+        stage.close()
+    assert finished == [4]
+    assert stage.blocked > 0
+
+
+def test_disabled():
+    stage = DecryptStage(0)
+    assert not stage.enabled
+    assert stage.report(4) == {'decrypt': {'count': 0, 'busy': 0.0, 'capacity': 4, 'utilisation': 0.0}}
+    stage.close()
+
+
+def test_meter():
+    meter = StageMeter()
+    meter.add(1.0)
+    meter.add(1.0)
+    report = meter.report(4)
+    assert report['count'] == 2
+    assert report['busy'] == 2.0
+    assert 0 < report['utilisation'] <= 0.5
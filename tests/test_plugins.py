@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 16:30
+# @Version     : Python 3.14.0
+"""插件注册表: 内置插件、入口点、扫描插件文件夹, 使用时才导入"""
+from importlib import metadata
+
+import pytest
+
+import vodd.plugins as plugins
+from vodd.plugins import ENTRY_POINT_GROUP, PluginRegistry, get_all_plugins
+from vodd.plugins.stream import Stream
+
+
+class Custom(Stream):
+    """入口点声明的插件"""
+
+
+class Unusable(Stream):
+    usable = False
+
+
+@pytest.fixture
+def entry_points(monkeypatch):
+    eps = [
+        metadata.EntryPoint(name='Custom', value='test_plugins:Custom', group=ENTRY_POINT_GROUP),
+        metadata.EntryPoint(name='stream', value='test_plugins:Custom', group=ENTRY_POINT_GROUP),
+        metadata.EntryPoint(name='missing', value='vodd.no_such_module:Plugin', group=ENTRY_POINT_GROUP),
+    ]
+    monkeypatch.setattr(metadata, 'entry_points', lambda group: [ep for ep in eps if ep.group == group])
+    return eps
+
+
+@pytest.fixture
+def scanned(monkeypatch):
+    calls = []
+
+    def get_plugin_map(base):
+        calls.append(base)
+        return {'scanned': Custom}
+
+    monkeypatch.setattr(plugins, 'get_plugin_map', get_plugin_map)
+    return calls
+
+
+def test_declared():
+    registry = PluginRegistry({'stream': 'vodd.plugins.stream:Stream'})
+    assert registry['stream'] is Stream
+    assert 'stream' in registry
+    assert registry.load('stream') is Stream
+    assert registry._loaded == {'stream': Stream}
+
+
+def test_failed_import(entry_points, scanned):
+    registry = PluginRegistry({
+        'broken': 'vodd.no_such_module:Plugin',
+        'attr': 'vodd.plugins.stream:NoSuchPlugin',
+        'unusable': 'test_plugins:Unusable',
+    })
+    for name in ('broken', 'attr', 'unusable', 'missing', 'unknown'):
+        assert registry.load(name) is None
+        assert name not in registry
+        with pytest.raises(KeyError):
+            registry[name]
+    assert None not in registry
+
+
+def test_entry_points(entry_points, scanned):
+    registry = PluginRegistry({'stream': 'vodd.plugins.stream:Stream'})
+    # 入口点名字不区分大小写, 内置插件优先
+    assert registry['custom'] is Custom
+    assert registry['stream'] is Stream
+    assert not scanned
+
+
+def test_scanned(entry_points, scanned):
+    registry = PluginRegistry({})
+    assert registry['scanned'] is Custom
+    assert 'other' not in registry
+    assert len(scanned) == 1
+
+
+def test_iteration(entry_points, scanned):
+    registry = PluginRegistry({'stream': 'vodd.plugins.stream:Stream', 'broken': 'vodd.no_such_module:Plugin'})
+    # 导入失败的插件不出现在遍历结果中
+    assert list(registry) == ['custom', 'scanned', 'stream']
+    assert len(registry) == 3
+    assert dict(registry.items()) == {'custom': Custom, 'scanned': Custom, 'stream': Stream}
+
+
+def test_builtin():
+    registry = get_all_plugins()
+    assert registry is get_all_plugins()
+    assert set(registry.declared) == {'dash', 'hls', 'stream'}
+    assert registry['stream'] is Stream
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 13:00
+# @Version     : Python 3.14.0
+"""每线程计数器的汇总、确认去重、JSON统计文件和Prometheus指标服务"""
+import json
+import threading
+import urllib.request
+
+from vodd.utils.progress import MetricsServer, ProgressStats
+
+
+def test_complete_dedupe():
+    stats = ProgressStats()
+    stats.start(4, confirmed=['0.ts'])
+    stats.complete('0.ts', 100)
+    stats.complete('1.ts', 100)
+    stats.complete('1.ts', 100)
+    assert stats.completed == 2
+    assert not stats.is_complete
+    stats.complete('2.ts', 100)
+    stats.complete('3.ts', 100)
+    assert stats.is_complete
+    stats.add_task()
+    assert stats.total == 5
+    assert not stats.is_complete
+
+
+def test_counters_per_thread():
+    stats = ProgressStats()
+    stats.start(8)
+
+    def worker(i):
+        for j in range(2):
+            stats.add_bytes(50)
+            stats.complete(f'{i}-{j}.ts', 50)
+
+    threads = [threading.Thread(target=worker, args=(i,), name=f'worker-{i}') for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(stats.counters) == 4
+    assert stats.downloaded == 400
+    snapshot = stats.update()
+    assert snapshot['completed'] == 8
+    assert snapshot['completed_bytes'] == 400
+    assert snapshot['remaining_bytes'] == 0
+    assert snapshot['workers'] == {f'worker-{i}': 100 for i in range(4)}
+
+
+def test_remaining_estimate():
+    stats = ProgressStats()
+    stats.start(4)
+    stats.add_bytes(250)
+    stats.complete('0.ts', 200)
+    # 平均每个切片200字节, 剩余3个切片, 正在下载的50字节从剩余中扣除
+    assert stats.update()['remaining_bytes'] == 550
+
+
+def test_ewma_speed():
+    stats = ProgressStats(tau=10)
+    stats.start(10)
+    stats.last_time -= 1
+    stats.add_bytes(1000)
+    assert round(stats.update()['speed']) == 1000
+    stats.last_time -= 1
+    assert 0 < stats.update()['speed'] < 1000
+
+
+def test_write(tmp_path):
+    stats = ProgressStats()
+    stats.start(2)
+    stats.complete('0.ts', 10)
+    stats.update(concurrency=3)
+    path = tmp_path / 'stats.json'
+    stats.write(path)
+    data = json.loads(path.read_text(encoding='utf-8'))
+    assert data['completed'] == 1
+    assert data['total'] == 2
+    assert data['concurrency'] == 3
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_metrics_server():
+    stats = ProgressStats()
+    stats.start(2)
+    stats.complete('0.ts', 10)
+    stats.update()
+    server = MetricsServer(stats, 0)
+    server.start()
+    try:
+        host, port = server._server.server_address[:2]
+        assert host == '127.0.0.1'
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics') as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            body = response.read().decode('utf-8')
+    finally:
+        server.stop()
+    assert 'vodd_segments_completed 1\n' in body
+    assert 'vodd_segments_total 2\n' in body
+    assert 'vodd_eta_seconds NaN\n' in body
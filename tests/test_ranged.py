@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 10:50
+# @Version     : Python 3.14.0
+"""分块模式下多个连接分段下载大切片"""
+import os
+
+import pytest
+
+CONTENT = os.urandom(10000)
+
+
+@pytest.fixture
+def downloader(make_downloader, file_server):
+    file_server.files['/big.ts'] = CONTENT
+    d = make_downloader('--range-connections', '4', '--chunk-size', '1000')
+    d.chunked_mode = True
+    return d
+
+
+def ranges(file_server) -> list:
+    return sorted(r for method, _, r in file_server.requests if method == 'GET' and r)
+
+
+def test_split_into_ranges(downloader, file_server, tmp_path):
+    path = tmp_path / 'big.ts'
+    downloader.smart_save(file_server.url('/big.ts'), {}, path)
+    assert path.read_bytes() == CONTENT
+    assert downloader.downloaded_size[path.name] == [len(CONTENT), len(CONTENT)]
+    # 第一个分段复用第一个完整请求, 其余分段各一个请求
+    assert len(file_server.requests) == 4
+    assert ranges(file_server) == ['bytes=2500-4999', 'bytes=5000-7499', 'bytes=7500-9999']
+
+
+def test_split_within_range(downloader, file_server, tmp_path):
+    path = tmp_path / 'big.ts'
+    downloader.smart_save(file_server.url('/big.ts'), {'range': 'bytes=1000-8999'}, path)
+    assert path.read_bytes() == CONTENT[1000:9000]
+    assert ranges(file_server) == ['bytes=1000-8999', 'bytes=3000-4999', 'bytes=5000-6999', 'bytes=7000-8999']
+
+
+def test_small_segment_single_connection(downloader, file_server, tmp_path):
+    file_server.files['/small.ts'] = CONTENT[:1500]
+    path = tmp_path / 'small.ts'
+    downloader.smart_save(file_server.url('/small.ts'), {}, path)
+    assert path.read_bytes() == CONTENT[:1500]
+    assert len(file_server.requests) == 1
+
+
+def test_server_ignores_range(downloader, file_server, tmp_path):
+    # 服务器声明支持Range但是返回200时, 改为单个连接下载
+    file_server.ranges = False
+    downloader.is_rangeable = lambda status_code, headers, length: True
+    path = tmp_path / 'big.ts'
+    downloader.smart_save(file_server.url('/big.ts'), {}, path)
+    assert path.read_bytes() == CONTENT
+    assert downloader.downloaded_size[path.name] == [len(CONTENT), len(CONTENT)]
+
+
+def test_is_rangeable(downloader):
+    assert downloader.is_rangeable(200, {'Accept-Ranges': 'bytes'}, 2000)
+    assert downloader.is_rangeable(206, {}, 2000)
+    assert not downloader.is_rangeable(200, {}, 2000)
+    assert not downloader.is_rangeable(200, {'Accept-Ranges': 'bytes'}, 1999)
+    assert not downloader.is_rangeable(206, {'Content-Encoding': 'gzip'}, 2000)
+    downloader.range_connections = 1
+    assert not downloader.is_rangeable(206, {}, 2000)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 09:40
+# @Version     : Python 3.14.0
+"""断点续传: 元数据文件只下载一次, 续传时复用"""
+from types import SimpleNamespace
+
+from conftest import URL
+from vodd.core.models import Segment
+from vodd.utils.journal import Journal
+
+
+def make_segment(downloader) -> Segment:
+    segment = Segment(type='video', group_no=0, index=0, url='http://127.0.0.1/0.m4s',
+                      init_url='http://127.0.0.1/init.mp4')
+    downloader.core.add_segment_path(segment)
+    return segment
+
+
+def count_saves(downloader) -> list:
+    saved = []
+
+    def smart_save(url, headers, path, transform=None):
+        saved.append(url)
+        path.write_bytes(b'INIT')
+
+    downloader.smart_save = smart_save
+    downloader.requester = lambda method, url, **kwargs: SimpleNamespace(headers={})
+    return saved
+
+
+def test_pre_download_journals_init(make_downloader):
+    d = make_downloader('--resume')
+    saved = count_saves(d)
+    segment = make_segment(d)
+    assert d.core.pre_download(segment) == segment.init_path
+    # 下载其他元数据文件时不再重复下载
+    d.download_init(segment)
+    assert saved == [segment.init_url]
+    d.journal.write('header', url=URL)
+    d.journal.write('planned', count=0, chunked_mode=False)
+    d.journal.close()
+    journal = Journal(d.temp_dir, enabled=True)
+    assert journal.load(URL)
+    assert journal.inits == {segment.init_path.name: {'name': segment.init_path.name, 'size': 4}}
+
+
+def test_init_downloaded_once_without_journal(make_downloader):
+    d = make_downloader()
+    saved = count_saves(d)
+    segment = make_segment(d)
+    d.core.pre_download(segment)
+    d.download_init(segment)
+    assert saved == [segment.init_url]
+    assert not d.journal.path.exists()
+
+
+def test_resume_reuses_init(make_downloader):
+    d = make_downloader('--resume')
+    count_saves(d)
+    segment = make_segment(d)
+    d.core.pre_download(segment)
+    d.journal.write('header', url=URL)
+    d.journal.write('planned', count=0, chunked_mode=False)
+    d.journal.close()
+    # 下次运行读取日志, 元数据文件完整时不再下载
+    resumed = make_downloader('--resume')
+    saved = count_saves(resumed)
+    assert resumed.journal.load(URL)
+    resumed.download_init(make_segment(resumed))
+    assert saved == []
+    # 元数据文件不完整时重新下载
+    segment.init_path.write_bytes(b'IN')
+    resumed.download_init(make_segment(resumed))
+    assert saved == [segment.init_url]
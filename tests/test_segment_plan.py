@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 13:40
+# @Version     : Python 3.14.0
+"""DASH切片边计算边产出, 规划线程在插件展开剩余轨道时即可开始下载"""
+import threading
+
+from vodd.core.models import Segment
+from vodd.format_parser.dash.parser import Parser
+from vodd.plugins.stream import Stream
+
+MPD_URL = 'https://cdn.example.com/vod/manifest.mpd'
+
+
+def get_representation(template: str, duration: str = 'PT10S'):
+    mpd = Parser.from_string(f'''<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="{duration}">
+  <Period>
+    <AdaptationSet mimeType="video/mp4">
+      {template}
+      <Representation id="v1" bandwidth="1000"/>
+    </AdaptationSet>
+  </Period>
+</MPD>''', MPD_URL)
+    return mpd.periods[0].adaptation_sets[0].representations[0]
+
+
+def timeline_template(timeline: str) -> str:
+    return (
+        '<SegmentTemplate timescale="10" media="$RepresentationID$/$Time$.m4s" initialization="$RepresentationID$/init.mp4">'
+        f'<SegmentTimeline>{timeline}</SegmentTimeline></SegmentTemplate>'
+    )
+
+
+def test_number_segments_lazy():
+    # 十万小时的节目展开后有上亿个切片, 只计算第一个
+    representation = get_representation(
+        '<SegmentTemplate timescale="1" duration="2" startNumber="5" media="$RepresentationID$/$Number$.m4s" '
+        'initialization="$RepresentationID$/init.mp4"/>',
+        'PT100000H',
+    )
+    segment = next(iter(representation.segments))
+    assert segment == {
+        'sequence_no': 5,
+        'duration': '2.0',
+        'segment_url': 'https://cdn.example.com/vod/v1/5.m4s',
+        'initialization_url': 'https://cdn.example.com/vod/v1/init.mp4',
+    }
+
+
+def test_number_segments():
+    representation = get_representation(
+        '<SegmentTemplate timescale="10" duration="40" startNumber="1" media="$Number$.m4s"/>', 'PT10S'
+    )
+    assert [s['segment_url'] for s in representation.get_number_segments()] == [
+        f'https://cdn.example.com/vod/{i}.m4s' for i in range(1, 4)
+    ]
+
+
+def test_time_segments_lazy():
+    representation = get_representation(timeline_template('<S t="0" d="20" r="100000000"/>'))
+    segments = representation.get_time_segments()
+    assert [next(segments)['sequence_no'] for _ in range(3)] == [0, 20, 40]
+
+
+def test_time_segments_ordered():
+    # 重复的时间点跳过
+    representation = get_representation(timeline_template('<S t="0" d="20" r="1"/><S d="10"/><S t="50" d="10" r="1"/>'))
+    assert representation.is_timeline_ordered(representation.segment_templates[0].segment_timelines[0].base_urls)
+    segments = list(representation.get_time_segments())
+    assert [s['sequence_no'] for s in segments] == [0, 20, 40, 50, 60]
+    assert [s['duration'] for s in segments] == ['2.0', '2.0', '1.0', '1.0', '1.0']
+    assert segments[0]['segment_url'] == 'https://cdn.example.com/vod/v1/0.m4s'
+    assert segments[0]['initialization_url'] == 'https://cdn.example.com/vod/v1/init.mp4'
+
+
+def test_time_segments_unordered():
+    representation = get_representation(timeline_template('<S t="40" d="20" r="1"/><S t="10" d="20" r="1"/>'))
+    assert not representation.is_timeline_ordered(representation.segment_templates[0].segment_timelines[0].base_urls)
+    assert [s['sequence_no'] for s in representation.get_time_segments()] == [10, 30, 40, 60]
+
+
+def test_plan_streaming_order(make_downloader):
+    d = make_downloader()
+    d.temp_dir.mkdir(parents=True, exist_ok=True)
+    d.plugin = Stream(downloader=d)
+    released = threading.Event()
+
+    def produce():
+        for i in range(3):
+            yield Segment(type='video', group_no=0, index=i, url=f'https://cdn.example.com/v/{i}.ts')
+        # 音频轨道还在展开时, 视频切片已经可以下载
+        assert released.wait(5)
+        for group_no in range(2):
+            for i in range(2):
+                yield Segment(type='audio', group_no=group_no, index=i, url=f'https://cdn.example.com/a{group_no}/{i}.ts')
+
+    d.planning = True
+    planner = threading.Thread(target=d.core.plan, args=(produce(), True), daemon=True)
+    planner.start()
+    first = d.plan_queue.get(timeout=5)
+    assert (first.type, first.index) == ('video', 0)
+    assert d.planning
+    released.set()
+    planned = [first, *iter(d.plan_queue.get, None)]
+    planner.join(5)
+    assert not d.planning
+    assert [(s.type, s.group_no, s.index) for s in planned] == [
+        ('video', 0, 0), ('video', 0, 1), ('video', 0, 2),
+        ('audio', 0, 0), ('audio', 0, 1), ('audio', 1, 0), ('audio', 1, 1),
+    ]
+    assert d.tasks == planned
+    assert d.stats.total == 7
+    assert [len(d.segments['audio'][g]) for g in (0, 1)] == [2, 2]
+    assert set(d.writers) == {('video', 0), ('audio', 0), ('audio', 1)}
+    assert all(writer.sealed for writer in d.writers.values())
+    d.core.close_writers()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 13:20
+# @Version     : Python 3.14.0
+"""切片表视图与Segment模型的结构一致, 断点续传日志可以互相转换"""
+from pathlib import Path
+from urllib.parse import urlparse
+
+import pytest
+
+from vodd.core.models import Cipher, Segment
+from vodd.core.segment_table import SegmentTable, init_name, segment_name, url_suffix
+
+URLS = [
+    'https://cdn.example.com/v/seg-1.ts',
+    'https://cdn.example.com/v/seg-2.m4s?token=abc',
+    'https://cdn.example.com/v/seg.3.mp4#frag',
+    'https://cdn.example.com/v/seg-4',
+    'https://cdn.example.com/v/seg-5.',
+    'https://cdn.example.com/v/.hidden',
+    'https://cdn.example.com/v/params;a=1.ts',
+    'https://cdn.example.com//seg-6.ts',
+]
+
+
+def make_segment(table, temp_dir, **kwargs) -> tuple:
+    view = table.append(**kwargs)
+    table.temp_dir = temp_dir
+    segment = Segment(**kwargs)
+    segment.filepath = temp_dir / segment_name(segment.type, segment.group_no, segment.index, segment.url)
+    if segment.init_url:
+        segment.init_path = temp_dir / init_name(segment.type, segment.group_no, segment.init_url)
+    return view, segment
+
+
+@pytest.mark.parametrize('url', URLS)
+def test_url_suffix(url):
+    assert url_suffix(url[url.rfind('/') + 1:], url) == Path(urlparse(url).path).suffix
+
+
+@pytest.mark.parametrize('exclude_none', [False, True])
+def test_model_dump(tmp_path, exclude_none):
+    table = SegmentTable()
+    cipher = Cipher(name='AES-128', params={'uri': 'https://cdn.example.com/key', 'iv': '0x01'})
+    cases = [
+        {'type': 'video', 'group_no': 0, 'index': 0, 'url': URLS[0]},
+        {'type': 'video', 'group_no': 0, 'index': 1, 'url': URLS[1], 'duration': 2.0,
+         'headers': {'Referer': 'https://example.com'}, 'cipher': cipher},
+        {'type': 'audio', 'group_no': 3, 'index': 12, 'url': URLS[2], 'discontinuity': True,
+         'init_url': 'https://cdn.example.com/a/init.mp4'},
+        {'type': 'audio', 'group_no': 3, 'index': 13, 'url': URLS[6], 'duration': 0.0},
+    ]
+    for kwargs in cases:
+        view, segment = make_segment(table, tmp_path, **kwargs)
+        assert view.model_dump(exclude_none=exclude_none) == segment.model_dump(exclude_none=exclude_none)
+        # 日志中的记录可以还原成Segment
+        assert Segment(**view.model_dump(exclude_none=True)) == segment
+
+
+def test_shared_columns(tmp_path):
+    table = SegmentTable()
+    headers = {'Referer': 'https://example.com'}
+    for i in range(100):
+        table.append('video', 0, i, f'https://cdn.example.com/v/{i}.ts', headers=dict(headers))
+    assert len(table) == 100
+    assert len(table.url_prefixes.values) == 1
+    assert len(table.headers.values) == 1
+    assert len(table.ciphers.values) == 1
+    assert table[0].headers is table[-1].headers
+    assert table[0].cipher is table[-1].cipher
+    assert table[-1].index == 99
+    with pytest.raises(IndexError):
+        table[100]
+    # 设置临时文件夹之前不生成路径
+    assert table[0].filepath is None
+    table.temp_dir = tmp_path
+    assert table[5].filepath == tmp_path / 'video_00000_0000000005.ts'
+
+
+def test_overrides(tmp_path):
+    table = SegmentTable()
+    table.temp_dir = tmp_path
+    view = table.append('video', 0, 0, URLS[0], init_url='https://cdn.example.com/v/init.mp4')
+    other = table.append('video', 0, 1, URLS[0])
+    view.filepath = tmp_path / 'split.ts'
+    view.init_path = tmp_path / 'init.mp4'
+    view.headers = {'Range': 'bytes=0-99'}
+    view.confirmed = True
+    assert table[0].filepath == tmp_path / 'split.ts'
+    assert table[0].init_path == tmp_path / 'init.mp4'
+    assert table[0].headers == {'Range': 'bytes=0-99'}
+    assert table[0].confirmed
+    assert other.headers == {}
+    assert not other.confirmed
+    assert other.init_path is None
+    view.confirmed = False
+    assert not table[0].confirmed
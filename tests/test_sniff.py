@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 01:00
+# @Version     : Python 3.14.0
+"""根据Content-Type、链接后缀和内容开头判断插件"""
+import pytest
+
+from vodd.core.algorithms import sniff_plugin
+
+TS_HEAD = (b'\x47' + bytes(187)) * 2
+
+
+@pytest.mark.parametrize('content_type, suffix, expected', [
+    ('application/vnd.apple.mpegurl', '', 'hls'),
+    ('audio/x-mpegurl; charset=utf-8', '.txt', 'hls'),
+    ('application/dash+xml', '', 'dash'),
+    ('video/mp4', '.mp4', 'stream'),
+    ('audio/aac', '', 'stream'),
+    ('application/octet-stream', '.m3u8', 'hls'),
+    ('text/plain', '.mpd', 'dash'),
+    ('application/octet-stream', '', 'stream'),
+])
+def test_headers_only(content_type, suffix, expected):
+    assert sniff_plugin(content_type, suffix, b'') == expected
+
+
+@pytest.mark.parametrize('content_type, suffix', [
+    ('', ''),
+    ('text/plain', ''),
+    ('application/octet-stream', ''),
+    # 后缀与视频类型矛盾时检查内容
+    ('video/mp2t', '.m3u8'),
+])
+def test_needs_content(content_type, suffix):
+    assert sniff_plugin(content_type, suffix) == ''
+
+
+@pytest.mark.parametrize('head, expected', [
+    (b'#EXTM3U\n#EXT-X-VERSION:3\n', 'hls'),
+    (b'\xef\xbb\xbf\r\n#EXTM3U\n', 'hls'),
+    (b'<?xml version="1.0"?>\n<MPD xmlns="urn:mpeg:dash:schema:mpd:2011">', 'dash'),
+    (b'\x00\x00\x00\x18ftypisom', 'stream'),
+    (b'\x00\x00\x00\x18moof', 'stream'),
+    (TS_HEAD, 'stream'),
+    (b'\x47' + bytes(100), 'stream'),
+])
+def test_content(head, expected):
+    # 内容优先于后缀和通用的Content-Type
+    assert sniff_plugin('application/octet-stream', '.m3u8', head) == expected
+    assert sniff_plugin('', '', head) == expected
+
+
+def test_unknown_content():
+    assert sniff_plugin('text/html', '', b'<html><body></body></html>') == ''
+    # 0x47开头但下一个包不是0x47
+    assert sniff_plugin('', '', b'\x47' + bytes(187) + b'\x00') == ''
+    assert sniff_plugin('text/html', '.m3u8', b'<html></html>') == 'hls'
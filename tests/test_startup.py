@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 17:00
+# @Version     : Python 3.14.0
+"""启动时不导入DRM、解析器等重量级依赖, 外部程序只查找一次"""
+import json
+import subprocess
+import sys
+
+from vodd.core import files
+
+HEAVY = [
+    'DRM', 'Crypto', 'lxml', 'm3u8', 'pydantic', 'prettytable', 'aiohttp',
+    'vodd.core.models', 'vodd.plugins.dash', 'vodd.plugins.hls', 'vodd.format_parser.dash.tags',
+]
+
+
+def imported(code: str) -> list:
+    """在新的进程中执行代码, 返回已经导入的重量级模块"""
+    code = f'{code}\nimport json, sys\nprint(json.dumps([m for m in {HEAVY + ["requests", "vodd.downloader"]!r} if m in sys.modules]))'
+    return json.loads(subprocess.check_output([sys.executable, '-c', code], text=True).strip().splitlines()[-1])
+
+
+def test_main_imports():
+    assert imported('import vodd.main') == []
+
+
+def test_parse_args_imports():
+    assert imported("from vodd.main import parse_args\nparse_args(['-o', 'a.mp4', '--url', 'http://127.0.0.1/a.m3u8'])") == []
+
+
+def test_downloader_imports():
+    # 下载器只导入requests和插件注册表, 选择插件时才导入插件模块
+    assert imported('import vodd.downloader') == ['requests', 'vodd.downloader']
+
+
+def test_find_executable_cached(monkeypatch):
+    calls = []
+    monkeypatch.setattr(files.shutil, 'which', lambda name: calls.append(name) or f'/usr/bin/{name}')
+    files.find_executable.cache_clear()
+    try:
+        assert files.find_executable('ffmpeg') == '/usr/bin/ffmpeg'
+        assert files.find_executable('ffmpeg') == '/usr/bin/ffmpeg'
+        assert files.find_executable('ffprobe') == '/usr/bin/ffprobe'
+    finally:
+        files.find_executable.cache_clear()
+    assert calls == ['ffmpeg', 'ffprobe']
+
+
+def test_plugin_loaded_on_demand():
+    # 普通视频流插件不需要DRM和清单解析器
+    code = "from vodd.plugins import get_all_plugins\nget_all_plugins().load('stream')"
+    assert not {'DRM', 'Crypto', 'lxml', 'm3u8', 'vodd.plugins.dash', 'vodd.plugins.hls'} & set(imported(code))
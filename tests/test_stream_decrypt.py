@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 00:10
+# @Version     : Python 3.14.0
+"""边下载边解密的结果与整体解密一致"""
+import os
+import random
+
+import pytest
+from Crypto.Cipher import AES
+
+from vodd.plugins.hls import StreamDecrypter, align_ts, decrypt_aes_file
+
+KEY = bytes(range(16))
+IV = bytes(range(16, 32))
+
+
+def make_ts(junk: bytes = b'', packets: int = 20) -> bytes:
+    """开头带有非TS数据的TS内容, 长度为16的倍数"""
+    content = junk + b''.join(b'G@' + os.urandom(186) for _ in range(packets))
+    return content + b'\xff' * (-len(content) % 16)
+
+
+def encrypt(content: bytes) -> bytes:
+    return AES.new(KEY, AES.MODE_CBC, iv=IV).encrypt(content)
+
+
+def stream(decrypter: StreamDecrypter, data: bytes, sizes) -> bytes:
+    output = bytearray()
+    position = 0
+    sizes = iter(sizes)
+    while position < len(data):
+        size = next(sizes)
+        output += decrypter.update(data[position:position + size])
+        position += size
+    output += decrypter.final()
+    return bytes(output)
+
+
+def fixed(size: int):
+    while True:
+        yield size
+
+
+def randomized(seed: int):
+    rng = random.Random(seed)
+    while True:
+        yield rng.randint(1, 100)
+
+
+@pytest.mark.parametrize('sizes', [fixed(1), fixed(15), fixed(16), fixed(17), fixed(4096), randomized(1), randomized(2)])
+@pytest.mark.parametrize('junk', [b'', b'ID3\x04junk', b'G' * 7, b'x' * 40 + b'G'])
+def test_chunk_boundaries(sizes, junk):
+    plain = make_ts(junk)
+    data = encrypt(plain)
+    expected = align_ts(AES.new(KEY, AES.MODE_CBC, iv=IV).decrypt(data))
+    assert stream(StreamDecrypter(KEY, IV, is_ts=True), data, sizes) == expected
+    assert expected.startswith(b'G@')
+
+
+@pytest.mark.parametrize('sizes', [fixed(1), fixed(17), randomized(3)])
+def test_not_ts(sizes):
+    plain = b'\x00' * 7 + make_ts()
+    plain = plain[:len(plain) - len(plain) % 16]
+    # 非TS切片不去掉开头的内容
+    assert stream(StreamDecrypter(KEY, IV, is_ts=False), encrypt(plain), sizes) == plain
+
+
+@pytest.mark.parametrize('sizes', [fixed(1), fixed(33)])
+def test_align_only(sizes):
+    plain = b'junk' + make_ts()
+    assert stream(StreamDecrypter(None, None, is_ts=True), plain, sizes) == align_ts(plain)
+
+
+def test_no_sync_byte():
+    plain = b'\x00' * 64
+    assert stream(StreamDecrypter(KEY, IV, is_ts=True), encrypt(plain), fixed(5)) == plain
+    assert stream(StreamDecrypter(None, None, is_ts=True), b'G', fixed(1)) == b'G'
+
+
+def test_unaligned_ciphertext():
+    decrypter = StreamDecrypter(KEY, IV, is_ts=True)
+    decrypter.update(encrypt(make_ts()) + b'\x00' * 5)
+    with pytest.raises(ValueError):
+        decrypter.final()
+
+
+def test_decrypt_aes_file(tmp_path):
+    plain = make_ts(b'junk')
+    (path := tmp_path / '0.ts').write_bytes(encrypt(plain))
+    decrypt_aes_file(str(path), KEY, IV)
+    assert path.read_bytes() == plain[4:]
+    (path := tmp_path / '0.aac').write_bytes(encrypt(plain))
+    decrypt_aes_file(str(path), KEY, IV)
+    assert path.read_bytes() == plain
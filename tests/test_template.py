@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 00:50
+# @Version     : Python 3.14.0
+"""DASH SegmentTemplate链接模板的编译"""
+import pytest
+
+from vodd.format_parser.dash.tags import compile_template, get_segment_url
+
+BASE_URI = 'https://cdn.example.com/vod/movie/'
+
+
+def compile_media(template: str, base_url: str = '', fields: tuple = ('Number', 'Time')):
+    return compile_template(template, base_url, BASE_URI, fields, RepresentationID='video_1080', Bandwidth=4800000)
+
+
+def test_fixed_identifiers():
+    compiled = compile_media('$RepresentationID$/$Bandwidth$/seg-$Number$.m4s')
+    assert compiled.fields == {'Number'}
+    assert compiled.format(Number=7) == f'{BASE_URI}video_1080/4800000/seg-7.m4s'
+
+
+def test_width():
+    compiled = compile_media('$RepresentationID$/$Bandwidth%010d$/$Number%05d$-$Time%3d$.m4s')
+    assert compiled.fields == {'Number', 'Time'}
+    assert compiled.format(Number=42, Time=5) == f'{BASE_URI}video_1080/0004800000/00042-005.m4s'
+    # 宽度不足时保留完整的数字
+    assert compiled.format(Number=1234567, Time=123456) == f'{BASE_URI}video_1080/0004800000/1234567-123456.m4s'
+
+
+def test_width_ignored_for_strings():
+    compiled = compile_media('$RepresentationID%05d$.m4s')
+    assert compiled.format() == f'{BASE_URI}video_1080.m4s'
+
+
+def test_escaped_dollar_and_braces():
+    compiled = compile_media('a$$b/{c}/$Number$.m4s?x={1}')
+    assert compiled.format(Number=3) == BASE_URI + 'a$b/{c}/3.m4s?x={1}'
+
+
+def test_unlisted_fields_kept():
+    # 不在fields中且没有提供值的标识符保持原样
+    compiled = compile_media('init-$RepresentationID$-$Number$-$SubNumber$.mp4', fields=('Time',))
+    assert compiled.fields == frozenset()
+    assert compiled.format() == f'{BASE_URI}init-video_1080-$Number$-$SubNumber$.mp4'
+
+
+def test_base_url():
+    assert compile_media('$Number$.m4s', 'http://other.example.com/a/').format(Number=1) == 'http://other.example.com/a/1.m4s'
+    assert compile_media('$Number$.m4s', 'dash/').format(Number=1) == f'{BASE_URI}dash/1.m4s'
+    assert compile_media('$Number$.m4s', '/root/').format(Number=1) == 'https://cdn.example.com/root/1.m4s'
+    assert compile_media('$Number$.m4s', '//edge.example.com/').format(Number=1) == 'https://edge.example.com/1.m4s'
+
+
+@pytest.mark.parametrize('url, base_uri, expected', [
+    ('http://a.com/1.ts', BASE_URI, 'http://a.com/1.ts'),
+    ('1.ts', None, '1.ts'),
+    ('//a.com/1.ts', BASE_URI, 'https://a.com/1.ts'),
+    ('/x/1.ts', BASE_URI, 'https://cdn.example.com/x/1.ts'),
+    ('x/1.ts', BASE_URI, f'{BASE_URI}x/1.ts'),
+])
+def test_get_segment_url(url, base_uri, expected):
+    assert get_segment_url(url, base_uri) == expected
+
+
+def test_constant_template():
+    compiled = compile_media('init-$RepresentationID$.mp4', fields=('Number',))
+    assert not compiled.fields
+    assert compiled.format() == f'{BASE_URI}init-video_1080.mp4'
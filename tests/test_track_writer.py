@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 00:00
+# @Version     : Python 3.14.0
+"""轨道顺序写入器"""
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from fmp4 import KEY, KID, build_init, build_segment
+from vodd.utils.cenc import find_box
+from vodd.utils.track_writer import OrderedTrackWriter, PipeTrackWriter
+
+
+class FakeJournal(object):
+    def __init__(self):
+        self.records = []
+
+    def write(self, kind: str, **record):
+        self.records.append((kind, record))
+
+
+def make_segments(tmp_path, count: int) -> list:
+    segments = []
+    for i in range(count):
+        (path := tmp_path / f'{i}.ts').write_bytes(f'<{i}>'.encode())
+        segments.append(SimpleNamespace(filepath=path, confirmed=False))
+    return segments
+
+
+def test_out_of_order(tmp_path):
+    segments = make_segments(tmp_path, 4)
+    writer = OrderedTrackWriter(tmp_path / 'video.ts', segments, 1024)
+    writer.open()
+    for i in (2, 1, 3):
+        writer.push(segments[i])
+    # 前面的切片没有到达, 后面的切片留在磁盘上
+    assert writer.next == 0
+    assert all(s.filepath.exists() for s in segments)
+    writer.push(segments[0])
+    writer.close()
+    assert writer.finished
+    assert writer.path.read_bytes() == b'<0><1><2><3>'
+    assert not any(s.filepath.exists() for s in segments)
+
+
+def test_init_and_journal(tmp_path):
+    segments = make_segments(tmp_path, 3)
+    (init := tmp_path / 'init.mp4').write_bytes(b'INIT')
+    journal = FakeJournal()
+    writer = OrderedTrackWriter(tmp_path / 'video.mp4', segments, 1024, journal=journal)
+    writer.open(init)
+    writer.push(segments[1])
+    writer.push(segments[0])
+    writer.push(segments[2])
+    writer.push(segments[2])
+    # 元数据文件在写入完成并关闭后才删除
+    assert init.exists()
+    writer.close()
+    assert writer.path.read_bytes() == b'INIT<0><1><2>'
+    assert not init.exists()
+    # 连续写入的一批切片只记录一次
+    assert journal.records == [
+        ('track', {'name': 'video.mp4', 'count': 2, 'size': 10}),
+        ('track', {'name': 'video.mp4', 'count': 3, 'size': 13}),
+    ]
+
+
+def test_resume(tmp_path):
+    segments = make_segments(tmp_path, 3)
+    (init := tmp_path / 'init.mp4').write_bytes(b'INIT')
+    path = tmp_path / 'video.ts'
+    # 最后一次记录之后写入了不完整的内容
+    path.write_bytes(b'INIT<0><1><2')
+    writer = OrderedTrackWriter(path, segments, 1024)
+    writer.open(init, record={'count': 2, 'size': 10})
+    assert writer.next == 2
+    assert [s.confirmed for s in segments] == [True, True, False]
+    # 轨道文件中已经有元数据, 不再写入, 但是保留元数据文件用于解密
+    assert init.exists()
+    writer.push(segments[0])
+    writer.push(segments[2])
+    writer.close()
+    assert path.read_bytes() == b'INIT<0><1><2>'
+    assert not init.exists()
+
+
+def test_unfinished_keeps_init(tmp_path):
+    segments = make_segments(tmp_path, 2)
+    (init := tmp_path / 'init.mp4').write_bytes(b'INIT')
+    writer = OrderedTrackWriter(tmp_path / 'video.mp4', segments, 1024)
+    writer.open(init)
+    writer.push(segments[0])
+    writer.close()
+    # 下载失败时保留元数据文件, 断点续传时不需要重新下载
+    assert init.read_bytes() == b'INIT'
+
+
+def test_insert_and_seal(tmp_path):
+    segments = make_segments(tmp_path, 3)
+    writer = OrderedTrackWriter(tmp_path / 'video.ts', segments[:2], 1024, sealed=False)
+    writer.open()
+    writer.push(segments[1])
+    (extra := tmp_path / 'extra.ts').write_bytes(b'<x>')
+    extra = SimpleNamespace(filepath=extra, confirmed=False)
+    writer.insert(extra, segments[0])
+    writer.push(segments[0])
+    writer.push(extra)
+    assert not writer.finished
+    writer.add(segments[2])
+    writer.push(segments[2])
+    assert not writer.finished
+    writer.seal()
+    assert writer.finished
+    writer.close()
+    assert writer.path.read_bytes() == b'<0><x><1><2>'
+
+
+def test_decrypt_after_open(tmp_path):
+    """打开写入器之后, DASH切片仍然可以使用元数据文件获取密钥和解密"""
+    dash = pytest.importorskip('vodd.plugins.dash')
+    (init := tmp_path / 'init.mp4').write_bytes(init_data := build_init('cbcs', 1, 9, bytes(16)))
+    samples = [os.urandom(1000), os.urandom(333)]
+    segments = []
+    for i in range(2):
+        (path := tmp_path / f'{i}.m4s').write_bytes(build_segment(samples, None, 'cbcs', 1, 9, bytes(16), sequence=i))
+        segments.append(SimpleNamespace(filepath=path, confirmed=False))
+    writer = OrderedTrackWriter(tmp_path / 'video.mp4', segments, 1024)
+    writer.open(init)
+    key = f'{KID.hex()}:{KEY.hex()}'
+    for segment in reversed(segments):
+        decrypted = segment.filepath.with_stem(f'{segment.filepath.stem}_drm_decrypt')
+        dash.decrypt_drm_file(segment.filepath.as_posix(), decrypted.as_posix(), key, init.as_posix(), 'native')
+        decrypted.rename(segment.filepath)
+        writer.push(segment)
+    writer.close()
+    track = writer.path.read_bytes()
+    assert track.startswith(init_data)
+    _, offset, header, size = find_box(track, (b'mdat',), len(init_data))
+    assert track[offset + header:offset + size] == b''.join(samples)
+    assert not init.exists()
+
+
+@pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason='需要命名管道')
+def test_pipe_keeps_init(tmp_path):
+    segments = make_segments(tmp_path, 3)
+    (init := tmp_path / 'init.mp4').write_bytes(b'INIT')
+    writer = PipeTrackWriter(tmp_path / 'fifo_video.mp4', segments, 1024)
+    writer.open(init)
+    received = []
+    # 代替FFmpeg读取管道
+    reader = threading.Thread(target=lambda: received.append(writer.path.read_bytes()))
+    reader.start()
+    writer.push(segments[1])
+    writer.push(segments[0])
+    # 元数据已经写入管道, 后续切片解密还需要使用元数据文件
+    assert init.exists()
+    writer.push(segments[2])
+    writer.close()
+    reader.join(5)
+    assert received == [b'INIT<0><1><2>']
+    assert writer.error is None
+    assert not init.exists()
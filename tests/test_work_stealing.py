@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# @Author      : LJQ
+# @Time        : 2026/10/19 11:00
+# @Version     : Python 3.14.0
+"""Stream插件拆分正在下载的分段"""
+import os
+
+import pytest
+
+from vodd.core.models import Segment
+from vodd.plugins.stream import Stream
+
+MB = 1024 * 1024
+CONTENT = os.urandom(24 * MB)
+
+
+@pytest.fixture
+def downloader(make_downloader, file_server):
+    file_server.files['/movie.mp4'] = CONTENT
+    d = make_downloader('--chunk-size', str(64 * 1024))
+    d.chunked_mode = True
+    d.plugin = Stream(downloader=d)
+    return d
+
+
+def add_segments(d, url: str, bounds: list) -> list:
+    """按照[(开始, 结束)]添加分段, 序号间隔与Stream插件一致"""
+    segments = []
+    for i, (start, end) in enumerate(bounds):
+        segment = Segment(type='video', group_no=0, index=i * Stream.index_step, url=url,
+                          headers={'range': f'bytes={start}-{end - 1}'})
+        d.core.add_segment_path(segment)
+        d.core.classify_segment(segment)
+        d.tasks.append(segment)
+        segments.append(segment)
+    return segments
+
+
+def test_split_largest_remaining(downloader, file_server):
+    d = downloader
+    first, second = add_segments(d, file_server.url('/movie.mp4'), [(0, 8 * MB), (8 * MB, 24 * MB)])
+    d.downloaded_size[first.filepath.name] = [2 * MB, 8 * MB]
+    d.downloaded_size[second.filepath.name] = [4 * MB, 16 * MB]
+    segment = d.plugin.steal()
+    # 剩余最多的分段从剩余部分的中点拆分
+    assert segment.headers['range'] == f'bytes={18 * MB}-{24 * MB - 1}'
+    assert second.headers['range'] == f'bytes={8 * MB}-{18 * MB - 1}'
+    assert d.range_ends[second.filepath.name] == 10 * MB
+    assert first.index < second.index < segment.index
+    assert d.segments['video'][0] == [first, second, segment]
+    assert segment in d.tasks
+
+
+def test_no_split(downloader, file_server):
+    d = downloader
+    first, = add_segments(d, file_server.url('/movie.mp4'), [(0, 8 * MB)])
+    # 拆分后的两部分都需要不小于4个分块
+    d.downloaded_size[first.filepath.name] = [1, 8 * MB]
+    assert d.plugin.steal() is None
+    d.downloaded_size[first.filepath.name] = [0, 24 * MB]
+    d.work_stealing = False
+    assert d.plugin.steal() is None
+    d.work_stealing = True
+    d.range_connections = 4
+    assert d.plugin.steal() is None
+
+
+def test_no_index_space(downloader, file_server):
+    d = downloader
+    first, second = add_segments(d, file_server.url('/movie.mp4'), [(0, 20 * MB), (20 * MB, 24 * MB)])
+    second.index = first.index + 1
+    d.downloaded_size[first.filepath.name] = [0, 20 * MB]
+    assert d.plugin.split(first, 20 * MB) is None
+
+
+def test_split_while_downloading(downloader, file_server):
+    """原分段下载到拆分点后结束, 两部分拼接后与原文件一致"""
+    d = downloader
+    victim, = add_segments(d, file_server.url('/movie.mp4'), [(0, 24 * MB)])
+    d.downloaded_size[victim.filepath.name] = [0, 24 * MB]
+    requested = victim.headers
+    segment = d.plugin.steal()
+    d.smart_save(segment.url, segment.headers, segment.filepath)
+    # 原分段的请求在拆分之前已经发出, 读取到拆分点时结束并截断
+    d.smart_save(victim.url, requested, victim.filepath)
+    assert victim.filepath.stat().st_size == 12 * MB
+    assert victim.filepath.read_bytes() + segment.filepath.read_bytes() == CONTENT